@@ -1,7 +1,10 @@
 import os
+import re
+import argparse
 from langchain_openai import ChatOpenAI
 from langchain_core.prompts import PromptTemplate
 from langchain_core.output_parsers import StrOutputParser
+from langchain_core.runnables import Runnable
 
 # 从配置文件或环境变量读取API密钥
 try:
@@ -9,8 +12,10 @@ try:
 except ImportError:
     API_KEY = os.getenv("SILICON_FLOW_API_KEY", "your-api-key-here")
 
-# 设置硅基流动 API 配置
-os.environ["OPENAI_API_KEY"] = API_KEY
+# 骨架生成使用的模型和接口
+SKELETON_MODEL = "Qwen/Qwen3-Coder-480B-A35B-Instruct"
+SKELETON_BASE_URL = "https://api.siliconflow.cn/v1"
+SKELETON_MAX_TOKENS = 4000
 
 template = """
 根据以下需求生成一个完整的Python项目骨架：
@@ -40,48 +45,78 @@ blog_system/
 
 prompt = PromptTemplate(template=template, input_variables=["requirement"])
 
-# 使用硅基流动的 Qwen 模型
-llm = ChatOpenAI(
-    model="Qwen/Qwen3-Coder-480B-A35B-Instruct",
-    temperature=0.7,
-    base_url="https://api.siliconflow.cn/v1",
-    api_key=API_KEY,
-    max_tokens=4000
-)
 
-# 使用现代的 LangChain 链式调用
-chain = prompt | llm | StrOutputParser()
+def create_skeleton_chain(model: str = SKELETON_MODEL, base_url: str = SKELETON_BASE_URL,
+                          api_key: str = None, max_retries: int = 2) -> Runnable:
+    """创建项目骨架生成链"""
+    # 使用硅基流动的 Qwen 模型
+    llm = ChatOpenAI(
+        model=model,
+        temperature=0.7,
+        base_url=base_url,
+        api_key=api_key or API_KEY,
+        max_tokens=SKELETON_MAX_TOKENS,
+        # 流水线模式流式接收骨架时也返回token用量
+        stream_usage=True,
+        max_retries=max_retries
+    )
+    # 使用现代的 LangChain 链式调用
+    return prompt | llm | StrOutputParser()
+
 
 def clean_markdown_content(content: str) -> str:
     """清理生成内容中的Markdown标记"""
-    import re
-    
     # 移除开头的```markdown标记
     content = re.sub(r'^```markdown\s*\n', '', content)
     content = re.sub(r'^```\s*\n', '', content)
-    
+
     # 移除结尾的```标记
     content = re.sub(r'\n```\s*$', '', content)
-    
+
     # 移除首尾空白行
     content = content.strip()
-    
+
     return content
 
-try:
-    print("正在生成项目结构...")
-    project_structure = chain.invoke({"requirement": "一个基于FastAPI的博客系统"})
-    
-    # 清理生成的内容
-    project_structure = clean_markdown_content(project_structure)
-    
+
+def save_project_structure(content: str, output_path: str) -> str:
+    """清理生成的骨架并写入文件，返回清理后的内容"""
+    project_structure = clean_markdown_content(content)
+
     # 检查输出长度
     print(f"生成的内容长度: {len(project_structure)} 字符")
-    
-    with open("project_structure.md", "w", encoding="utf-8") as f:
+
+    with open(output_path, "w", encoding="utf-8") as f:
         f.write(project_structure)
-    
-    print("项目结构已生成到 project_structure.md")
-    
-except Exception as e:
-    print(f"错误: {e}")
\ No newline at end of file
+
+    print(f"项目结构已生成到 {output_path}")
+    return project_structure
+
+
+def generate_project_structure(requirement: str, output_path: str = "project_structure.md",
+                               chain: Runnable = None) -> str:
+    """根据需求生成项目骨架并保存"""
+    print("正在生成项目结构...")
+    chain = chain or create_skeleton_chain()
+    return save_project_structure(chain.invoke({"requirement": requirement}), output_path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="根据需求描述生成项目结构Markdown文件")
+    parser.add_argument("--requirement", default="一个基于FastAPI的博客系统", help="项目需求描述")
+    parser.add_argument("--output", default="project_structure.md", help="项目结构文件保存路径")
+    parser.add_argument("--model", default=SKELETON_MODEL, help="生成骨架使用的模型")
+    parser.add_argument("--base-url", default=SKELETON_BASE_URL, help="OpenAI兼容接口地址")
+    args = parser.parse_args()
+
+    # 设置硅基流动 API 配置（只在直接运行时设置，被其他模块导入时不覆盖已有的环境变量）
+    os.environ["OPENAI_API_KEY"] = API_KEY
+
+    try:
+        generate_project_structure(
+            args.requirement,
+            args.output,
+            create_skeleton_chain(args.model, args.base_url)
+        )
+    except Exception as e:
+        print(f"错误: {e}")
@@ -1,11 +1,42 @@
 import os
-import re
 import json
+import time
+import asyncio
+import argparse
+import threading
 from pathlib import Path
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Tuple
 from langchain_openai import ChatOpenAI
-from langchain_core.prompts import PromptTemplate
+from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
+from langchain_core.runnables import Runnable, ConfigurableField
+from generation_cache import GenerationCache, make_cache_key, DEFAULT_CACHE_DIR, DEFAULT_CACHE_MAX_BYTES
+from build_manifest import BuildManifest, BuildJournal, hash_spec
+from content_cleaner import StreamingCleaner, clean_generated_content, language_for_path
+from file_writer import AtomicFileWriter, TreeWriter, WriteResult
+from token_budget import estimate_max_tokens, estimate_tokens
+from prompt_layout import (
+    FILE_REQUEST_TEMPLATE, BATCH_REQUEST_TEMPLATE, FIX_REQUEST_TEMPLATE, PrefixCacheStats,
+    build_chat_prompt, format_project_context
+)
+from batch_generation import (
+    FILE_START_MARKER, FILE_END_MARKER, SMALL_FILE_MAX_TOKENS, DEFAULT_BATCH_SIZE,
+    batch_group_key, format_batch_files, parse_multi_file_output
+)
+from local_renderer import LocalRenderer
+from llm_client import LLMClient, HedgePolicy, DEFAULT_MAX_RETRIES, DEFAULT_HEDGE_PERCENTILE, DEFAULT_HEDGE_BUDGET
+from spec_ir import SpecStream, load_project_spec
+from scheduler import DependencyGraph
+from symbol_index import SymbolIndex
+from model_router import ModelRouter, DEFAULT_TIER_MODELS
+from code_validator import CodeValidator, ValidationResult, DEFAULT_VALIDATION_RETRIES
+from path_trie import PathTrie
+from file_classifier import FileClassifier, DEFAULT_FILE_TYPES_PATH
+from build_tracer import BuildTracer, FileSpan, TRACE_FILENAME, current_span, span_timer, set_span_status
+from Router import (
+    prompt as skeleton_prompt, create_skeleton_chain, clean_markdown_content,
+    SKELETON_MODEL, SKELETON_MAX_TOKENS
+)
 
 # 从配置文件或环境变量读取API密钥
 try:
@@ -13,38 +44,141 @@ try:
 except ImportError:
     API_KEY = os.getenv("SILICON_FLOW_API_KEY", "your-api-key-here")
 
+# 文件类型顺序：依赖图中同时就绪的文件按此顺序开始，同步构建时也按此顺序
+PRIORITY_ORDER = ['requirements', 'config', 'database', 'model', 'schema', 'service', 'router', 'main', 'test', 'migration', 'docker', 'util']
+
+# 默认模型和OpenAI兼容接口地址
+DEFAULT_MODEL = "Qwen/Qwen2.5-Coder-7B-Instruct"
+DEFAULT_BASE_URL = "https://api.siliconflow.cn/v1"
+
+# 异步构建时的默认并发上限
+DEFAULT_MAX_CONCURRENCY = 8
+
+# 单次生成的输出token上限，各文件类型的预算不会超过该值
+DEFAULT_MAX_TOKENS = 3000
+
+def create_chat_model(model: str = DEFAULT_MODEL, base_url: str = DEFAULT_BASE_URL, api_key: str = None,
+                      streaming: bool = False) -> ChatOpenAI:
+    """创建生成代码使用的模型实例"""
+    return ChatOpenAI(
+        model=model,
+        temperature=0.7,
+        base_url=base_url,
+        api_key=api_key or API_KEY,
+        max_tokens=DEFAULT_MAX_TOKENS,
+        # 按文件配置max_tokens时会重建模型实例并显式带上streaming字段，
+        # 需要在这里开启，否则流式生成会退化为一次性返回
+        streaming=streaming,
+        # 流式调用也返回token用量
+        stream_usage=True,
+        # 重试由 LLMClient 统一处理
+        max_retries=0
+    )
+
+
 class ProjectBuilder:
-    def __init__(self, api_key: str = None, output_dir: str = "generated_project"):
+    def __init__(self, api_key: str = None, output_dir: str = "generated_project",
+                 max_concurrency: int = DEFAULT_MAX_CONCURRENCY, use_cache: bool = True,
+                 cache_dir: str = DEFAULT_CACHE_DIR, cache_max_bytes: int = DEFAULT_CACHE_MAX_BYTES,
+                 incremental: bool = True, streaming: bool = False,
+                 batch_small_files: bool = True, batch_size: int = DEFAULT_BATCH_SIZE,
+                 render_engines: Dict[str, str] = None, requests_per_minute: float = None,
+                 tokens_per_minute: float = None, max_retries: int = DEFAULT_MAX_RETRIES,
+                 model: str = DEFAULT_MODEL, base_url: str = DEFAULT_BASE_URL,
+                 trace_path: str = None, file_types_path: str = None, client: LLMClient = None,
+                 cache: GenerationCache = None, validate: bool = True,
+                 validation_retries: int = DEFAULT_VALIDATION_RETRIES, hedge: bool = False,
+                 hedge_percentile: float = DEFAULT_HEDGE_PERCENTILE, hedge_budget: float = DEFAULT_HEDGE_BUDGET,
+                 model_tiers: Dict[str, str] = None, resume: bool = False, llm: ChatOpenAI = None,
+                 validator: CodeValidator = None, writer: TreeWriter = None):
         self.api_key = api_key or API_KEY
         self.output_dir = Path(output_dir)
-        self.output_dir.mkdir(exist_ok=True)
-        
-        # 创建LLM实例
-        self.llm = ChatOpenAI(
-            model="Qwen/Qwen2.5-Coder-7B-Instruct",
-            temperature=0.7,
-            base_url="https://api.siliconflow.cn/v1",
-            api_key=self.api_key,
-            max_tokens=3000
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.max_concurrency = max_concurrency
+        
+        # 生成结果缓存：输入未变化的文件不再重复调用API
+        # 多项目构建时传入共享的缓存实例，避免各自维护LRU索引
+        if use_cache:
+            self.cache = cache if cache is not None else GenerationCache(cache_dir, cache_max_bytes)
+        else:
+            self.cache = None
+        # 项目结构解析结果与生成结果共用缓存目录，按源文件哈希缓存
+        self.spec_cache_dir = self.cache.cache_dir if self.cache is not None else None
+        
+        # 增量构建：只重新生成规格发生变化的文件
+        self.incremental = incremental
+        self.manifest = BuildManifest(self.output_dir)
+        # 预写日志：每写入一个文件立即落盘，构建中断后 resume 模式跳过日志中已完成的文件
+        self.journal = BuildJournal(self.output_dir)
+        self.resume = resume
+        # 清单和日志在写入线程（写入完成回调）和生成流程（流式写入）中都会更新
+        self._record_lock = threading.Lock()
+        
+        # 写入阶段：文件内容放入队列由后台线程写入，跳过内容未变的文件
+        # 多项目构建时传入共享的写入线程和校验进程池，由调用方负责关闭
+        self._owns_writer = writer is None
+        self.writer = writer if writer is not None else TreeWriter()
+        self._reset_write_stats()
+        # 本次构建中使用后备内容的文件，不记入清单以便下次重试
+        self._failed_files = set()
+        
+        # 语法校验：Python文件编译失败时提取有效代码块，仍失败时带着错误信息重新生成
+        self._owns_validator = validator is None
+        self.validator = (validator if validator is not None else CodeValidator()) if validate else None
+        self.validation_retries = validation_retries
+        self._reset_validation_stats()
+        
+        # 流式生成：边接收边清理（首字节即可看到进度），接收完成后与一次性生成的内容一样交给写入阶段
+        self.streaming = streaming
+        
+        # 小文件合并请求：同组的多个小文件在一次调用中生成
+        self.batch_small_files = batch_small_files
+        self.batch_size = batch_size
+        
+        # 确定性文件（包初始化、Dockerfile、依赖列表等）由本地模板渲染，不调用模型
+        self.local_renderer = LocalRenderer(render_engines)
+        
+        # 逐文件追踪：各阶段耗时和token用量写入JSONL，构建结束时按类型汇总
+        self.tracer = BuildTracer(trace_path or self.output_dir / TRACE_FILENAME)
+        
+        # 创建LLM实例（多项目构建时共用同一个实例）
+        self.llm = llm if llm is not None else create_chat_model(model, base_url, self.api_key, streaming)
+        
+        # 模型分层：按文件类型和复杂度选择模型，语法校验失败时升级到更大的模型；
+        # 未配置分层时所有文件使用同一个模型
+        if model_tiers:
+            self.model_router = ModelRouter(model_tiers)
+        else:
+            self.model_router = ModelRouter({"default": model}, tier_order=["default"])
+        
+        # 调用层：令牌桶限流、退避重试和自适应并发；多项目构建时传入共享的实例
+        self.client = client or LLMClient(
+            requests_per_minute=requests_per_minute,
+            tokens_per_minute=tokens_per_minute,
+            max_concurrency=max_concurrency,
+            max_retries=max_retries,
+            # 对冲请求：单文件生成耗时超过同类型文件近期延迟的百分位时再发一个相同的请求
+            hedge=HedgePolicy(hedge_percentile, hedge_budget) if hedge else None
         )
         
-        # 定义文件类型分类规则
-        self.file_type_patterns = {
-            "router": ["router", "api", "endpoint"],
-            "model": ["model"],
-            "schema": ["schema", "pydantic", "dto"],
-            "service": ["service", "business", "logic"],
-            "config": ["config", "setting", "env"],
-            "test": ["test", "spec"],
-            "migration": ["migration", "alembic", "versions"],
-            "database": ["database", "db", "session"],
-            "util": ["util", "helper", "common"],
-            "main": ["main", "app"],
-            "docker": ["dockerfile"],
-            "requirements": ["requirements"]
-        }
+        # 文件类型分类规则：按路径分段匹配，优先级由配置文件中的顺序决定
+        self.classifier = FileClassifier.from_file(file_types_path or DEFAULT_FILE_TYPES_PATH)
+        
+        # 最近一次解析得到的目录前缀树
+        self.path_trie = PathTrie()
+        # 最近一次构建推断出的文件依赖图
+        self.dependency_graph: Optional[DependencyGraph] = None
+        # 已生成文件的接口索引，依赖文件的签名摘要注入到提示中
+        self.symbol_index = SymbolIndex(self.output_dir)
         
-        # 专业化提示模板
+        # 项目级上下文，放在每个请求的系统消息开头；解析项目结构后更新
+        self.project_context = format_project_context([])
+        # 缓存键使用的项目上下文，不含文件清单：增删或重命名一个文件不会使所有文件的缓存失效
+        self.cache_context = self.project_context
+        # 本次构建的提示前缀复用统计
+        self.prefix_stats = PrefixCacheStats()
+        
+        # 专业化提示模板（各类型的规则，作为系统消息；文件信息在用户消息中）
         self.templates = {
             "router": self._get_router_template(),
             "model": self._get_model_template(),
@@ -59,45 +193,58 @@ class ProjectBuilder:
             "docker": self._get_docker_template(),
             "requirements": self._get_requirements_template()
         }
-
-    def parse_project_structure(self, md_file_path: str) -> Dict[str, Dict]:
-        """解析项目结构Markdown文件"""
-        with open(md_file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-        
-        print("开始解析项目结构...")
         
-        # 提取目录结构 - 修复正则表达式
-        tree_match = re.search(r'```\n(.*?)\n```', content, re.DOTALL)
-        if not tree_match:
-            # 尝试另一种格式
-            tree_match = re.search(r'```[^\n]*\n(.*?)\n```', content, re.DOTALL)
+        # 预编译每种文件类型的提示和生成链
+        self._compile_prompt_registry()
+
+    def _compile_prompt_registry(self):
+        """将各类型模板编译为可复用的生成链，max_tokens和模型在调用时按文件配置
+
+        系统消息只包含项目上下文和类型规则，随文件变化的变量都在最后的用户消息中，
+        同一次构建中同类型的请求共享相同的前缀，可以命中服务端的前缀缓存。
+        """
+        llm = self.llm.configurable_fields(
+            max_tokens=ConfigurableField(id="max_tokens", name="输出token上限"),
+            model_name=ConfigurableField(id="model", name="模型")
+        )
+        self.prompts = {}
+        self.chains = {}
+        for file_type, template in self.templates.items():
+            prompt = build_chat_prompt(template, FILE_REQUEST_TEMPLATE)
+            self.prompts[file_type] = prompt
+            self.chains[file_type] = prompt | llm | StrOutputParser()
         
-        if not tree_match:
-            raise ValueError("未找到项目目录结构")
+        self.batch_prompt = build_chat_prompt(
+            self._get_batch_template(),
+            BATCH_REQUEST_TEMPLATE,
+            partial_variables={"start_marker": FILE_START_MARKER, "end_marker": FILE_END_MARKER}
+        )
+        self.batch_chain = self.batch_prompt | llm | StrOutputParser()
         
-        tree_content = tree_match.group(1).strip()
-        print(f"提取到的目录结构:\n{tree_content}")
+        self.fix_prompt = build_chat_prompt(self._get_fix_template(), FIX_REQUEST_TEMPLATE)
+        self.fix_chain = self.fix_prompt | llm | StrOutputParser()
+
+    def parse_project_structure(self, md_file_path: str) -> Dict[str, Dict]:
+        """解析项目结构文件（Markdown、JSON或YAML）"""
+        print("开始解析项目结构...")
         
-        # 解析文件描述
-        file_descriptions = self._parse_file_descriptions(content)
-        print(f"解析到 {len(file_descriptions)} 个文件描述")
+        # 源文件未变化时直接加载缓存的中间表示，跳过解析
+        spec, cached = load_project_spec(md_file_path, self.classifier, self.spec_cache_dir)
+        print(f"{'从缓存加载' if cached else '解析得到'} {len(spec.files)} 个文件")
         
-        # 提取所有文件路径
-        file_paths = self._extract_file_paths(tree_content)
-        print(f"提取到 {len(file_paths)} 个文件路径")
+        # 目录树前缀树，后续阶段可以按子树查询
+        self.path_trie = spec.path_trie()
+        self.project_context = format_project_context(
+            [file_spec.path for file_spec in spec.files], self.path_trie.root_name
+        )
+        self.cache_context = format_project_context([], self.path_trie.root_name)
         
         # 组合文件信息
         project_files = {}
-        for file_path in file_paths:
-            if self._should_generate_file(file_path):
-                file_type = self._classify_file_type(file_path)
-                project_files[file_path] = {
-                    'type': file_type,
-                    'description': file_descriptions.get(file_path, ''),
-                    'functions': self._extract_functions(content, file_path)
-                }
-                print(f"添加文件: {file_path} (类型: {file_type})")
+        for file_spec in spec.files:
+            if self._should_generate_file(file_spec.path):
+                project_files[file_spec.path] = file_spec.to_file_info()
+                print(f"添加文件: {file_spec.path} (类型: {file_spec.type})")
         
         return project_files
 
@@ -122,230 +269,844 @@ class ProjectBuilder:
             
         return False
 
-    def _parse_file_descriptions(self, content: str) -> Dict[str, str]:
-        """解析文件描述"""
-        descriptions = {}
-        
-        # 匹配文件描述部分
-        pattern = r'### `([^`]+)`\s*\n(.*?)(?=###|$)'
-        matches = re.findall(pattern, content, re.DOTALL)
+    def _prepare_generation(self, file_path: str, file_info: Dict) -> Tuple[Runnable, Dict[str, str], int]:
+        """获取单个文件的生成链（已绑定输出预算）、输入变量和预计消耗的token数"""
+        file_type = file_info['type'] if file_info['type'] in self.chains else 'util'
+        max_tokens = estimate_max_tokens(file_path, file_info, self.llm.max_tokens or DEFAULT_MAX_TOKENS)
+        model = self.model_router.model(self.model_router.route(file_path, file_info))
+        chain = self.chains[file_type].with_config(configurable={"max_tokens": max_tokens, "model": model})
         
-        for file_path, desc in matches:
-            descriptions[file_path] = desc.strip()
-        
-        return descriptions
+        inputs = {
+            "project_context": self.project_context,
+            "file_path": file_path,
+            "description": file_info['description'],
+            "functions": ', '.join(file_info['functions']) if file_info['functions'] else '无特定函数',
+            "context": self._dependency_context(file_path, file_info) or '无'
+        }
+        request_tokens = estimate_tokens(self._file_prompt(file_info).format(**inputs)) + max_tokens
+        return chain, inputs, request_tokens
 
-    def _extract_file_paths(self, tree_content: str) -> List[str]:
-        """从目录树中提取文件路径 - 修复版本"""
-        files = []
-        lines = tree_content.split('\n')
-        path_stack = []
-        
-        for line in lines:
-            if not line.strip():
-                continue
-            
-            # 移除树形字符
-            clean_line = re.sub(r'[├└│─\s]+', '', line)
-            if not clean_line:
-                continue
-                
-            # 计算缩进层级
-            indent = 0
-            for char in line:
-                if char in '│ ':
-                    indent += 1
-                else:
-                    break
-            
-            # 估算层级
-            level = indent // 4 if indent > 0 else 0
-            
-            # 清理文件/目录名
-            name = clean_line.rstrip('/')
-            
-            # 调整路径栈
-            path_stack = path_stack[:level]
-            
-            if clean_line.endswith('/'):
-                # 目录
-                path_stack.append(name)
-            else:
-                # 文件
-                if path_stack:
-                    file_path = '/'.join(path_stack + [name])
-                else:
-                    file_path = name
-                files.append(file_path)
-        
-        return files
+    def _file_prompt(self, file_info: Dict) -> ChatPromptTemplate:
+        return self.prompts[file_info['type'] if file_info['type'] in self.prompts else 'util']
 
-    def _classify_file_type(self, file_path: str) -> str:
-        """根据文件路径分类文件类型"""
-        file_path_lower = file_path.lower()
-        file_name = Path(file_path).name.lower()
-        
-        # 特殊文件处理
-        if file_name == 'dockerfile':
-            return "docker"
-        if file_name == 'requirements.txt':
-            return "requirements"
-        if file_name == 'readme.md':
-            return "util"
-        
-        # 按路径模式分类
-        for file_type, patterns in self.file_type_patterns.items():
-            if any(pattern in file_path_lower for pattern in patterns):
-                return file_type
-        
-        return "util"  # 默认类型
+    def _record_prefix(self, prompt: ChatPromptTemplate, inputs: Dict[str, str]):
+        """记录实际发出的请求，统计与本次构建中之前的请求相同的前缀"""
+        self.prefix_stats.record(prompt.format_messages(**inputs))
 
-    def _extract_functions(self, content: str, file_path: str) -> List[str]:
-        """提取文件中的函数/类信息"""
-        functions = []
-        
-        # 在文件描述中查找函数和类
-        pattern = rf'### `{re.escape(file_path)}`(.*?)(?=###|$)'
-        match = re.search(pattern, content, re.DOTALL)
-        
-        if match:
-            desc_content = match.group(1)
-            
-            # 提取函数
-            func_matches = re.findall(r'- \*\*Function\*\*: `([^`]+)`', desc_content)
-            functions.extend(func_matches)
-            
-            # 提取类
-            class_matches = re.findall(r'- \*\*Class\*\*: `([^`]+)`', desc_content)
-            functions.extend(class_matches)
-        
-        return functions
+    def _dependency_context(self, file_path: str, file_info: Dict) -> str:
+        """依赖文件的接口摘要（只含签名，不含实现），依赖图不可用时使用规格中声明的依赖"""
+        graph = self.dependency_graph
+        if graph is not None and file_path in graph.dependencies:
+            dependencies = graph.dependencies[file_path]
+        else:
+            dependencies = file_info.get('dependencies', [])
+        return self.symbol_index.context(dependencies)
+
+    def _get_template(self, file_type: str) -> str:
+        """获取文件类型对应的提示模板（类型规则和文件信息部分）"""
+        return self.templates.get(file_type, self.templates['util']) + FILE_REQUEST_TEMPLATE
+
+    def _cache_key(self, file_path: str, file_info: Dict, inputs: Dict[str, str]) -> str:
+        """计算单个文件生成请求的缓存键（项目上下文中的文件清单不计入）"""
+        rendered_prompt = self._file_prompt(file_info).format(**dict(inputs, project_context=self.cache_context))
+        return make_cache_key(
+            self.model_router.model(self.model_router.route(file_path, file_info)),
+            self.llm.temperature,
+            rendered_prompt,
+            file_path,
+            file_info['description'],
+            file_info['functions']
+        )
+
+    def _lookup_cache(self, file_path: str, file_info: Dict, inputs: Dict[str, str]) -> Tuple[Optional[str], Optional[str]]:
+        """查询生成结果缓存，返回缓存键和命中的内容（未启用缓存时都为None）"""
+        if self.cache is None:
+            return None, None
+        cache_key = self._cache_key(file_path, file_info, inputs)
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            print(f"    命中缓存: {file_path}")
+        return cache_key, cached
 
     def generate_file_content(self, file_path: str, file_info: Dict) -> str:
         """为单个文件生成内容"""
-        file_type = file_info['type']
-        template = self.templates.get(file_type, self.templates['util'])
-        
-        # 构建提示
-        prompt = PromptTemplate(
-            template=template,
-            input_variables=["file_path", "description", "functions"]
-        )
-        
-        chain = prompt | self.llm | StrOutputParser()
+        with span_timer("prompt_render"):
+            chain, inputs, request_tokens = self._prepare_generation(file_path, file_info)
+            cache_key, cached = self._lookup_cache(file_path, file_info, inputs)
+        if cached is not None:
+            set_span_status("cached")
+            return cached
         
+        self._record_prefix(self._file_prompt(file_info), inputs)
         try:
-            result = chain.invoke({
-                "file_path": file_path,
-                "description": file_info['description'],
-                "functions": ', '.join(file_info['functions']) if file_info['functions'] else '无特定函数'
-            })
+            result = self.client.invoke(chain, inputs, request_tokens, hedge_key=self._hedge_key(file_path, file_info))
             
             # 清理Markdown代码块标记
-            result = self._clean_generated_content(result)
+            with span_timer("cleanup"):
+                result = self._clean_generated_content(result, file_path)
+            result, valid = self.validate_content(file_path, file_info, result)
+            # 未通过校验的内容不缓存，下次构建时重新生成
+            if cache_key and valid:
+                self.cache.put(cache_key, result)
             return result
         except Exception as e:
             print(f"生成 {file_path} 时出错: {e}")
-            return self._get_fallback_content(file_path, file_type)
-
-    def _clean_generated_content(self, content: str) -> str:
-        """清理生成内容中的Markdown标记"""
-        # 移除开头的```python标记
-        content = re.sub(r'^```python\s*\n', '', content)
-        content = re.sub(r'^```\s*\n', '', content)
+            self._failed_files.add(file_path)
+            set_span_status("fallback")
+            return self._get_fallback_content(file_path, file_info['type'])
+
+    async def agenerate_file_content(self, file_path: str, file_info: Dict) -> str:
+        """为单个文件异步生成内容"""
+        with span_timer("prompt_render"):
+            chain, inputs, request_tokens = self._prepare_generation(file_path, file_info)
+            cache_key, cached = self._lookup_cache(file_path, file_info, inputs)
+        if cached is not None:
+            set_span_status("cached")
+            return cached
         
-        # 移除结尾的```标记
-        content = re.sub(r'\n```\s*$', '', content)
+        self._record_prefix(self._file_prompt(file_info), inputs)
+        try:
+            result = await self.client.ainvoke(chain, inputs, request_tokens,
+                                               hedge_key=self._hedge_key(file_path, file_info))
+            with span_timer("cleanup"):
+                result = self._clean_generated_content(result, file_path)
+            result, valid = await self.avalidate_content(file_path, file_info, result)
+            if cache_key and valid:
+                self.cache.put(cache_key, result)
+            return result
+        except Exception as e:
+            print(f"生成 {file_path} 时出错: {e}")
+            self._failed_files.add(file_path)
+            set_span_status("fallback")
+            return self._get_fallback_content(file_path, file_info['type'])
+
+    def _hedge_key(self, file_path: str, file_info: Dict) -> str:
+        """对冲请求按文件类型和模型层级分别统计延迟"""
+        return f"{file_info['type']}@{self.model_router.route(file_path, file_info)}"
+
+    def _reset_validation_stats(self):
+        """清空本次构建的校验统计"""
+        self.validation_stats = {"checked": 0, "extracted": 0, "retried": 0, "escalated": 0, "invalid": 0}
+
+    def _reset_write_stats(self):
+        """清空本次构建的写入统计"""
+        self.write_stats = {"written": 0, "unchanged": 0, "failed": 0, "directories": 0, "seconds": 0.0}
+
+    def _should_validate(self, file_path: str) -> bool:
+        return self.validator is not None and self.validator.should_validate(file_path)
+
+    def _prepare_fix(self, file_path: str, file_info: Dict, content: str, error: str,
+                     tier: str) -> Tuple[Runnable, Dict[str, str], int]:
+        """获取修复请求的生成链（使用指定层级的模型）、输入变量和预计消耗的token数"""
+        max_tokens = estimate_max_tokens(file_path, file_info, self.llm.max_tokens or DEFAULT_MAX_TOKENS)
+        chain = self.fix_chain.with_config(configurable={"max_tokens": max_tokens, "model": self.model_router.model(tier)})
+        inputs = {"project_context": self.project_context, "file_path": file_path, "error": error, "code": content}
+        return chain, inputs, estimate_tokens(self.fix_prompt.format(**inputs)) + max_tokens
+
+    def _escalate(self, file_path: str, tier: str) -> str:
+        """校验失败后重新生成使用的模型层级：有更大的模型时升级"""
+        escalated = self.model_router.escalate(tier)
+        if escalated is None:
+            print(f"    语法错误，带着错误信息重新生成: {file_path}")
+            return tier
+        print(f"    语法错误，升级到 {self.model_router.model(escalated)} 带着错误信息重新生成: {file_path}")
+        self.validation_stats["escalated"] += 1
+        return escalated
+
+    def _record_validation(self, file_path: str, result: ValidationResult, retries: int) -> bool:
+        """统计校验结果并设置追踪状态，返回是否通过；仍未通过的文件记为失败，下次构建时重新生成"""
+        self.validation_stats["checked"] += 1
+        if result.error is not None:
+            print(f"    语法校验未通过: {file_path} ({result.error.splitlines()[0]})")
+            self.validation_stats["invalid"] += 1
+            self._failed_files.add(file_path)
+            set_span_status("invalid")
+            return False
+        if retries:
+            self.validation_stats["retried"] += 1
+            set_span_status("retried")
+        elif result.extracted:
+            self.validation_stats["extracted"] += 1
+            set_span_status("repaired")
+        return True
+
+    def validate_content(self, file_path: str, file_info: Dict, content: str) -> Tuple[str, bool]:
+        """校验生成的Python文件，返回 (内容, 是否通过校验)
+
+        编译失败时先提取能通过编译的最大代码块，仍失败时把错误信息发回模型重新生成，
+        配置了模型分层时每次重新生成升级到上一层级的模型。非Python文件或未启用校验时直接通过。
+        """
+        if not self._should_validate(file_path):
+            return content, True
+        with span_timer("validate"):
+            result = self.validator.validate(file_path, content)
+        retries = 0
+        tier = self.model_router.route(file_path, file_info)
+        while result.error is not None and retries < self.validation_retries:
+            retries += 1
+            tier = self._escalate(file_path, tier)
+            chain, inputs, request_tokens = self._prepare_fix(file_path, file_info, result.content, result.error, tier)
+            self._record_prefix(self.fix_prompt, inputs)
+            try:
+                fixed = self.client.invoke(chain, inputs, request_tokens)
+            except Exception as e:
+                print(f"    重新生成 {file_path} 时出错: {e}")
+                break
+            with span_timer("validate"):
+                result = self.validator.validate(file_path, self._clean_generated_content(fixed, file_path))
+        return result.content, self._record_validation(file_path, result, retries)
+
+    async def avalidate_content(self, file_path: str, file_info: Dict, content: str) -> Tuple[str, bool]:
+        """异步校验：编译和提取在进程池中进行，不阻塞其他文件的生成"""
+        if not self._should_validate(file_path):
+            return content, True
+        with span_timer("validate"):
+            result = await self.validator.avalidate(file_path, content)
+        retries = 0
+        tier = self.model_router.route(file_path, file_info)
+        while result.error is not None and retries < self.validation_retries:
+            retries += 1
+            tier = self._escalate(file_path, tier)
+            chain, inputs, request_tokens = self._prepare_fix(file_path, file_info, result.content, result.error, tier)
+            self._record_prefix(self.fix_prompt, inputs)
+            try:
+                fixed = await self.client.ainvoke(chain, inputs, request_tokens)
+            except Exception as e:
+                print(f"    重新生成 {file_path} 时出错: {e}")
+                break
+            with span_timer("validate"):
+                result = await self.validator.avalidate(file_path, self._clean_generated_content(fixed, file_path))
+        return result.content, self._record_validation(file_path, result, retries)
+
+    def _split_batches(self, project_files: Dict[str, Dict]) -> Tuple[List[List[Tuple[str, Dict]]], Dict[str, Dict]]:
+        """挑出可以合并请求的小文件并分批，返回批次列表和需要单独生成的文件"""
+        if not self.batch_small_files or self.batch_size < 2:
+            return [], project_files
         
-        # 移除首尾空白行
-        content = content.strip()
+        max_tokens = self.llm.max_tokens or DEFAULT_MAX_TOKENS
+        groups = {}
+        remaining = {}
+        for file_path, file_info in project_files.items():
+            small = estimate_max_tokens(file_path, file_info, max_tokens) <= SMALL_FILE_MAX_TOKENS
+            # 已有缓存的文件直接走单文件路径命中缓存
+            if small and not self._is_cached(file_path, file_info):
+                groups.setdefault(batch_group_key(file_path, file_info), []).append((file_path, file_info))
+            else:
+                remaining[file_path] = file_info
         
-        return content
+        batches = []
+        for group in groups.values():
+            if len(group) < 2:
+                remaining.update(group)
+                continue
+            for i in range(0, len(group), self.batch_size):
+                chunk = group[i:i + self.batch_size]
+                if len(chunk) < 2:
+                    remaining.update(chunk)
+                else:
+                    batches.append(chunk)
+        return batches, remaining
+
+    def _is_cached(self, file_path: str, file_info: Dict) -> bool:
+        """判断单文件请求是否已有缓存"""
+        if self.cache is None:
+            return False
+        _, inputs, _ = self._prepare_generation(file_path, file_info)
+        return self._cache_key(file_path, file_info, inputs) in self.cache
+
+    def _prepare_batch(self, batch: List[Tuple[str, Dict]]) -> Tuple[Runnable, Dict[str, str], int]:
+        """获取一批小文件的合并生成链、输入变量和预计消耗的token数"""
+        max_tokens = self.llm.max_tokens or DEFAULT_MAX_TOKENS
+        # 每个文件额外预留分隔标记的开销
+        budget = min(max_tokens, sum(estimate_max_tokens(file_path, file_info, max_tokens) + 30 for file_path, file_info in batch))
+        # 合并请求只包含小文件，使用最低层级的模型
+        model = self.model_router.model(self.model_router.tier_order[0])
+        chain = self.batch_chain.with_config(configurable={"max_tokens": budget, "model": model})
+        inputs = {"project_context": self.project_context, "files": format_batch_files(batch)}
+        return chain, inputs, estimate_tokens(self.batch_prompt.format(**inputs)) + budget
+
+    def _parse_batch_result(self, batch: List[Tuple[str, Dict]], result: str) -> Dict[str, str]:
+        """解析合并请求的输出，返回成功解析的文件内容"""
+        contents = parse_multi_file_output(result, [file_path for file_path, _ in batch])
+        return {file_path: self._clean_generated_content(content, file_path) for file_path, content in contents.items()}
+
+    def generate_batch_content(self, batch: List[Tuple[str, Dict]]) -> Dict[str, str]:
+        """在一次请求中生成多个小文件，失败时返回空字典"""
+        with span_timer("prompt_render"):
+            chain, inputs, request_tokens = self._prepare_batch(batch)
+        self._record_prefix(self.batch_prompt, inputs)
+        try:
+            result = self.client.invoke(chain, inputs, request_tokens)
+        except Exception as e:
+            print(f"批量生成时出错: {e}")
+            set_span_status("fallback")
+            return {}
+        with span_timer("cleanup"):
+            contents = self._parse_batch_result(batch, result)
+        with span_timer("validate"):
+            return self._validate_batch(contents)
+
+    async def agenerate_batch_content(self, batch: List[Tuple[str, Dict]]) -> Dict[str, str]:
+        """异步地在一次请求中生成多个小文件"""
+        with span_timer("prompt_render"):
+            chain, inputs, request_tokens = self._prepare_batch(batch)
+        self._record_prefix(self.batch_prompt, inputs)
+        try:
+            result = await self.client.ainvoke(chain, inputs, request_tokens)
+        except Exception as e:
+            print(f"批量生成时出错: {e}")
+            set_span_status("fallback")
+            return {}
+        with span_timer("cleanup"):
+            contents = self._parse_batch_result(batch, result)
+        with span_timer("validate"):
+            return await self._avalidate_batch(contents)
+
+    def _validate_batch(self, contents: Dict[str, str]) -> Dict[str, str]:
+        """校验批量输出中的Python文件，未通过的文件交给单文件生成（单独生成时可以带着错误信息重试）"""
+        valid = {}
+        for file_path, content in contents.items():
+            if self._should_validate(file_path):
+                result = self.validator.validate(file_path, content)
+                if result.error is not None:
+                    continue
+                content = result.content
+            valid[file_path] = content
+        return valid
+
+    async def _avalidate_batch(self, contents: Dict[str, str]) -> Dict[str, str]:
+        """在进程池中校验批量输出"""
+        paths = [file_path for file_path in contents if self._should_validate(file_path)]
+        results = await asyncio.gather(*(self.validator.avalidate(file_path, contents[file_path]) for file_path in paths))
+        valid = dict(contents)
+        for file_path, result in zip(paths, results):
+            if result.error is not None:
+                del valid[file_path]
+            else:
+                valid[file_path] = result.content
+        return valid
+
+    def _save_batch(self, batch: List[Tuple[str, Dict]], contents: Dict[str, str]) -> List[Tuple[str, Dict]]:
+        """保存批量生成成功的文件，返回需要回退为单文件生成的文件"""
+        leftovers = []
+        for file_path, file_info in batch:
+            if file_path not in contents:
+                leftovers.append((file_path, file_info))
+                continue
+            content = contents[file_path]
+            if self.cache is not None:
+                _, inputs, _ = self._prepare_generation(file_path, file_info)
+                self.cache.put(self._cache_key(file_path, file_info, inputs), content)
+            self._save_file(file_path, content, file_info)
+        if leftovers:
+            print(f"    {len(leftovers)} 个文件未能从批量输出中解析或未通过语法校验，改为单独生成")
+        return leftovers
+
+    def _generate_and_save_batch(self, batch: List[Tuple[str, Dict]]):
+        """批量生成并保存一组小文件"""
+        paths = [file_path for file_path, _ in batch]
+        print(f"  批量生成 {len(batch)} 个文件: {', '.join(paths)}")
+        with self.tracer.span(','.join(paths), "batch"):
+            contents = self.generate_batch_content(batch)
+            leftovers = self._save_batch(batch, contents)
+        for file_path, file_info in leftovers:
+            self._generate_and_save_file(file_path, file_info)
+
+    async def _agenerate_and_save_batch(self, batch: List[Tuple[str, Dict]], semaphore: asyncio.Semaphore):
+        """异步批量生成并保存一组小文件"""
+        paths = [file_path for file_path, _ in batch]
+        with self.tracer.span(','.join(paths), "batch") as span:
+            queued_at = time.perf_counter()
+            async with semaphore:
+                span.add("queue_wait", time.perf_counter() - queued_at)
+                print(f"  批量生成 {len(batch)} 个文件: {', '.join(paths)}")
+                contents = await self.agenerate_batch_content(batch)
+            leftovers = self._save_batch(batch, contents)
+        await asyncio.gather(*(
+            self._agenerate_and_save_file(file_path, file_info, semaphore)
+            for file_path, file_info in leftovers
+        ))
+
+    def _clean_generated_content(self, content: str, file_path: str) -> str:
+        """提取生成内容中目标文件的代码，去掉Markdown围栏和前后的解释文字"""
+        return clean_generated_content(content, language_for_path(file_path))
 
     def _get_fallback_content(self, file_path: str, file_type: str) -> str:
         """生成失败时的后备内容"""
-        if file_path.endswith('__init__.py'):
-            return '"""Package initialization file."""\n'
-        elif file_type == "requirements":
-            return """fastapi==0.104.1
-uvicorn==0.24.0
-sqlalchemy==2.0.23
-pydantic==2.5.0
-python-multipart==0.0.6
-python-jose==3.3.0
-passlib==1.7.4
-alembic==1.13.0
-pytest==7.4.3
-httpx==0.25.2
-"""
-        elif file_type == "docker":
-            return """FROM python:3.11-slim
-
-WORKDIR /app
-
-COPY requirements.txt .
-RUN pip install -r requirements.txt
-
-COPY . .
-
-CMD ["uvicorn", "app.main:app", "--host", "0.0.0.0", "--port", "8000"]
-"""
+        content = self.local_renderer.render(file_path, file_type)
+        if content is not None:
+            return content
+        return f'# {file_path}\n# 自动生成失败，需要手动完成\n'
+
+    def _render_local_files(self, project_files: Dict[str, Dict]) -> Dict[str, Dict]:
+        """用本地模板渲染确定性文件并保存，返回仍需调用模型的文件"""
+        remaining = {}
+        rendered = 0
+        for file_path, file_info in project_files.items():
+            if self._render_local_file(file_path, file_info):
+                rendered += 1
+            else:
+                remaining[file_path] = file_info
+        if rendered:
+            print(f"本地模板渲染 {rendered} 个文件")
+        return remaining
+
+    def _render_local_file(self, file_path: str, file_info: Dict) -> bool:
+        """可以本地渲染时直接渲染并保存，返回是否已处理"""
+        if not self.local_renderer.can_render(file_path, file_info['type']):
+            return False
+        with self.tracer.span(file_path, file_info['type']) as span:
+            span.status = "local"
+            self._save_file(file_path, self.local_renderer.render(file_path, file_info['type']), file_info)
+        return True
+
+    def _plan_incremental_build(self, project_files: Dict[str, Dict]) -> Dict[str, Dict]:
+        """对比构建清单，删除已移除的文件，返回需要重新生成的文件"""
+        self.manifest = BuildManifest.load(self.output_dir)
+        self._failed_files = set()
+        self._reset_validation_stats()
+        self._reset_write_stats()
+        self.prefix_stats = PrefixCacheStats()
+        spec_hashes = {
+            file_path: hash_spec(file_info, self._get_template(file_info['type']))
+            for file_path, file_info in project_files.items()
+        }
+        journaled = self._open_journal()
+        resumed = {
+            file_path for file_path, entry in journaled.items()
+            if file_path in spec_hashes and self.manifest.restore(file_path, entry, spec_hashes[file_path])
+        }
+        if journaled:
+            print(f"断点续建: 跳过日志中已完成的 {len(resumed)} 个文件")
+        with self._record_lock:
+            plan = self.manifest.diff(spec_hashes)
+            for file_path in plan.removed:
+                self.manifest.delete_file(file_path)
+        
+        if not self.incremental:
+            return {file_path: file_info for file_path, file_info in project_files.items() if file_path not in resumed}
+        
+        print(f"增量构建: 新增 {len(plan.added)} 个，变更 {len(plan.changed)} 个，"
+              f"未变 {len(plan.unchanged)} 个，删除 {len(plan.removed)} 个")
+        return {file_path: project_files[file_path] for file_path in plan.added + plan.changed}
+
+    def _open_journal(self) -> Dict[str, Dict[str, str]]:
+        """开始记录本次构建的日志，返回可以续建的日志记录（非 resume 模式时清空旧日志并返回空字典）"""
+        journaled = self.journal.load()
+        if journaled and not self.resume:
+            print(f"发现上次中断的构建日志（已完成 {len(journaled)} 个文件），未指定 --resume，重新生成")
+            journaled = {}
+        try:
+            self.journal.open(keep=self.resume)
+        except OSError as e:
+            print(f"打开构建日志失败，本次构建中断后无法续建: {e}")
+        return journaled
+
+    def _prepare_build(self, md_file_path: str) -> Tuple[List[List[Tuple[str, Dict]]], Dict[str, Dict], DependencyGraph]:
+        """解析项目结构并确定本次需要生成的文件，返回小文件批次、其余文件及其依赖图"""
+        self.tracer.start()
+        project_files = self.parse_project_structure(md_file_path)
+        
+        print(f"发现 {len(project_files)} 个文件需要生成")
+        
+        # 依赖关系基于完整的项目结构推断，本次不需要生成的文件视为已经完成
+        self.dependency_graph = DependencyGraph.infer(project_files, PRIORITY_ORDER)
+        
+        project_files = self._plan_incremental_build(project_files)
+        # 已移除文件的清理完成后一次性创建目录树
+        prepared = self.writer.prepare(self.output_dir, self.path_trie.directories())
+        prepared.add_done_callback(self._on_directories_created)
+        project_files = self._render_local_files(project_files)
+        batches, project_files = self._split_batches(project_files)
+        graph = self.dependency_graph.subgraph(project_files)
+        if graph:
+            print(f"依赖图: {len(graph)} 个文件，{graph.edge_count()} 条依赖，最长依赖链 {graph.depth()} 层")
+        self._print_model_routing(project_files)
+        return batches, project_files, graph
+
+    def _print_model_routing(self, project_files: Dict[str, Dict]):
+        """输出各模型层级负责的文件数（未配置分层时不输出）"""
+        router = self.model_router
+        if len(router.tier_order) < 2 or not project_files:
+            return
+        counts = {}
+        for file_path, file_info in project_files.items():
+            tier = router.route(file_path, file_info)
+            counts[tier] = counts.get(tier, 0) + 1
+        print("模型分层: " + "，".join(
+            f"{tier}（{router.model(tier)}）{counts[tier]} 个" for tier in router.tier_order if tier in counts
+        ))
+
+    def _finish_build(self):
+        """等待写入阶段完成，保存构建清单并输出统计信息，清单保存成功后删除构建日志"""
+        if self._owns_writer:
+            self.writer.close()
         else:
-            return f'# {file_path}\n# 自动生成失败，需要手动完成\n'
+            self.writer.flush()
+        try:
+            with self._record_lock:
+                self.manifest.save()
+            self.journal.remove()
+        except OSError as e:
+            print(f"保存构建清单失败: {e}")
+            self.journal.close()
+        self._print_cache_stats()
+        stats = self.client.stats
+        print(f"\nAPI请求 {stats['requests']} 次，重试 {stats['retries']} 次，触发限流 {stats['throttled']} 次，"
+              f"最终失败 {stats['failed']} 次，当前并发上限 {self.client.concurrency.current_limit}")
+        if stats['hedged']:
+            print(f"对冲请求 {stats['hedged']} 次，其中 {stats['hedge_wins']} 次先于原请求完成")
+        self._print_prefix_stats()
+        stats = self.write_stats
+        if stats["written"] or stats["unchanged"] or stats["failed"]:
+            print(f"写入阶段: 写入 {stats['written']} 个文件，内容未变跳过 {stats['unchanged']} 个，"
+                  f"失败 {stats['failed']} 个，创建目录 {stats['directories']} 次，写入耗时 {stats['seconds']:.2f}s")
+        stats = self.validation_stats
+        if stats["checked"]:
+            print(f"语法校验 {stats['checked']} 个Python文件：提取代码块修复 {stats['extracted']} 个，"
+                  f"重新生成修复 {stats['retried']} 个，仍未通过 {stats['invalid']} 个，"
+                  f"升级模型重新生成 {stats['escalated']} 次")
+        if self.validator is not None and self._owns_validator:
+            self.validator.close()
+        if self._failed_files:
+            print(f"\n{len(self._failed_files)} 个文件生成失败或未通过语法校验，下次构建时将重新生成")
+        self._print_trace_summary()
+        print(f"\n项目构建完成！文件保存in: {self.output_dir}")
 
     def build_project(self, md_file_path: str):
         """构建整个项目"""
         print("开始构建项目...")
-        project_files = self.parse_project_structure(md_file_path)
         
-        print(f"发现 {len(project_files)} 个文件需要生成")
+        batches, project_files, graph = self._prepare_build(md_file_path)
         
-        # 按类型分组处理
-        files_by_type = {}
-        for file_path, file_info in project_files.items():
-            file_type = file_info['type']
-            if file_type not in files_by_type:
-                files_by_type[file_type] = []
-            files_by_type[file_type].append((file_path, file_info))
+        # 小文件没有依赖关系，先合并生成
+        if batches:
+            print(f"\n批量生成小文件 ({len(batches)} 个请求)...")
+            for batch in batches:
+                self._generate_and_save_batch(batch)
         
-        # 按优先级处理
-        priority_order = ['requirements', 'config', 'database', 'model', 'schema', 'service', 'router', 'main', 'test', 'migration', 'docker', 'util']
+        # 按依赖图的拓扑顺序逐个生成
+        for file_path in graph.order:
+            self._generate_and_save_file(file_path, project_files[file_path])
         
-        for file_type in priority_order:
-            if file_type in files_by_type:
-                print(f"\n处理 {file_type} 类型文件...")
-                for file_path, file_info in files_by_type[file_type]:
-                    self._generate_and_save_file(file_path, file_info)
+        self._finish_build()
+
+    async def abuild_project(self, md_file_path: str, max_concurrency: int = None,
+                             semaphore: asyncio.Semaphore = None):
+        """异步构建整个项目：每个文件在自己的依赖全部完成后立即开始生成
+
+        semaphore 由多项目构建传入时，各项目的文件共用同一个工作池。
+        """
+        print("开始异步构建项目...")
         
-        print(f"\n项目构建完成！文件保存in: {self.output_dir}")
+        batches, project_files, graph = self._prepare_build(md_file_path)
+        
+        # 所有文件共享同一个并发上限
+        semaphore = semaphore or asyncio.Semaphore(max_concurrency or self.max_concurrency)
+        
+        if batches:
+            print(f"\n批量生成小文件 ({len(batches)} 个请求)...")
+            await asyncio.gather(*(self._agenerate_and_save_batch(batch, semaphore) for batch in batches))
+        
+        if graph:
+            print(f"\n按依赖关系并发生成 {len(graph)} 个文件...")
+            await graph.arun(
+                lambda file_path: self._agenerate_and_save_file(file_path, project_files[file_path], semaphore)
+            )
+        
+        self._finish_build()
+
+    async def apipeline_build(self, requirement: str, skeleton_chain: Runnable, spec_path: str,
+                              max_concurrency: int = None, semaphore: asyncio.Semaphore = None):
+        """流水线构建：流式生成项目骨架，每个文件段落完整后立即开始生成该文件
+
+        文件生成与骨架生成重叠进行，不必等待完整的项目结构写入磁盘；完整的骨架最终仍保存到
+        spec_path，之后可以直接用于普通构建。流水线模式按段落到达的顺序生成文件，不合并小文件请求。
+        """
+        print("开始流水线构建项目...")
+        self.tracer.start()
+        self.manifest = BuildManifest.load(self.output_dir)
+        self._failed_files = set()
+        self._reset_validation_stats()
+        self._reset_write_stats()
+        self.prefix_stats = PrefixCacheStats()
+        journaled = self._open_journal()
+        self.writer.prepare(self.output_dir).add_done_callback(self._on_directories_created)
+        semaphore = semaphore or asyncio.Semaphore(max_concurrency or self.max_concurrency)
+        # 文件清单在骨架完成前未知，项目上下文使用需求描述，保证所有请求的前缀一致
+        self.project_context = format_project_context([], requirement=requirement)
+        self.cache_context = self.project_context
+        
+        stream = SpecStream(self.classifier)
+        spec_hashes = {}
+        tasks = []
+        started = time.perf_counter()
+        first_dispatch = None
+        
+        def dispatch(file_specs):
+            nonlocal first_dispatch
+            for file_spec in file_specs:
+                if not self._should_generate_file(file_spec.path):
+                    continue
+                file_info = file_spec.to_file_info()
+                spec_hash = hash_spec(file_info, self._get_template(file_info['type']))
+                spec_hashes[file_spec.path] = spec_hash
+                if self.incremental and self.manifest.status(file_spec.path, spec_hash) == "unchanged":
+                    continue
+                entry = journaled.pop(file_spec.path, None)
+                if entry is not None and self.manifest.restore(file_spec.path, entry, spec_hash):
+                    print(f"  断点续建，跳过: {file_spec.path}")
+                    continue
+                if first_dispatch is None:
+                    first_dispatch = time.perf_counter() - started
+                print(f"  段落完成: {file_spec.path} (类型: {file_spec.type})")
+                if not self._render_local_file(file_spec.path, file_info):
+                    tasks.append(asyncio.create_task(
+                        self._agenerate_and_save_file(file_spec.path, file_info, semaphore)
+                    ))
+        
+        inputs = {"requirement": requirement}
+        request_tokens = estimate_tokens(skeleton_prompt.format(**inputs)) + SKELETON_MAX_TOKENS
+        chunks = []
+        try:
+            with self.tracer.span(str(spec_path), "skeleton"):
+                async for chunk in self.client.astream(skeleton_chain, inputs, request_tokens):
+                    chunks.append(chunk)
+                    dispatch(stream.feed(chunk))
+            dispatch(stream.close())
+        finally:
+            # 骨架生成失败时，已经开始的文件仍然完成并保存
+            await asyncio.gather(*tasks)
+        skeleton_seconds = time.perf_counter() - started
+        
+        with AtomicFileWriter(Path(spec_path)) as writer:
+            writer.write(clean_markdown_content(''.join(chunks)))
+        self.path_trie = stream.trie
+        if first_dispatch is None:
+            print(f"\n项目结构已生成到 {spec_path}（骨架耗时 {skeleton_seconds:.1f}s，没有需要重新生成的文件）")
+        else:
+            print(f"\n项目结构已生成到 {spec_path}（骨架耗时 {skeleton_seconds:.1f}s，"
+                  f"首个文件在 {first_dispatch:.1f}s 时开始生成）")
+        
+        # 删除已移除的文件前等待写入完成，避免清理空目录时与队列中的文件冲突
+        self.writer.flush()
+        with self._record_lock:
+            for file_path in self.manifest.diff(spec_hashes).removed:
+                self.manifest.delete_file(file_path)
+        
+        self._finish_build()
+
+    def _print_prefix_stats(self):
+        """输出本次构建的提示前缀复用情况"""
+        stats = self.prefix_stats
+        if not stats.requests:
+            return
+        print(f"提示前缀: {stats.requests} 次请求使用 {stats.distinct_prefixes} 种系统消息，"
+              f"所有请求共享前缀约 {stats.common_prefix_tokens} token；"
+              f"可复用前缀共约 {stats.shared_tokens} token，占输入token的 {stats.shared_tokens / max(1, stats.prompt_tokens):.0%}")
+
+    def _print_trace_summary(self):
+        """输出按文件类型汇总的耗时（秒）与token用量"""
+        self.tracer.close()
+        if self.tracer.records:
+            print(f"\n各类型文件耗时统计（秒），详细记录见 {self.tracer.trace_path}:")
+            print(self.tracer.summary_table())
+
+    def _print_cache_stats(self):
+        """输出本次构建的缓存命中情况"""
+        if self.cache is not None:
+            print(f"\n缓存命中 {self.cache.hits} 次，未命中 {self.cache.misses} 次（共 {len(self.cache)} 条缓存）")
 
     def _generate_and_save_file(self, file_path: str, file_info: Dict):
         """生成并保存单个文件"""
         print(f"  生成: {file_path}")
         
-        # 生成文件内容
-        content = self.generate_file_content(file_path, file_info)
+        with self.tracer.span(file_path, file_info['type']):
+            if self.streaming:
+                self._stream_and_save_file(file_path, file_info)
+                return
+            
+            # 生成文件内容
+            content = self.generate_file_content(file_path, file_info)
+            self._save_file(file_path, content, file_info)
+
+    async def _agenerate_and_save_file(self, file_path: str, file_info: Dict, semaphore: asyncio.Semaphore):
+        """异步生成并保存单个文件，受信号量限制并发数"""
+        with self.tracer.span(file_path, file_info['type']) as span:
+            queued_at = time.perf_counter()
+            async with semaphore:
+                span.add("queue_wait", time.perf_counter() - queued_at)
+                print(f"  生成: {file_path}")
+                if self.streaming:
+                    await self._astream_and_save_file(file_path, file_info)
+                    return
+                content = await self.agenerate_file_content(file_path, file_info)
+            self._save_file(file_path, content, file_info)
+
+    def _stream_and_save_file(self, file_path: str, file_info: Dict):
+        """流式生成单个文件：边接收边清理，接收完成后交给写入阶段"""
+        with span_timer("prompt_render"):
+            chain, inputs, request_tokens = self._prepare_generation(file_path, file_info)
+            cache_key, cached = self._lookup_cache(file_path, file_info, inputs)
+        if cached is not None:
+            set_span_status("cached")
+            self._save_file(file_path, cached, file_info)
+            return
         
-        # 创建目录结构
-        full_path = self.output_dir / file_path
-        full_path.parent.mkdir(parents=True, exist_ok=True)
+        self._record_prefix(self._file_prompt(file_info), inputs)
+        cleaner = StreamingCleaner(language_for_path(file_path))
+        parts = []
+        started = time.perf_counter()
+        try:
+            stream = self.client.stream(chain, inputs, request_tokens)
+            try:
+                for chunk in stream:
+                    self._clean_stream_chunk(file_path, parts, cleaner, chunk, started)
+                    if cleaner.done:
+                        break
+            finally:
+                # 提前结束时关闭底层连接，不再接收解释文字
+                stream.close()
+            self._clean_stream_chunk(file_path, parts, cleaner, None, started)
+        except Exception as e:
+            print(f"生成 {file_path} 时出错: {e}")
+            self._failed_files.add(file_path)
+            set_span_status("fallback")
+            self._save_file(file_path, self._get_fallback_content(file_path, file_info['type']), file_info)
+            return
+        content, valid = self.validate_content(file_path, file_info, ''.join(parts))
+        self._finish_stream(file_path, file_info, cache_key, content, valid)
+
+    async def _astream_and_save_file(self, file_path: str, file_info: Dict):
+        """异步流式生成单个文件"""
+        with span_timer("prompt_render"):
+            chain, inputs, request_tokens = self._prepare_generation(file_path, file_info)
+            cache_key, cached = self._lookup_cache(file_path, file_info, inputs)
+        if cached is not None:
+            set_span_status("cached")
+            self._save_file(file_path, cached, file_info)
+            return
         
-        # 保存文件
+        self._record_prefix(self._file_prompt(file_info), inputs)
+        cleaner = StreamingCleaner(language_for_path(file_path))
+        parts = []
+        started = time.perf_counter()
         try:
-            with open(full_path, 'w', encoding='utf-8') as f:
-                f.write(content)
-            print(f"    已保存: {full_path}")
+            stream = self.client.astream(chain, inputs, request_tokens)
+            try:
+                async for chunk in stream:
+                    self._clean_stream_chunk(file_path, parts, cleaner, chunk, started)
+                    if cleaner.done:
+                        break
+            finally:
+                # 提前结束时关闭底层连接，不再接收解释文字
+                await stream.aclose()
+            self._clean_stream_chunk(file_path, parts, cleaner, None, started)
         except Exception as e:
-            print(f"    保存失败: {e}")
+            print(f"生成 {file_path} 时出错: {e}")
+            self._failed_files.add(file_path)
+            set_span_status("fallback")
+            self._save_file(file_path, self._get_fallback_content(file_path, file_info['type']), file_info)
+            return
+        content, valid = await self.avalidate_content(file_path, file_info, ''.join(parts))
+        self._finish_stream(file_path, file_info, cache_key, content, valid)
+
+    def _clean_stream_chunk(self, file_path: str, parts: List[str], cleaner: StreamingCleaner,
+                            chunk: Optional[str], started: float):
+        """清理流式片段并追加到 parts（chunk为None时追加剩余内容），并报告首字节耗时"""
+        with span_timer("cleanup"):
+            text = cleaner.finish() if chunk is None else cleaner.feed(chunk)
+        if text:
+            if not parts:
+                print(f"    首字节: {file_path} ({time.perf_counter() - started:.2f}s)")
+            parts.append(text)
+
+    def _finish_stream(self, file_path: str, file_info: Dict, cache_key: Optional[str], content: str,
+                       valid: bool = True):
+        """流式接收完成后与一次性生成的内容一样交给写入阶段，通过校验的内容写入缓存"""
+        self._save_file(file_path, content, file_info)
+        if cache_key and valid:
+            self.cache.put(cache_key, content)
+
+    def _save_file(self, file_path: str, content: str, file_info: Dict):
+        """将内容交给写入阶段，写入完成后记入构建清单（不等待磁盘写入）"""
+        # 依赖该文件的提示直接使用内存中的内容，不必等写入完成
+        self.symbol_index.update(file_path, content)
+        # 写入在后台完成，耗时在写入完成后计入当前文件的span
+        span = current_span.get()
+        self.tracer.hold(span)
+        self.writer.submit(self.output_dir / file_path, content,
+                           lambda result: self._on_written(file_path, result, file_info, span))
+
+    def _on_directories_created(self, future):
+        """目录树创建完成（回调在写入线程执行完它之后、执行下一个任务之前运行，flush 返回时已执行）"""
+        with self._record_lock:
+            self.write_stats["directories"] += future.result()
+
+    def _on_written(self, file_path: str, result: WriteResult, file_info: Dict, span: Optional[FileSpan] = None):
+        """写入完成回调（在写入线程中紧接着写入执行）"""
+        self.tracer.release(span, "write", result.seconds)
+        with self._record_lock:
+            self.write_stats["seconds"] += result.seconds
+            self.write_stats["directories"] += result.directories
+            if result.error is not None:
+                self.write_stats["failed"] += 1
+                self.manifest.forget(file_path)
+            else:
+                self.write_stats["written" if result.changed else "unchanged"] += 1
+        if result.error is not None:
+            print(f"    保存失败: {result.error}")
+            return
+        print(f"    已保存: {result.path}" if result.changed else f"    内容未变，保留原文件: {result.path}")
+        self._record_written(file_path, file_info, result.content_hash)
+
+    def _record_written(self, file_path: str, file_info: Dict, content_hash: str):
+        """将成功写入的文件记入构建清单和构建日志，后备内容不记录"""
+        with self._record_lock:
+            if file_path in self._failed_files:
+                self.manifest.forget(file_path)
+                return
+            spec_hash = hash_spec(file_info, self._get_template(file_info['type']))
+            self.manifest.record(file_path, spec_hash, content_hash)
+            try:
+                self.journal.append(file_path, spec_hash, content_hash)
+            except OSError as e:
+                print(f"    写入构建日志失败: {e}")
 
     # 模板定义（在所有模板中添加清理指令）
-    def _get_database_template(self) -> str:
+    def _get_batch_template(self) -> str:
         return """
-你是一个数据库连接专家。请根据以下信息生成完整的数据库连接文件：
+你是一个项目脚手架专家。用户会给出多个小文件的清单，请一次性生成清单中每个文件的完整内容。
 
-文件路径: {file_path}
-文件描述: {description}
-需要实现的函数: {functions}
+要求：
+1. 每个文件都必须按照下面的格式输出，文件路径与上面的清单完全一致
+2. 包初始化文件只包含必要的模块文档字符串和导出
+3. 不要遗漏清单中的任何文件，不要输出清单以外的文件
+
+输出格式：
+{start_marker}
+（文件内容）
+{end_marker}
+
+重要：文件内容中不要使用```代码块标记，不要在标记之外输出任何解释文字！
+"""
+
+    def _get_fix_template(self) -> str:
+        return """
+你是一个Python代码修复专家。用户会给出为项目中某个文件生成的代码及其编译时出现的语法错误。
+
+要求：
+1. 修复语法错误，保持原有的功能和接口不变
+2. 输出修复后的完整文件内容，不要只输出修改的部分
+3. 不要附加任何解释说明
+
+重要：请直接输出Python代码，不要使用```python```标记，不要使用任何Markdown格式！
+只输出纯Python代码内容。
+"""
+
+    def _get_database_template(self) -> str:
+        return """
+你是一个数据库连接专家。请根据用户给出的文件信息生成完整的数据库连接文件：
 
 要求：
 1. 使用SQLAlchemy创建数据库连接
@@ -361,10 +1122,7 @@ CMD ["uvicorn", "app.main:app", "--host", "0.0.0.0", "--port", "8000"]
 
     def _get_docker_template(self) -> str:
         return """
-你是一个Docker专家。请根据以下信息生成完整的Dockerfile：
-
-文件路径: {file_path}
-文件描述: {description}
+你是一个Docker专家。请根据用户给出的文件信息生成完整的Dockerfile：
 
 要求：
 1. 使用Python 3.11基础镜像
@@ -379,10 +1137,7 @@ CMD ["uvicorn", "app.main:app", "--host", "0.0.0.0", "--port", "8000"]
 
     def _get_requirements_template(self) -> str:
         return """
-你是一个Python依赖管理专家。请根据以下信息生成完整的requirements.txt：
-
-文件路径: {file_path}
-文件描述: {description}
+你是一个Python依赖管理专家。请根据用户给出的文件信息生成完整的requirements.txt：
 
 要求：
 1. 包含FastAPI和相关依赖
@@ -397,11 +1152,7 @@ CMD ["uvicorn", "app.main:app", "--host", "0.0.0.0", "--port", "8000"]
 
     def _get_router_template(self) -> str:
         return """
-你是一个FastAPI路由专家。请根据以下信息生成完整的API路由文件：
-
-文件路径: {file_path}
-文件描述: {description}
-需要实现的函数: {functions}
+你是一个FastAPI路由专家。请根据用户给出的文件信息生成完整的API路由文件：
 
 要求：
 1. 使用FastAPI框架
@@ -418,11 +1169,7 @@ CMD ["uvicorn", "app.main:app", "--host", "0.0.0.0", "--port", "8000"]
 
     def _get_model_template(self) -> str:
         return """
-你是一个SQLAlchemy数据库模型专家。请根据以下信息生成完整的数据模型文件：
-
-文件路径: {file_path}
-文件描述: {description}
-需要实现的类: {functions}
+你是一个SQLAlchemy数据库模型专家。请根据用户给出的文件信息生成完整的数据模型文件：
 
 要求：
 1. 使用SQLAlchemy ORM
@@ -439,11 +1186,7 @@ CMD ["uvicorn", "app.main:app", "--host", "0.0.0.0", "--port", "8000"]
 
     def _get_schema_template(self) -> str:
         return """
-你是一个Pydantic模式专家。请根据以下信息生成完整的数据验证模式文件：
-
-文件路径: {file_path}
-文件描述: {description}
-需要实现的类: {functions}
+你是一个Pydantic模式专家。请根据用户给出的文件信息生成完整的数据验证模式文件：
 
 要求：
 1. 使用Pydantic BaseModel
@@ -460,11 +1203,7 @@ CMD ["uvicorn", "app.main:app", "--host", "0.0.0.0", "--port", "8000"]
 
     def _get_service_template(self) -> str:
         return """
-你是一个业务逻辑服务专家。请根据以下信息生成完整的服务层文件：
-
-文件路径: {file_path}
-文件描述: {description}
-需要实现的函数: {functions}
+你是一个业务逻辑服务专家。请根据用户给出的文件信息生成完整的服务层文件：
 
 要求：
 1. 实现完整的业务逻辑函数
@@ -481,11 +1220,7 @@ CMD ["uvicorn", "app.main:app", "--host", "0.0.0.0", "--port", "8000"]
 
     def _get_config_template(self) -> str:
         return """
-你是一个配置管理专家。请根据以下信息生成完整的配置文件：
-
-文件路径: {file_path}
-文件描述: {description}
-需要实现的类: {functions}
+你是一个配置管理专家。请根据用户给出的文件信息生成完整的配置文件：
 
 要求：
 1. 使用Pydantic Settings
@@ -502,11 +1237,7 @@ CMD ["uvicorn", "app.main:app", "--host", "0.0.0.0", "--port", "8000"]
 
     def _get_test_template(self) -> str:
         return """
-你是一个测试专家。请根据以下信息生成完整的测试文件：
-
-文件路径: {file_path}
-文件描述: {description}
-需要实现的测试函数: {functions}
+你是一个测试专家。请根据用户给出的文件信息生成完整的测试文件：
 
 要求：
 1. 使用pytest框架
@@ -523,11 +1254,7 @@ CMD ["uvicorn", "app.main:app", "--host", "0.0.0.0", "--port", "8000"]
 
     def _get_migration_template(self) -> str:
         return """
-你是一个数据库迁移专家。请根据以下信息生成完整的迁移文件：
-
-文件路径: {file_path}
-文件描述: {description}
-需要实现的函数: {functions}
+你是一个数据库迁移专家。请根据用户给出的文件信息生成完整的迁移文件：
 
 要求：
 1. 使用Alembic迁移框架
@@ -544,11 +1271,7 @@ CMD ["uvicorn", "app.main:app", "--host", "0.0.0.0", "--port", "8000"]
 
     def _get_util_template(self) -> str:
         return """
-你是一个工具函数专家。请根据以下信息生成完整的工具文件：
-
-文件路径: {file_path}
-文件描述: {description}
-需要实现的函数: {functions}
+你是一个工具函数专家。请根据用户给出的文件信息生成完整的工具文件：
 
 要求：
 1. 实现实用的工具函数
@@ -565,11 +1288,7 @@ CMD ["uvicorn", "app.main:app", "--host", "0.0.0.0", "--port", "8000"]
 
     def _get_main_template(self) -> str:
         return """
-你是一个FastAPI应用专家。请根据以下信息生成完整的主应用文件：
-
-文件路径: {file_path}
-文件描述: {description}
-需要实现的函数: {functions}
+你是一个FastAPI应用专家。请根据用户给出的文件信息生成完整的主应用文件：
 
 要求：
 1. 创建FastAPI应用实例
@@ -588,6 +1307,55 @@ CMD ["uvicorn", "app.main:app", "--host", "0.0.0.0", "--port", "8000"]
 
 # 使用示例
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="根据项目结构Markdown文件生成完整项目")
+    parser.add_argument("--structure", default="project_structure.md", help="项目结构文件路径（Markdown、JSON或YAML）")
+    parser.add_argument("--output", default="fastapi_blog_system_fixed", help="输出目录")
+    parser.add_argument("--model", default=DEFAULT_MODEL, help="生成代码使用的模型")
+    parser.add_argument("--base-url", default=DEFAULT_BASE_URL, help="OpenAI兼容接口地址")
+    parser.add_argument("--async", dest="use_async", action="store_true",
+                        help="异步构建：按依赖图调度，每个文件在它依赖的文件生成后立即开始，互不依赖的文件并发生成")
+    parser.add_argument("--max-concurrency", type=int, default=DEFAULT_MAX_CONCURRENCY,
+                        help="异步构建时同时进行的最大请求数")
+    parser.add_argument("--no-cache", action="store_true", help="跳过生成结果缓存，所有文件重新调用API")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR, help="生成结果缓存目录")
+    parser.add_argument("--cache-max-mb", type=int, default=DEFAULT_CACHE_MAX_BYTES // (1024 * 1024),
+                        help="缓存容量上限（MB），超出后按LRU淘汰")
+    parser.add_argument("--full-rebuild", action="store_true",
+                        help="忽略构建清单，重新生成所有文件")
+    parser.add_argument("--resume", action="store_true",
+                        help="从上次中断的构建日志续建，跳过日志中已完成且规格未变的文件")
+    parser.add_argument("--stream", action="store_true",
+                        help="流式生成：边接收边清理Markdown围栏并输出首字节耗时，接收完成后交给写入阶段")
+    parser.add_argument("--rpm", type=float, default=None, help="每分钟请求数上限（令牌桶限流）")
+    parser.add_argument("--tpm", type=float, default=None, help="每分钟token数上限（令牌桶限流）")
+    parser.add_argument("--max-retries", type=int, default=DEFAULT_MAX_RETRIES,
+                        help="遇到429或临时错误时的最大重试次数（抖动指数退避）")
+    parser.add_argument("--no-batch", action="store_true", help="不合并小文件请求，每个文件单独调用API")
+    parser.add_argument("--render-engine", action="append", default=[], metavar="KIND=ENGINE",
+                        help="指定某类文件的渲染引擎（local 或 llm），如 requirements=llm，可重复使用")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="每个合并请求最多包含的小文件数")
+    parser.add_argument("--trace", default=None,
+                        help=f"逐文件追踪记录（JSONL）的保存路径，默认为输出目录下的 {TRACE_FILENAME}")
+    parser.add_argument("--file-types", default=str(DEFAULT_FILE_TYPES_PATH),
+                        help="文件类型分类规则（JSON），规则顺序即优先级")
+    parser.add_argument("--pipeline", default=None, metavar="REQUIREMENT",
+                        help="流水线模式：根据需求流式生成项目骨架（保存到 --structure），每个文件段落完成后立即开始生成")
+    parser.add_argument("--skeleton-model", default=SKELETON_MODEL, help="流水线模式生成骨架使用的模型")
+    parser.add_argument("--no-validate", action="store_true", help="不对生成的Python文件做语法校验")
+    parser.add_argument("--tiered", action="store_true",
+                        help="模型分层：简单文件使用小模型，服务层和路由使用大模型，语法校验失败时升级到大模型")
+    parser.add_argument("--fast-model", default=DEFAULT_TIER_MODELS["fast"], help="模型分层时小模型层级使用的模型")
+    parser.add_argument("--strong-model", default=DEFAULT_TIER_MODELS["strong"], help="模型分层时大模型层级使用的模型")
+    parser.add_argument("--hedge", action="store_true",
+                        help="对冲请求：单文件生成耗时超过同类型文件近期延迟的百分位时再发一个相同的请求，先完成的胜出")
+    parser.add_argument("--hedge-percentile", type=float, default=DEFAULT_HEDGE_PERCENTILE,
+                        help="触发对冲请求的延迟百分位（默认 0.95）")
+    parser.add_argument("--hedge-budget", type=float, default=DEFAULT_HEDGE_BUDGET,
+                        help="对冲请求占单文件调用数的比例上限（默认 0.1）")
+    parser.add_argument("--validation-retries", type=int, default=DEFAULT_VALIDATION_RETRIES,
+                        help="语法校验未通过且无法提取有效代码块时，带着错误信息重新生成的次数")
+    args = parser.parse_args()
+    
     # 检查API密钥
     if API_KEY == "your-api-key-here":
         print("错误：请设置正确的API密钥")
@@ -596,11 +1364,47 @@ if __name__ == "__main__":
         exit(1)
     
     # 配置
-    PROJECT_STRUCTURE_FILE = "project_structure.md"
-    OUTPUT_DIR = "fastapi_blog_system_fixed"
+    render_engines = {}
+    for item in args.render_engine:
+        kind, _, engine = item.partition("=")
+        render_engines[kind.strip()] = engine.strip()
+    PROJECT_STRUCTURE_FILE = args.structure
+    OUTPUT_DIR = args.output
     
     # 创建项目构建器
-    builder = ProjectBuilder(output_dir=OUTPUT_DIR)
+    builder = ProjectBuilder(
+        output_dir=OUTPUT_DIR,
+        max_concurrency=args.max_concurrency,
+        use_cache=not args.no_cache,
+        cache_dir=args.cache_dir,
+        cache_max_bytes=args.cache_max_mb * 1024 * 1024,
+        incremental=not args.full_rebuild,
+        resume=args.resume,
+        streaming=args.stream,
+        batch_small_files=not args.no_batch,
+        batch_size=args.batch_size,
+        render_engines=render_engines,
+        requests_per_minute=args.rpm,
+        tokens_per_minute=args.tpm,
+        max_retries=args.max_retries,
+        model=args.model,
+        base_url=args.base_url,
+        trace_path=args.trace,
+        file_types_path=args.file_types,
+        validate=not args.no_validate,
+        validation_retries=args.validation_retries,
+        hedge=args.hedge,
+        hedge_percentile=args.hedge_percentile,
+        hedge_budget=args.hedge_budget,
+        model_tiers={"fast": args.fast_model, "strong": args.strong_model} if args.tiered else None
+    )
     
     # 构建项目
-    builder.build_project(PROJECT_STRUCTURE_FILE)
\ No newline at end of file
+    if args.pipeline:
+        # 重试由 LLMClient 统一处理
+        skeleton_chain = create_skeleton_chain(args.skeleton_model, args.base_url, max_retries=0)
+        asyncio.run(builder.apipeline_build(args.pipeline, skeleton_chain, PROJECT_STRUCTURE_FILE))
+    elif args.use_async:
+        asyncio.run(builder.abuild_project(PROJECT_STRUCTURE_FILE))
+    else:
+        builder.build_project(PROJECT_STRUCTURE_FILE)
\ No newline at end of file
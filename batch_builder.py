@@ -0,0 +1,281 @@
+import json
+import asyncio
+import argparse
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional
+from langchain_core.runnables import Runnable
+from Router import (
+    prompt as skeleton_prompt, create_skeleton_chain, clean_markdown_content,
+    SKELETON_MODEL, SKELETON_MAX_TOKENS
+)
+from Routerchain import (
+    ProjectBuilder, create_chat_model, API_KEY, DEFAULT_MODEL, DEFAULT_BASE_URL, DEFAULT_MAX_CONCURRENCY
+)
+from llm_client import LLMClient, HedgePolicy, DEFAULT_MAX_RETRIES
+from generation_cache import GenerationCache, DEFAULT_CACHE_DIR, DEFAULT_CACHE_MAX_BYTES
+from build_manifest import hash_text
+from model_router import DEFAULT_TIER_MODELS
+from file_writer import AtomicFileWriter, TreeWriter
+from code_validator import CodeValidator
+from token_budget import estimate_tokens
+
+# 每个项目输出目录中的进度文件
+PROGRESS_FILENAME = ".batch_progress.json"
+
+# 未指定项目结构文件时的默认文件名（位于项目输出目录中）
+DEFAULT_SPEC_FILENAME = "project_structure.md"
+
+
+class ProjectJob(NamedTuple):
+    """批量清单中的一个项目"""
+    name: str
+    requirement: Optional[str]   # 为空时直接使用已有的项目结构文件
+    spec: Path
+    output: Path
+
+
+def load_jobs(manifest_path: str, output_root: str) -> List[ProjectJob]:
+    """读取JSONL批量清单
+
+    每行一个项目，支持的字段：
+    - requirement 或 body（可附带 title）：需求描述，用于生成项目骨架
+    - spec：项目结构文件路径，默认为输出目录下的 project_structure.md
+    - output：输出目录，默认为 output_root 下以项目名命名的目录
+    - request_id / id / name：项目名
+    相对路径按清单文件所在目录解析。
+    """
+    base_dir = Path(manifest_path).resolve().parent
+    jobs = []
+    names = set()
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"批量清单第 {line_number} 行不是有效的JSON: {e}")
+
+            name = str(entry.get('request_id') or entry.get('id') or entry.get('name') or f"project-{line_number}")
+            if name in names:
+                raise ValueError(f"批量清单第 {line_number} 行的项目名重复: {name}")
+            names.add(name)
+
+            requirement = entry.get('requirement') or entry.get('body')
+            if requirement and entry.get('title') and not entry.get('requirement'):
+                requirement = f"{entry['title']}\n\n{requirement}"
+
+            output = base_dir / entry['output'] if entry.get('output') else Path(output_root) / name
+            spec = base_dir / entry['spec'] if entry.get('spec') else output / DEFAULT_SPEC_FILENAME
+            if not requirement and not spec.exists():
+                raise ValueError(f"批量清单第 {line_number} 行既没有需求描述，项目结构文件也不存在: {spec}")
+            jobs.append(ProjectJob(name, requirement, spec, output))
+    return jobs
+
+
+class ProjectProgress:
+    """单个项目的批量构建进度，保存在输出目录中以便中断后续跑"""
+
+    def __init__(self, output_dir: Path):
+        self.path = Path(output_dir) / PROGRESS_FILENAME
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.state = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            self.state = {}
+
+    def skeleton_done(self, requirement: str, spec: Path) -> bool:
+        """需求未变化且骨架文件仍存在时跳过骨架生成"""
+        return self.state.get('requirement') == hash_text(requirement) and spec.exists()
+
+    def build_done(self, spec_hash: str) -> bool:
+        """项目结构未变化且上次构建没有失败文件时跳过文件生成"""
+        return self.state.get('status') == 'done' and self.state.get('spec') == spec_hash
+
+    def update(self, **fields):
+        """更新并原子地保存进度"""
+        self.state.update(fields)
+        with AtomicFileWriter(self.path) as writer:
+            writer.write(json.dumps(self.state, ensure_ascii=False, indent=2, sort_keys=True))
+
+
+class BatchBuilder:
+    """多项目批量构建：所有项目的骨架生成和文件生成共用一个限流客户端和工作池"""
+
+    def __init__(self, jobs: List[ProjectJob], client: LLMClient, skeleton_chain: Runnable,
+                 max_concurrency: int = DEFAULT_MAX_CONCURRENCY, force: bool = False,
+                 cache: GenerationCache = None, builder_options: Dict = None, pipeline: bool = False):
+        self.jobs = jobs
+        self.client = client
+        self.skeleton_chain = skeleton_chain
+        self.max_concurrency = max_concurrency
+        self.force = force
+        self.cache = cache
+        # 需要生成骨架的项目使用流水线构建，文件生成与骨架生成重叠
+        self.pipeline = pipeline
+        # 传给每个 ProjectBuilder 的其余参数（模型、流式、批量等）
+        self.builder_options = builder_options or {}
+        # 所有项目共用一个模型实例、一个校验进程池和一个写入线程，在 run 结束时统一关闭
+        self.llm = create_chat_model(
+            self.builder_options.get("model", DEFAULT_MODEL),
+            self.builder_options.get("base_url", DEFAULT_BASE_URL),
+            self.builder_options.get("api_key"),
+            self.builder_options.get("streaming", False)
+        )
+        self.validator = CodeValidator() if self.builder_options.get("validate", True) else None
+        self.writer = TreeWriter()
+
+    async def run(self) -> Dict[str, str]:
+        """并发处理所有项目，返回「项目名 -> 状态」"""
+        # 所有项目的请求共用同一个工作池
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        try:
+            statuses = await asyncio.gather(*(self._run_job(job, semaphore) for job in self.jobs))
+        finally:
+            self.writer.close()
+            if self.validator is not None:
+                self.validator.close()
+        return dict(zip((job.name for job in self.jobs), statuses))
+
+    async def _run_job(self, job: ProjectJob, semaphore: asyncio.Semaphore) -> str:
+        """处理单个项目，失败不影响其他项目"""
+        job.output.mkdir(parents=True, exist_ok=True)
+        progress = ProjectProgress(job.output)
+        try:
+            needs_skeleton = job.requirement and (self.force or not progress.skeleton_done(job.requirement, job.spec))
+            if needs_skeleton and self.pipeline:
+                # 流水线模式：骨架边生成边分发文件
+                builder = self._make_builder(job)
+                await builder.apipeline_build(job.requirement, self.skeleton_chain, str(job.spec), semaphore=semaphore)
+                progress.update(requirement=hash_text(job.requirement))
+            else:
+                if needs_skeleton:
+                    await self._generate_skeleton(job, semaphore)
+                    progress.update(requirement=hash_text(job.requirement), status='skeleton', error=None)
+
+                spec_hash = hash_text(job.spec.read_text(encoding='utf-8'))
+                if not self.force and progress.build_done(spec_hash):
+                    print(f"[{job.name}] 已完成，跳过")
+                    return 'skipped'
+
+                builder = self._make_builder(job)
+                await builder.abuild_project(str(job.spec), semaphore=semaphore)
+
+            # 有文件使用后备内容时保留未完成状态，下次运行时重新构建
+            status = 'partial' if builder._failed_files else 'done'
+            progress.update(spec=hash_text(job.spec.read_text(encoding='utf-8')), status=status, error=None)
+            return status
+        except Exception as e:
+            print(f"[{job.name}] 构建失败: {e}")
+            progress.update(status='failed', error=str(e))
+            return 'failed'
+
+    def _make_builder(self, job: ProjectJob) -> ProjectBuilder:
+        return ProjectBuilder(
+            output_dir=str(job.output),
+            client=self.client,
+            cache=self.cache,
+            use_cache=self.cache is not None,
+            llm=self.llm,
+            validator=self.validator,
+            writer=self.writer,
+            **self.builder_options
+        )
+
+    async def _generate_skeleton(self, job: ProjectJob, semaphore: asyncio.Semaphore):
+        """生成项目骨架并原子地写入项目结构文件"""
+        inputs = {"requirement": job.requirement}
+        estimated = estimate_tokens(skeleton_prompt.format(**inputs)) + SKELETON_MAX_TOKENS
+        async with semaphore:
+            print(f"[{job.name}] 正在生成项目结构...")
+            content = await self.client.ainvoke(self.skeleton_chain, inputs, estimated)
+        with AtomicFileWriter(job.spec) as writer:
+            writer.write(clean_markdown_content(content))
+        print(f"[{job.name}] 项目结构已生成到 {job.spec}")
+
+
+def print_batch_summary(statuses: Dict[str, str], client: LLMClient):
+    """输出各项目状态和共享客户端的请求统计"""
+    print("\n批量构建结果:")
+    for name, status in statuses.items():
+        print(f"  {name}: {status}")
+    counts = {}
+    for status in statuses.values():
+        counts[status] = counts.get(status, 0) + 1
+    print("、".join(f"{status} {count} 个" for status, count in sorted(counts.items())))
+    stats = client.stats
+    print(f"API请求共 {stats['requests']} 次，重试 {stats['retries']} 次，触发限流 {stats['throttled']} 次，"
+          f"最终失败 {stats['failed']} 次")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="根据JSONL清单批量生成多个项目")
+    parser.add_argument("--manifest", default="requests.jsonl", help="批量清单（JSONL，每行一个项目）")
+    parser.add_argument("--output-root", default="batch_projects", help="未指定 output 的项目的输出根目录")
+    parser.add_argument("--only", default=None, help="只处理指定的项目，逗号分隔")
+    parser.add_argument("--force", action="store_true", help="忽略进度文件，重新生成骨架并构建所有项目")
+    parser.add_argument("--model", default=DEFAULT_MODEL, help="生成代码使用的模型")
+    parser.add_argument("--skeleton-model", default=SKELETON_MODEL, help="生成项目骨架使用的模型")
+    parser.add_argument("--base-url", default=DEFAULT_BASE_URL, help="OpenAI兼容接口地址")
+    parser.add_argument("--max-concurrency", type=int, default=DEFAULT_MAX_CONCURRENCY,
+                        help="所有项目共享的最大并发请求数")
+    parser.add_argument("--rpm", type=float, default=None, help="所有项目共享的每分钟请求数上限")
+    parser.add_argument("--tpm", type=float, default=None, help="所有项目共享的每分钟token数上限")
+    parser.add_argument("--max-retries", type=int, default=DEFAULT_MAX_RETRIES,
+                        help="遇到429或临时错误时的最大重试次数（抖动指数退避）")
+    parser.add_argument("--no-cache", action="store_true", help="跳过生成结果缓存")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR, help="生成结果缓存目录")
+    parser.add_argument("--stream", action="store_true", help="流式生成")
+    parser.add_argument("--no-batch", action="store_true", help="不合并小文件请求")
+    parser.add_argument("--no-validate", action="store_true", help="不对生成的Python文件做语法校验")
+    parser.add_argument("--tiered", action="store_true",
+                        help="模型分层：简单文件使用小模型，服务层和路由使用大模型，语法校验失败时升级到大模型")
+    parser.add_argument("--hedge", action="store_true",
+                        help="对冲请求：单文件生成耗时超过同类型文件近期延迟的p95时再发一个相同的请求")
+    parser.add_argument("--resume", action="store_true",
+                        help="各项目从上次中断的构建日志续建，跳过已完成的文件")
+    parser.add_argument("--pipeline", action="store_true",
+                        help="流水线模式：骨架边生成边分发文件，不等待完整的项目结构")
+    args = parser.parse_args()
+
+    if API_KEY == "your-api-key-here":
+        print("错误：请设置正确的API密钥")
+        print("方法1：创建config.py文件并设置API_KEY变量")
+        print("方法2：设置环境变量SILICON_FLOW_API_KEY")
+        exit(1)
+
+    jobs = load_jobs(args.manifest, args.output_root)
+    if args.only:
+        selected = {name.strip() for name in args.only.split(',')}
+        jobs = [job for job in jobs if job.name in selected]
+    print(f"共 {len(jobs)} 个项目")
+
+    # 所有项目共用一个客户端：限流预算、退避和自适应并发在项目之间协调
+    client = LLMClient(
+        requests_per_minute=args.rpm,
+        tokens_per_minute=args.tpm,
+        max_concurrency=args.max_concurrency,
+        max_retries=args.max_retries,
+        hedge=HedgePolicy() if args.hedge else None
+    )
+    batch = BatchBuilder(
+        jobs,
+        client,
+        # 重试由共享客户端统一处理
+        create_skeleton_chain(args.skeleton_model, args.base_url, max_retries=0),
+        max_concurrency=args.max_concurrency,
+        force=args.force,
+        pipeline=args.pipeline,
+        cache=None if args.no_cache else GenerationCache(args.cache_dir, DEFAULT_CACHE_MAX_BYTES),
+        builder_options={
+            "model": args.model,
+            "base_url": args.base_url,
+            "streaming": args.stream,
+            "batch_small_files": not args.no_batch,
+            "validate": not args.no_validate,
+            "model_tiers": dict(DEFAULT_TIER_MODELS) if args.tiered else None,
+            "resume": args.resume,
+            "max_concurrency": args.max_concurrency,
+        }
+    )
+    print_batch_summary(asyncio.run(batch.run()), client)
@@ -0,0 +1,61 @@
+import re
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+# 多文件输出格式的分隔标记
+FILE_START_MARKER = "=== FILE: {file_path} ==="
+FILE_END_MARKER = "=== END FILE ==="
+
+# 预算不超过该值的文件视为小文件，可以合并到同一个请求中
+SMALL_FILE_MAX_TOKENS = 600
+DEFAULT_BATCH_SIZE = 8
+
+_START_PATTERN = re.compile(r'^\s*=== FILE:\s*(.+?)\s*===\s*$')
+_END_PATTERN = re.compile(r'^\s*=== END FILE ===\s*$')
+
+
+def batch_group_key(file_path: str, file_info: Dict) -> str:
+    """合并分组的依据：包初始化文件不论所在目录归为一组，其余按文件类型分组"""
+    if Path(file_path).name == '__init__.py':
+        return '__init__'
+    return file_info['type']
+
+
+def format_batch_files(batch: List[Tuple[str, Dict]]) -> str:
+    """将一批文件的信息格式化为提示中的文件清单"""
+    sections = []
+    for index, (file_path, file_info) in enumerate(batch, 1):
+        functions = ', '.join(file_info['functions']) if file_info['functions'] else '无特定函数'
+        sections.append(
+            f"{index}. 文件路径: {file_path}\n"
+            f"   文件类型: {file_info['type']}\n"
+            f"   文件描述: {file_info['description'] or '无'}\n"
+            f"   需要实现的函数: {functions}"
+        )
+    return "\n\n".join(sections)
+
+
+def parse_multi_file_output(text: str, expected_paths: List[str]) -> Dict[str, str]:
+    """解析多文件输出，只返回有完整起止标记且在预期列表中的文件"""
+    expected = set(expected_paths)
+    contents = {}
+    current_path = None
+    current_lines = []
+
+    for line in text.splitlines():
+        start = _START_PATTERN.match(line)
+        if start:
+            # 上一个文件缺少结束标记，视为解析失败
+            current_path = start.group(1).strip('`')
+            current_lines = []
+            continue
+        if _END_PATTERN.match(line):
+            if current_path in expected and current_path not in contents:
+                contents[current_path] = "\n".join(current_lines)
+            current_path = None
+            current_lines = []
+            continue
+        if current_path is not None:
+            current_lines.append(line)
+
+    return contents
@@ -0,0 +1,229 @@
+"""ProjectBuilder 离线性能基准
+
+启动本地模拟服务，对 10 / 100 / 1000 个文件的合成项目规格执行 build_project，
+报告总耗时、单次请求延迟的 p50/p95 以及吞吐量。
+
+运行：python benchmarks/bench_build.py --sizes 10,100,1000 --modes async
+"""
+import os
+import sys
+import math
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+from pathlib import Path
+from typing import Dict, List
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+# 本地服务不走代理
+os.environ.setdefault("NO_PROXY", "127.0.0.1,localhost")
+
+from Routerchain import ProjectBuilder  # noqa: E402
+from llm_client import LLMClient, HedgePolicy  # noqa: E402
+from fake_openai_server import FakeOpenAIServer, ServerConfig  # noqa: E402
+
+
+class TimedLLMClient(LLMClient):
+    """记录每次调用（含限流等待和重试）耗时的客户端"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.latencies: List[float] = []
+
+    def invoke(self, chain, inputs, estimated_tokens=0, hedge_key=None):
+        started = time.perf_counter()
+        try:
+            return super().invoke(chain, inputs, estimated_tokens, hedge_key)
+        finally:
+            self.latencies.append(time.perf_counter() - started)
+
+    async def ainvoke(self, chain, inputs, estimated_tokens=0, hedge_key=None):
+        started = time.perf_counter()
+        try:
+            return await super().ainvoke(chain, inputs, estimated_tokens, hedge_key)
+        finally:
+            self.latencies.append(time.perf_counter() - started)
+
+    def stream(self, chain, inputs, estimated_tokens=0):
+        started = time.perf_counter()
+        try:
+            yield from super().stream(chain, inputs, estimated_tokens)
+        finally:
+            self.latencies.append(time.perf_counter() - started)
+
+    async def astream(self, chain, inputs, estimated_tokens=0):
+        started = time.perf_counter()
+        try:
+            async for chunk in super().astream(chain, inputs, estimated_tokens):
+                yield chunk
+        finally:
+            self.latencies.append(time.perf_counter() - started)
+
+
+def make_spec(n_files: int) -> str:
+    """生成约 n_files 个文件的合成项目规格（Markdown）"""
+    entities = max(0, (n_files - 10) // 5)
+    names = [f"item{i}" for i in range(entities)]
+    layers = [
+        ("models", lambda name: f"{name}.py", lambda name: [name.capitalize()]),
+        ("schemas", lambda name: f"{name}.py", lambda name: [f"{name.capitalize()}Create", f"{name.capitalize()}Response"]),
+        ("services", lambda name: f"{name}_service.py", lambda name: [f"get_{name}()", f"create_{name}()"]),
+        ("routers", lambda name: f"{name}.py", lambda name: [f"list_{name}s()", f"get_{name}()", f"create_{name}()"]),
+    ]
+
+    tree = ["project/", "├── app/", "│   ├── __init__.py", "│   ├── main.py", "│   ├── config.py"]
+    sections = {
+        "app/main.py": ("创建FastAPI应用并注册路由", ["create_app()"]),
+        "app/config.py": ("应用配置", ["Settings", "get_settings()"]),
+    }
+    for index, (layer, file_name, functions) in enumerate(layers):
+        last_layer = index == len(layers) - 1
+        tree.append(f"│   {'└' if last_layer else '├'}── {layer}/")
+        indent = "│       " if last_layer else "│   │   "
+        entries = ["__init__.py"] + [file_name(name) for name in names]
+        for position, entry in enumerate(entries):
+            glyph = "└" if position == len(entries) - 1 else "├"
+            tree.append(f"{indent}{glyph}── {entry}")
+        for name in names:
+            sections[f"app/{layer}/{file_name(name)}"] = (f"{name} 的{layer}层实现", functions(name))
+
+    tree.append("├── tests/")
+    tests = ["__init__.py"] + [f"test_{name}.py" for name in names]
+    for position, entry in enumerate(tests):
+        glyph = "└" if position == len(tests) - 1 else "├"
+        tree.append(f"│   {glyph}── {entry}")
+    for name in names:
+        sections[f"tests/test_{name}.py"] = (f"{name} 接口测试", [f"test_create_{name}()", f"test_get_{name}()"])
+    tree.extend(["├── requirements.txt", "└── Dockerfile"])
+
+    parts = ["# 合成项目", "", "```", *tree, "```", ""]
+    for path, (description, functions) in sections.items():
+        parts.append(f"### `{path}`")
+        parts.append(description)
+        for function in functions:
+            kind = "Class" if function[:1].isupper() else "Function"
+            parts.append(f"- **{kind}**: `{function}`")
+        parts.append("")
+    return "\n".join(parts)
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    """最近秩法百分位数"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, math.ceil(fraction * len(ordered)) - 1))
+    return ordered[index]
+
+
+def run_once(server: FakeOpenAIServer, size: int, mode: str, args, hedge: bool = False) -> Dict:
+    """对指定规模的合成规格执行一次构建，hedge 为True时启用对冲请求"""
+    workdir = Path(tempfile.mkdtemp(prefix=f"bench_{size}_"))
+    spec_path = workdir / "project_structure.md"
+    spec_path.write_text(make_spec(size), encoding='utf-8')
+
+    builder = ProjectBuilder(
+        api_key="bench",
+        output_dir=str(workdir / "out"),
+        max_concurrency=args.concurrency,
+        use_cache=False,
+        incremental=False,
+        streaming=args.stream,
+        base_url=server.base_url,
+        model="fake-model",
+    )
+    builder.client = TimedLLMClient(max_concurrency=args.concurrency, max_retries=args.max_retries,
+                                    base_delay=args.retry_base_delay,
+                                    hedge=HedgePolicy(args.hedge_percentile, args.hedge_budget) if hedge else None)
+    requests_before = server.stats["requests"]
+
+    # 基准只关心耗时，屏蔽构建过程中的逐文件输出
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull, 'w', encoding='utf-8')
+    started = time.perf_counter()
+    try:
+        if mode == "async":
+            asyncio.run(builder.abuild_project(str(spec_path)))
+        else:
+            builder.build_project(str(spec_path))
+    finally:
+        wall = time.perf_counter() - started
+        sys.stdout.close()
+        sys.stdout = stdout
+
+    files = sum(1 for path in (workdir / "out").rglob("*") if path.is_file() and not path.name.startswith("."))
+    latencies = builder.client.latencies
+    return {
+        "size": size,
+        "mode": mode,
+        "hedge": hedge,
+        "hedged": builder.client.stats["hedged"],
+        "files": files,
+        "requests": server.stats["requests"] - requests_before,
+        "wall_seconds": wall,
+        "p50_seconds": percentile(latencies, 0.50),
+        "p95_seconds": percentile(latencies, 0.95),
+        "p99_seconds": percentile(latencies, 0.99),
+        "files_per_second": files / wall if wall > 0 else 0.0,
+    }
+
+
+def print_report(results: List[Dict]):
+    print(f"{'规模':>6} {'模式':>6} {'对冲':>6} {'文件数':>6} {'请求数':>6} {'总耗时(s)':>10} "
+          f"{'p50(s)':>8} {'p95(s)':>8} {'p99(s)':>8} {'吞吐(文件/s)':>12}")
+    for result in results:
+        hedged = str(result['hedged']) if result['hedge'] else "-"
+        print(f"{result['size']:>6} {result['mode']:>6} {hedged:>6} {result['files']:>6} {result['requests']:>6} "
+              f"{result['wall_seconds']:>10.2f} {result['p50_seconds']:>8.3f} {result['p95_seconds']:>8.3f} "
+              f"{result['p99_seconds']:>8.3f} {result['files_per_second']:>12.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="ProjectBuilder 离线性能基准")
+    parser.add_argument("--sizes", default="10,100,1000", help="合成规格的文件数，逗号分隔")
+    parser.add_argument("--modes", default="async", help="构建模式：async、sync，逗号分隔")
+    parser.add_argument("--concurrency", type=int, default=32, help="异步构建的并发上限")
+    parser.add_argument("--stream", action="store_true", help="使用流式生成")
+    parser.add_argument("--latency", type=float, default=0.2, help="模拟延迟中位数（秒）")
+    parser.add_argument("--latency-sigma", type=float, default=0.5, help="延迟对数正态分布的sigma")
+    parser.add_argument("--tokens-per-second", type=float, default=2000, help="模拟生成速度")
+    parser.add_argument("--completion-tokens", type=int, default=400, help="模拟回复的token数")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="模拟429的概率")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="模拟500的概率")
+    parser.add_argument("--max-retries", type=int, default=5)
+    parser.add_argument("--retry-base-delay", type=float, default=0.05, help="基准中使用较短的退避时间")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--hedge", action="store_true", help="每种配置再启用对冲请求运行一次，对比p99")
+    parser.add_argument("--hedge-percentile", type=float, default=0.95, help="触发对冲请求的延迟百分位")
+    parser.add_argument("--hedge-budget", type=float, default=0.1, help="对冲请求占调用数的比例上限")
+    parser.add_argument("--json", help="将结果另存为JSON文件")
+    args = parser.parse_args()
+
+    config = ServerConfig(
+        latency_median=args.latency,
+        latency_sigma=args.latency_sigma,
+        tokens_per_second=args.tokens_per_second,
+        completion_tokens=args.completion_tokens,
+        rate_limit_rate=args.rate_limit_rate,
+        error_rate=args.error_rate,
+        seed=args.seed,
+    )
+    results = []
+    with FakeOpenAIServer(config) as server:
+        for size in [int(value) for value in args.sizes.split(",")]:
+            for mode in args.modes.split(","):
+                for hedge in ([False, True] if args.hedge else [False]):
+                    results.append(run_once(server, size, mode.strip(), args, hedge))
+                    print(f"完成: {size} 个文件 / {mode.strip()}{' / 对冲' if hedge else ''}，"
+                          f"耗时 {results[-1]['wall_seconds']:.2f}s")
+
+    print()
+    print_report(results)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
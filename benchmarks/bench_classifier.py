@@ -0,0 +1,103 @@
+"""文件类型分类器微基准
+
+对比旧的子串匹配分类（逐个模式做 in 判断）和编译后的 FileClassifier，
+在约 10 万个合成路径上分别测量首次分类和命中缓存后的耗时。
+
+运行：python benchmarks/bench_classifier.py --paths 100000
+"""
+import sys
+import time
+import random
+import argparse
+from pathlib import Path
+from typing import List
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from file_classifier import FileClassifier  # noqa: E402
+
+# 旧实现中的分类模式（按字典顺序匹配）
+LEGACY_PATTERNS = {
+    "router": ["router", "api", "endpoint"],
+    "model": ["model"],
+    "schema": ["schema", "pydantic", "dto"],
+    "service": ["service", "business", "logic"],
+    "config": ["config", "setting", "env"],
+    "test": ["test", "spec"],
+    "migration": ["migration", "alembic", "versions"],
+    "database": ["database", "db", "session"],
+    "util": ["util", "helper", "common"],
+    "main": ["main", "app"],
+    "docker": ["dockerfile"],
+    "requirements": ["requirements"]
+}
+
+SERVICES = ["billing", "capital", "inventory", "rapid", "identity", "search", "notify", "ledger", "catalog", "payments"]
+LAYERS = ["routers", "models", "schemas", "services", "database", "core", "utils", "api/v1", "auth", "tasks"]
+NAMES = ["user", "order", "invoice", "session", "settings", "helpers", "crud", "main", "deps", "events", "mapper"]
+
+
+def legacy_classify(file_path: str) -> str:
+    """旧的分类实现"""
+    file_path_lower = file_path.lower()
+    file_name = Path(file_path).name.lower()
+    if file_name == 'dockerfile':
+        return "docker"
+    if file_name == 'requirements.txt':
+        return "requirements"
+    if file_name == 'readme.md':
+        return "util"
+    for file_type, patterns in LEGACY_PATTERNS.items():
+        if any(pattern in file_path_lower for pattern in patterns):
+            return file_type
+    return "util"
+
+
+def make_paths(count: int, seed: int) -> List[str]:
+    """生成单仓库风格的合成路径，约一半互不相同"""
+    rng = random.Random(seed)
+    paths = []
+    for _ in range(count):
+        service = rng.choice(SERVICES)
+        kind = rng.random()
+        if kind < 0.1:
+            paths.append(f"services/{service}/tests/test_{rng.choice(NAMES)}_{rng.randrange(50)}.py")
+        elif kind < 0.15:
+            paths.append(f"services/{service}/{rng.choice(['Dockerfile', 'requirements.txt', 'README.md'])}")
+        elif kind < 0.2:
+            paths.append(f"services/{service}/alembic/versions/{rng.randrange(1000):04d}_rev.py")
+        else:
+            name = rng.choice(NAMES)
+            suffix = rng.choice(["", "_service", "_schema", "_model", "_router", "_utils"])
+            paths.append(f"services/{service}/app/{rng.choice(LAYERS)}/{name}{suffix}_{rng.randrange(200)}.py")
+    return paths
+
+
+def measure(label: str, classify, paths: List[str]) -> float:
+    started = time.perf_counter()
+    for path in paths:
+        classify(path)
+    elapsed = time.perf_counter() - started
+    print(f"{label:<24} {elapsed * 1000:>9.1f} ms  {elapsed / len(paths) * 1e9:>8.0f} ns/路径")
+    return elapsed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="文件类型分类器微基准")
+    parser.add_argument("--paths", type=int, default=100000, help="合成路径数")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    paths = make_paths(args.paths, args.seed)
+    classifier = FileClassifier.from_file()
+    print(f"{len(paths)} 个路径，其中 {len(set(paths))} 个不同")
+
+    measure("旧实现（子串匹配）", legacy_classify, paths)
+    measure("FileClassifier 首次", classifier.classify, paths)
+    measure("FileClassifier 缓存", classifier.classify, paths)
+    classifier.cache_clear()
+    measure("FileClassifier 无缓存", classifier._classify, paths)
+
+    changed = sum(1 for path in set(paths) if legacy_classify(path) != classifier.classify(path))
+    print(f"分类结果与旧实现不同的路径: {changed} 个")
@@ -0,0 +1,246 @@
+"""本地模拟的OpenAI兼容接口，用于离线基准测试
+
+实现 /v1/chat/completions（含流式SSE），延迟、生成速度和错误率均可配置，
+不产生任何真实API费用。
+
+单独运行：python benchmarks/fake_openai_server.py --port 8765
+"""
+import re
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, NamedTuple
+
+# 与 batch_generation 的多文件输出格式保持一致
+_BATCH_PATH_PATTERN = re.compile(r'^\s*\d+\. 文件路径: (\S+)', re.MULTILINE)
+
+
+class ServerConfig(NamedTuple):
+    """模拟服务端的行为配置"""
+    latency_median: float = 0.2      # 首个token前的延迟中位数（秒），服从对数正态分布
+    latency_sigma: float = 0.5       # 对数正态分布的sigma，0表示固定延迟
+    tokens_per_second: float = 2000  # 生成速度，0表示瞬间生成
+    completion_tokens: int = 400     # 单次回复的目标token数（不超过请求的max_tokens）
+    rate_limit_rate: float = 0.0     # 返回429的概率
+    error_rate: float = 0.0          # 返回500的概率
+    fenced: bool = True              # 像真实模型一样包裹```python围栏并附带解释文字
+    seed: int = None
+
+
+def _estimate_tokens(text: str) -> int:
+    return max(1, len(text.encode('utf-8')) // 4)
+
+
+def _code_body(tokens: int, seed: int) -> str:
+    """生成约指定token数的Python代码"""
+    lines = ['"""Generated by fake server."""', "import os", ""]
+    index = 0
+    while _estimate_tokens("\n".join(lines)) < tokens:
+        lines.append(f"def function_{seed}_{index}(value: int) -> int:")
+        lines.append(f"    return value * {index + 1}")
+        lines.append("")
+        index += 1
+    return "\n".join(lines)
+
+
+class FakeOpenAIServer:
+    """在后台线程中运行的模拟服务端"""
+
+    def __init__(self, config: ServerConfig = ServerConfig(), host: str = "127.0.0.1", port: int = 0):
+        self.config = config
+        self.random = random.Random(config.seed)
+        self.stats = {"requests": 0, "rate_limited": 0, "errors": 0, "streamed": 0, "completion_tokens": 0}
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> "FakeOpenAIServer":
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self) -> "FakeOpenAIServer":
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+        return False
+
+    def _draw(self) -> Dict:
+        """为一次请求抽取延迟和结果"""
+        config = self.config
+        with self._lock:
+            self.stats["requests"] += 1
+            roll = self.random.random()
+            latency = config.latency_median
+            if config.latency_sigma > 0:
+                latency = self.random.lognormvariate(0, config.latency_sigma) * config.latency_median
+            seed = self.stats["requests"]
+            if roll < config.rate_limit_rate:
+                self.stats["rate_limited"] += 1
+                return {"status": 429, "latency": 0.0, "seed": seed}
+            if roll < config.rate_limit_rate + config.error_rate:
+                self.stats["errors"] += 1
+                return {"status": 500, "latency": latency, "seed": seed}
+        return {"status": 200, "latency": latency, "seed": seed}
+
+    def _completion_text(self, prompt: str, max_tokens: int, seed: int) -> str:
+        """根据请求生成回复内容，合并请求按多文件格式回复"""
+        tokens = min(self.config.completion_tokens, max_tokens or self.config.completion_tokens)
+        if "=== END FILE ===" in prompt:
+            paths = _BATCH_PATH_PATTERN.findall(prompt)
+            per_file = max(8, tokens // max(1, len(paths)))
+            blocks = [f"=== FILE: {path} ===\n{_code_body(per_file, seed)}\n=== END FILE ===" for path in paths]
+            return "\n".join(blocks)
+        body = _code_body(tokens, seed)
+        if self.config.fenced:
+            return f"```python\n{body}\n```\n\n这个文件实现了所需的功能。"
+        return body
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send_json(self, status: int, payload: Dict):
+                data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+                try:
+                    self.send_response(status)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(data)))
+                    self.end_headers()
+                    self.wfile.write(data)
+                except (BrokenPipeError, ConnectionResetError):
+                    # 客户端已断开（例如构建结束时关闭连接池）
+                    self.close_connection = True
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                body = json.loads(self.rfile.read(length) or b"{}")
+                if not self.path.rstrip("/").endswith("/chat/completions"):
+                    self._send_json(404, {"error": {"message": "not found"}})
+                    return
+
+                draw = server._draw()
+                if draw["status"] == 429:
+                    self._send_json(429, {"error": {"message": "rate limited", "type": "rate_limit_error"}})
+                    return
+                time.sleep(draw["latency"])
+                if draw["status"] == 500:
+                    self._send_json(500, {"error": {"message": "internal error", "type": "server_error"}})
+                    return
+
+                messages: List[Dict] = body.get("messages", [])
+                prompt = "\n".join(str(message.get("content", "")) for message in messages)
+                max_tokens = body.get("max_completion_tokens") or body.get("max_tokens")
+                text = server._completion_text(prompt, max_tokens, draw["seed"])
+                usage = {
+                    "prompt_tokens": _estimate_tokens(prompt),
+                    "completion_tokens": _estimate_tokens(text),
+                }
+                usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+                with server._lock:
+                    server.stats["completion_tokens"] += usage["completion_tokens"]
+
+                if body.get("stream"):
+                    self._stream(body, text, usage)
+                else:
+                    self._complete(body, text, usage)
+
+            def _complete(self, body: Dict, text: str, usage: Dict):
+                rate = server.config.tokens_per_second
+                if rate > 0:
+                    time.sleep(usage["completion_tokens"] / rate)
+                self._send_json(200, {
+                    "id": "chatcmpl-fake",
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": body.get("model", "fake"),
+                    "choices": [{
+                        "index": 0,
+                        "message": {"role": "assistant", "content": text},
+                        "finish_reason": "stop",
+                    }],
+                    "usage": usage,
+                })
+
+            def _stream(self, body: Dict, text: str, usage: Dict):
+                with server._lock:
+                    server.stats["streamed"] += 1
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                self.close_connection = True
+
+                base = {
+                    "id": "chatcmpl-fake",
+                    "object": "chat.completion.chunk",
+                    "created": int(time.time()),
+                    "model": body.get("model", "fake"),
+                }
+                # 每个事件约8个token（32字节）
+                step = 32
+                rate = server.config.tokens_per_second
+                try:
+                    for start in range(0, len(text), step):
+                        piece = text[start:start + step]
+                        if rate > 0:
+                            time.sleep(_estimate_tokens(piece) / rate)
+                        event = dict(base, choices=[{"index": 0, "delta": {"content": piece}, "finish_reason": None}])
+                        self.wfile.write(f"data: {json.dumps(event, ensure_ascii=False)}\n\n".encode('utf-8'))
+                    final = dict(base, choices=[{"index": 0, "delta": {}, "finish_reason": "stop"}])
+                    self.wfile.write(f"data: {json.dumps(final)}\n\n".encode('utf-8'))
+                    if (body.get("stream_options") or {}).get("include_usage"):
+                        self.wfile.write(f"data: {json.dumps(dict(base, choices=[], usage=usage))}\n\n".encode('utf-8'))
+                    self.wfile.write(b"data: [DONE]\n\n")
+                except (BrokenPipeError, ConnectionResetError):
+                    # 客户端提前关闭流（例如已遇到结束围栏）
+                    pass
+
+        return Handler
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="启动模拟的OpenAI兼容接口")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.2, help="首个token前的延迟中位数（秒）")
+    parser.add_argument("--latency-sigma", type=float, default=0.5, help="延迟对数正态分布的sigma")
+    parser.add_argument("--tokens-per-second", type=float, default=2000)
+    parser.add_argument("--completion-tokens", type=int, default=400)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    config = ServerConfig(
+        latency_median=args.latency,
+        latency_sigma=args.latency_sigma,
+        tokens_per_second=args.tokens_per_second,
+        completion_tokens=args.completion_tokens,
+        rate_limit_rate=args.rate_limit_rate,
+        error_rate=args.error_rate,
+    )
+    server = FakeOpenAIServer(config, args.host, args.port)
+    print(f"模拟服务已启动: {server.base_url}")
+    try:
+        server._httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
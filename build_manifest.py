@@ -0,0 +1,185 @@
+import os
+import json
+import hashlib
+from pathlib import Path
+from typing import Dict, List, NamedTuple
+
+# 清单文件保存在输出目录中
+MANIFEST_FILENAME = ".build_manifest.json"
+MANIFEST_VERSION = 1
+
+# 构建过程中的预写日志，构建正常结束后并入清单并删除
+JOURNAL_FILENAME = ".build_journal.jsonl"
+
+
+def hash_text(text: str) -> str:
+    """计算文本的sha256摘要"""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def hash_spec(file_info: Dict, template: str) -> str:
+    """计算单个文件规格（类型、描述、函数、模板）的摘要"""
+    payload = json.dumps({
+        "type": file_info['type'],
+        "description": file_info['description'],
+        "functions": list(file_info['functions']),
+        "template": template,
+    }, ensure_ascii=False, sort_keys=True)
+    return hash_text(payload)
+
+
+class BuildPlan(NamedTuple):
+    """新规格与上次构建清单的差异"""
+    added: List[str]
+    changed: List[str]
+    unchanged: List[str]
+    removed: List[str]
+
+
+class BuildManifest:
+    """记录每个已生成文件的规格摘要和内容摘要，用于增量构建"""
+
+    def __init__(self, output_dir: Path, files: Dict[str, Dict[str, str]] = None):
+        self.output_dir = Path(output_dir)
+        self.path = self.output_dir / MANIFEST_FILENAME
+        # 文件路径 -> {"spec_hash": ..., "content_hash": ...}
+        self.files = files or {}
+
+    @classmethod
+    def load(cls, output_dir: Path) -> "BuildManifest":
+        """读取输出目录中的清单，不存在或损坏时返回空清单"""
+        path = Path(output_dir) / MANIFEST_FILENAME
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return cls(output_dir)
+        except (OSError, ValueError) as e:
+            print(f"读取构建清单失败，将完整重建: {e}")
+            return cls(output_dir)
+        if data.get("version") != MANIFEST_VERSION:
+            return cls(output_dir)
+        return cls(output_dir, data.get("files", {}))
+
+    def diff(self, spec_hashes: Dict[str, str]) -> BuildPlan:
+        """比较新解析的文件规格与清单，磁盘上缺失或被改动的文件视为已变化"""
+        plan = {"added": [], "changed": [], "unchanged": []}
+        for file_path, spec_hash in spec_hashes.items():
+            plan[self.status(file_path, spec_hash)].append(file_path)
+        removed = [file_path for file_path in self.files if file_path not in spec_hashes]
+        return BuildPlan(plan["added"], plan["changed"], plan["unchanged"], removed)
+
+    def status(self, file_path: str, spec_hash: str) -> str:
+        """单个文件相对清单的状态：added、changed 或 unchanged"""
+        entry = self.files.get(file_path)
+        if entry is None:
+            return "added"
+        if entry["spec_hash"] != spec_hash or not self._content_matches(file_path, entry["content_hash"]):
+            return "changed"
+        return "unchanged"
+
+    def _content_matches(self, file_path: str, content_hash: str) -> bool:
+        """检查磁盘上的文件内容是否仍与清单一致"""
+        try:
+            content = (self.output_dir / file_path).read_text(encoding='utf-8')
+        except (OSError, UnicodeDecodeError):
+            return False
+        return hash_text(content) == content_hash
+
+    def restore(self, file_path: str, entry: Dict[str, str], spec_hash: str) -> bool:
+        """日志中的记录规格未变且磁盘内容一致时并入清单，返回是否并入"""
+        if entry["spec_hash"] != spec_hash or not self._content_matches(file_path, entry["content_hash"]):
+            return False
+        self.record(file_path, spec_hash, entry["content_hash"])
+        return True
+
+    def record(self, file_path: str, spec_hash: str, content_hash: str):
+        """记录成功写入的文件"""
+        self.files[file_path] = {"spec_hash": spec_hash, "content_hash": content_hash}
+
+    def forget(self, file_path: str):
+        """移除文件记录，下次构建时重新生成"""
+        self.files.pop(file_path, None)
+
+    def delete_file(self, file_path: str):
+        """删除已从规格中移除的文件，并清理因此变空的目录"""
+        full_path = self.output_dir / file_path
+        try:
+            full_path.unlink()
+            print(f"    已删除: {full_path}")
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            print(f"    删除失败: {e}")
+        self.forget(file_path)
+
+        parent = full_path.parent
+        while parent != self.output_dir and self.output_dir in parent.parents:
+            try:
+                parent.rmdir()
+            except OSError:
+                break
+            parent = parent.parent
+
+    def save(self):
+        """原子地写入清单"""
+        tmp_path = self.path.with_suffix(".tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"version": MANIFEST_VERSION, "files": self.files}, f, ensure_ascii=False, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+
+class BuildJournal:
+    """构建过程中的预写日志：每写入一个通过校验的文件追加一行记录并同步到磁盘
+
+    清单只在构建结束时保存，构建被中断（超时、Ctrl-C）后可以从日志中恢复已完成的文件。
+    """
+
+    def __init__(self, output_dir: Path):
+        self.path = Path(output_dir) / JOURNAL_FILENAME
+        self._file = None
+
+    def load(self) -> Dict[str, Dict[str, str]]:
+        """读取日志记录（文件路径 -> 摘要，同一文件以最后一条为准），中断时写了一半的行被忽略"""
+        entries = {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                        entries[record["path"]] = {"spec_hash": record["spec_hash"],
+                                                   "content_hash": record["content_hash"]}
+                    except (ValueError, KeyError, TypeError):
+                        continue
+        except FileNotFoundError:
+            pass
+        except (OSError, UnicodeDecodeError) as e:
+            print(f"读取构建日志失败: {e}")
+        return entries
+
+    def open(self, keep: bool = False):
+        """开始记录本次构建；keep 为 False 时清空上次的日志"""
+        self.close()
+        self._file = open(self.path, 'a' if keep else 'w', encoding='utf-8')
+
+    def append(self, file_path: str, spec_hash: str, content_hash: str):
+        """追加一条记录，刷新并同步到磁盘后返回"""
+        if self._file is None:
+            self.open(keep=True)
+        record = {"path": file_path, "spec_hash": spec_hash, "content_hash": content_hash}
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def remove(self):
+        """清单保存后删除日志"""
+        self.close()
+        try:
+            self.path.unlink()
+        except FileNotFoundError:
+            pass
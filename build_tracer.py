@@ -0,0 +1,282 @@
+import json
+import time
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from token_budget import estimate_tokens
+
+# 追踪文件默认保存在输出目录中
+TRACE_FILENAME = ".build_trace.jsonl"
+
+# 记录的各阶段耗时（秒）
+SPAN_TIMINGS = ("queue_wait", "prompt_render", "throttle_wait", "ttft", "llm_latency", "cleanup", "validate", "write")
+
+# 当前任务正在记录的span，异步任务之间互不影响
+current_span: ContextVar[Optional["FileSpan"]] = ContextVar("current_span", default=None)
+
+
+class FileSpan:
+    """单个文件（或一次合并请求）生成过程的耗时与token统计"""
+
+    def __init__(self, file_path: str, file_type: str):
+        self.file_path = file_path
+        self.file_type = file_type
+        self.status = "ok"
+        self.timings: Dict[str, float] = {}
+        # 所有模型请求（重试、修复请求、对冲请求）的token用量之和
+        self.prompt_tokens = None
+        self.completion_tokens = None
+        self.tokens_estimated = False
+        self._estimated_requests = 0
+        self._usage_lock = threading.Lock()
+        self.retries = 0
+        self.started_at = time.perf_counter()
+        self.total = None
+        self._attempt_started = None
+        # 尚未完成的后台阶段（写入队列中的文件），全部完成后才输出记录
+        self._holds = 0
+        self._closed = False
+
+    def add(self, name: str, seconds: float):
+        """累加某个阶段的耗时"""
+        self.timings[name] = self.timings.get(name, 0.0) + seconds
+
+    @contextmanager
+    def measure(self, name: str):
+        """统计代码块的耗时"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - started)
+
+    def attempt_started(self):
+        """一次模型请求开始，用于计算首token时间"""
+        self._attempt_started = time.perf_counter()
+
+    def first_token(self):
+        """收到首个token"""
+        if "ttft" not in self.timings and self._attempt_started is not None:
+            self.timings["ttft"] = time.perf_counter() - self._attempt_started
+
+    def record_usage(self, prompt_tokens: int, completion_tokens: int, estimated: bool = False,
+                     replaces: Optional[Tuple[int, int]] = None):
+        """累加一次模型请求的token用量
+
+        replaces 为同一次请求之前记入的估算值，接口返回的真实用量替换该估算值。
+        """
+        with self._usage_lock:
+            prompt_total, completion_total = self.prompt_tokens or 0, self.completion_tokens or 0
+            if replaces is not None:
+                prompt_total -= replaces[0]
+                completion_total -= replaces[1]
+                self._estimated_requests -= 1
+            self.prompt_tokens = prompt_total + (prompt_tokens or 0)
+            self.completion_tokens = completion_total + (completion_tokens or 0)
+            if estimated:
+                self._estimated_requests += 1
+            self.tokens_estimated = self._estimated_requests > 0
+
+    def to_dict(self) -> Dict:
+        record = {
+            "file_path": self.file_path,
+            "file_type": self.file_type,
+            "status": self.status,
+            "total": round(self.total or 0.0, 6),
+            "retries": self.retries,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "tokens_estimated": self.tokens_estimated,
+        }
+        for name in SPAN_TIMINGS:
+            value = self.timings.get(name)
+            record[name] = round(value, 6) if value is not None else None
+        return record
+
+
+@contextmanager
+def span_timer(name: str):
+    """统计当前span中某个阶段的耗时，没有span时不做任何事"""
+    span = current_span.get()
+    if span is None:
+        yield
+        return
+    with span.measure(name):
+        yield
+
+
+def set_span_status(status: str):
+    """设置当前span的结果状态（cached、fallback、local、repaired等）"""
+    span = current_span.get()
+    if span is not None:
+        span.status = status
+
+
+class UsageCallback(BaseCallbackHandler):
+    """从LangChain回调中读取首token时间和token用量
+
+    接口未返回用量（例如流式调用被提前关闭）时按文本长度估算。
+    """
+
+    run_inline = True
+
+    def __init__(self, span: FileSpan):
+        self.span = span
+        self._prompt_tokens = 0
+        self._completion_chars = []
+        # 当前请求是否已记录用量，以及记录的估算值
+        self._reported = False
+        self._estimate: Optional[Tuple[int, int]] = None
+
+    def on_chat_model_start(self, serialized, messages, **kwargs):
+        # 同一个回调用于一次调用中的所有重试，每次请求开始时重置
+        self._prompt_tokens = sum(estimate_tokens(str(message.content)) for batch in messages for message in batch)
+        self._completion_chars = []
+        self._reported = False
+        self._estimate = None
+
+    def on_llm_new_token(self, token: str, **kwargs):
+        self.span.first_token()
+        self._completion_chars.append(token)
+
+    def on_llm_end(self, response, **kwargs):
+        usage = None
+        text = ""
+        for generations in response.generations:
+            for generation in generations:
+                text += generation.text
+                message = getattr(generation, "message", None)
+                usage = getattr(message, "usage_metadata", None) or usage
+        if not usage:
+            token_usage = (response.llm_output or {}).get("token_usage") or {}
+            if token_usage:
+                usage = {
+                    "input_tokens": token_usage.get("prompt_tokens"),
+                    "output_tokens": token_usage.get("completion_tokens"),
+                }
+        if usage:
+            self.span.record_usage(usage.get("input_tokens"), usage.get("output_tokens"), replaces=self._estimate)
+            self._reported, self._estimate = True, None
+        elif not self._reported:
+            self._record_estimate(estimate_tokens(text))
+
+    def on_llm_error(self, error, **kwargs):
+        self.flush()
+
+    def flush(self):
+        """流被提前关闭时不一定触发结束回调，按已收到的片段估算用量"""
+        if self._completion_chars and not self._reported:
+            self._record_estimate(estimate_tokens("".join(self._completion_chars)))
+
+    def _record_estimate(self, completion_tokens: int):
+        self._estimate = (self._prompt_tokens, completion_tokens)
+        self._reported = True
+        self.span.record_usage(self._prompt_tokens, completion_tokens, estimated=True)
+
+
+class BuildTracer:
+    """收集每个文件的span，写入JSONL追踪文件并在构建结束时按文件类型汇总"""
+
+    def __init__(self, trace_path: Optional[str] = None):
+        self.trace_path = Path(trace_path) if trace_path else None
+        self.records: List[Dict] = []
+        self._file = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """开始新一次构建，清空上次的记录"""
+        self.records = []
+        if self.trace_path:
+            self.trace_path.parent.mkdir(parents=True, exist_ok=True)
+            self._file = open(self.trace_path, 'w', encoding='utf-8')
+
+    def close(self):
+        if self._file:
+            self._file.close()
+            self._file = None
+
+    @contextmanager
+    def span(self, file_path: str, file_type: str):
+        """记录一个文件的生成过程，期间该span为当前span"""
+        span = FileSpan(file_path, file_type)
+        token = current_span.set(span)
+        try:
+            yield span
+        except BaseException:
+            span.status = "error"
+            raise
+        finally:
+            current_span.reset(token)
+            span.total = time.perf_counter() - span.started_at
+            with self._lock:
+                span._closed = True
+                ready = span._holds == 0
+            if ready:
+                self._emit(span)
+
+    def hold(self, span: Optional[FileSpan]):
+        """span 还有在后台进行的阶段（如写入队列中的文件），记录推迟到对应的 release 之后输出"""
+        if span is None:
+            return
+        with self._lock:
+            span._holds += 1
+
+    def release(self, span: Optional[FileSpan], name: str, seconds: float):
+        """后台阶段完成，耗时计入span"""
+        if span is None:
+            return
+        with self._lock:
+            span.add(name, seconds)
+            span._holds -= 1
+            ready = span._closed and span._holds == 0
+        if ready:
+            self._emit(span)
+
+    def _emit(self, span: FileSpan):
+        record = span.to_dict()
+        with self._lock:
+            self.records.append(record)
+            if self._file:
+                self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+                self._file.flush()
+
+    def summary_table(self) -> str:
+        """按文件类型汇总的耗时与token表"""
+        groups: Dict[str, List[Dict]] = {}
+        for record in self.records:
+            groups.setdefault(record["file_type"], []).append(record)
+
+        def mean(records: List[Dict], name: str) -> str:
+            values = [record[name] for record in records if record[name] is not None]
+            return f"{sum(values) / len(values):.2f}" if values else "-"
+
+        def total(records: List[Dict], name: str) -> str:
+            values = [record[name] for record in records if record[name] is not None]
+            return str(sum(values)) if values else "-"
+
+        header = ["类型", "数量", "平均总耗时", "排队", "提示", "限流", "首token", "模型", "清理", "校验", "写入", "输入token", "输出token"]
+        rows = [header]
+        for file_type in sorted(groups):
+            records = groups[file_type]
+            rows.append([
+                file_type,
+                str(len(records)),
+                mean(records, "total"),
+                mean(records, "queue_wait"),
+                mean(records, "prompt_render"),
+                mean(records, "throttle_wait"),
+                mean(records, "ttft"),
+                mean(records, "llm_latency"),
+                mean(records, "cleanup"),
+                mean(records, "validate"),
+                mean(records, "write"),
+                total(records, "prompt_tokens"),
+                total(records, "completion_tokens"),
+            ])
+        widths = [max(len(row[i]) for row in rows) for i in range(len(header))]
+        return "\n".join("  ".join(cell.rjust(width) for cell, width in zip(row, widths)) for row in rows)
@@ -0,0 +1,164 @@
+import re
+import os
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, NamedTuple, Optional
+
+# 生成失败后带着错误信息重新生成的默认次数
+DEFAULT_VALIDATION_RETRIES = 1
+
+# 校验进程池的默认大小，语法检查很快，不需要占满所有核
+DEFAULT_VALIDATION_WORKERS = min(4, os.cpu_count() or 1)
+
+# 围栏行：```、```python，允许前导空白
+_FENCE_LINE = re.compile(r'^\s*```[\w+.-]*\s*$')
+
+# 像代码的行：语句关键字、装饰器、赋值、缩进的代码
+_CODE_LINE = re.compile(
+    r'^\s*(?:(?:def|class|async|import|from|return|if|elif|else|for|while|try|except|finally|with|raise|'
+    r'yield|pass|assert|global|del)\b|@\w|[A-Za-z_][\w.\[\]\'"]*\s*[-+*/|&]?=[^=])'
+    r'|^\s{4,}\S'
+)
+
+# 截断代码后，被丢弃部分中像代码的行的比例上限；超过时认为是代码本身有错误而不是附带的解释文字
+_MAX_DROPPED_CODE_RATIO = 0.3
+
+# 截断重试次数（每次截断到出错行之前）
+_MAX_TRUNCATIONS = 5
+
+# 提取出的代码块至少包含原内容中像代码的行的比例；更小的代码块（如附带的用法示例）不能代替整个文件
+_MIN_EXTRACTED_SHARE = 0.5
+
+
+class ValidationResult(NamedTuple):
+    """单个文件的校验结果"""
+    content: str            # 通过校验的内容，未通过时为原内容
+    error: Optional[str]    # 未通过时的错误描述
+    extracted: bool         # 是否从原内容中提取了有效代码块
+
+
+def check_python(source: str, filename: str = "<generated>") -> Optional[str]:
+    """编译源码，返回错误描述（通过时为None）"""
+    try:
+        compile(source, filename, 'exec', dont_inherit=True)
+    except SyntaxError as e:
+        message = f"第 {e.lineno} 行: {e.msg}"
+        if e.text and e.text.strip():
+            message += f"\n    {e.text.strip()}"
+        return message
+    except ValueError as e:
+        # 源码中包含空字符等
+        return str(e)
+    return None
+
+
+def _split_blocks(lines: List[str]) -> List[List[str]]:
+    """按围栏行切分：围栏内外的每一段都是候选代码块"""
+    blocks = []
+    current: List[str] = []
+    for line in lines:
+        if _FENCE_LINE.match(line):
+            blocks.append(current)
+            current = []
+        else:
+            current.append(line)
+    blocks.append(current)
+    return [block for block in blocks if any(line.strip() for line in block)]
+
+
+def _code_line_count(lines: List[str]) -> int:
+    return sum(1 for line in lines if _CODE_LINE.match(line))
+
+
+def _looks_like_prose(lines: List[str]) -> bool:
+    """被截掉的部分是否像解释文字（而不是有语法错误的代码）"""
+    non_blank = [line for line in lines if line.strip()]
+    if not non_blank:
+        return True
+    return _code_line_count(non_blank) <= len(non_blank) * _MAX_DROPPED_CODE_RATIO
+
+
+def _valid_prefix(lines: List[str], filename: str) -> Optional[str]:
+    """代码块中能通过编译的最长前缀；需要截掉的部分不像解释文字时返回None"""
+    end = len(lines)
+    for _ in range(_MAX_TRUNCATIONS):
+        source = "\n".join(lines[:end]).strip()
+        if not source:
+            return None
+        try:
+            compile(source, filename, 'exec', dont_inherit=True)
+        except SyntaxError as e:
+            # strip() 去掉了开头的空行，换算回原来的行号
+            leading = next(index for index, line in enumerate(lines) if line.strip())
+            if not e.lineno or e.lineno + leading - 1 >= end:
+                return None
+            cut = e.lineno + leading - 1
+            if cut <= leading or not _looks_like_prose(lines[cut:end]):
+                return None
+            end = cut
+            continue
+        except ValueError:
+            return None
+        return source
+    return None
+
+
+def extract_valid_code(text: str, filename: str = "<generated>") -> Optional[str]:
+    """从模型输出中提取能通过编译的最大代码块
+
+    候选块为围栏切分出的各段，每段去掉结尾的解释文字后取能编译的部分，返回行数最多的一段。
+    候选块中像代码的行不到原内容的一半时不采用（原文件有错误，只有示例片段能编译），返回None。
+    """
+    lines = text.splitlines()
+    min_code_lines = _code_line_count(lines) * _MIN_EXTRACTED_SHARE
+    best = None
+    best_lines = 0
+    for block in _split_blocks(lines):
+        code = _valid_prefix(block, filename)
+        if code is None or _code_line_count(code.splitlines()) < min_code_lines:
+            continue
+        line_count = code.count("\n") + 1
+        if line_count > best_lines:
+            best, best_lines = code, line_count
+    return best
+
+
+def validate_python(content: str, filename: str = "<generated>") -> ValidationResult:
+    """校验生成的Python文件，编译失败时尝试提取有效代码块（在校验进程池中执行）"""
+    error = check_python(content, filename)
+    if error is None:
+        return ValidationResult(content, None, False)
+    extracted = extract_valid_code(content, filename)
+    if extracted is not None:
+        return ValidationResult(extracted, None, True)
+    return ValidationResult(content, error, False)
+
+
+class CodeValidator:
+    """生成结果的语法校验：异步构建时在进程池中执行，解析大文件不会阻塞事件循环"""
+
+    def __init__(self, max_workers: int = DEFAULT_VALIDATION_WORKERS):
+        self.max_workers = max_workers
+        # 第一次异步校验时创建，构建结束时关闭
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    @staticmethod
+    def should_validate(file_path: str) -> bool:
+        return file_path.endswith('.py')
+
+    def validate(self, file_path: str, content: str) -> ValidationResult:
+        """在当前进程中校验（同步构建逐个生成文件，没有需要让出的队列）"""
+        return validate_python(content, file_path)
+
+    async def avalidate(self, file_path: str, content: str) -> ValidationResult:
+        """在进程池中校验"""
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, validate_python, content, file_path)
+
+    def close(self):
+        """关闭进程池"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
@@ -0,0 +1,267 @@
+import re
+import keyword
+from typing import List, Optional
+
+# 文件扩展名 -> 目标语言，用于匹配围栏的语言标记
+_LANGUAGE_BY_SUFFIX = {
+    '.py': 'python', '.md': 'markdown', '.ini': 'ini', '.toml': 'toml', '.json': 'json',
+    '.yaml': 'yaml', '.yml': 'yaml', '.sh': 'bash', '.txt': 'text', '.mako': 'mako', '.sql': 'sql',
+}
+_LANGUAGE_BY_NAME = {'Dockerfile': 'dockerfile', 'Makefile': 'makefile'}
+
+# 围栏语言标记的别名
+_LANGUAGE_ALIASES = {
+    'py': 'python', 'python3': 'python', 'md': 'markdown', 'docker': 'dockerfile', 'sh': 'bash',
+    'shell': 'bash', 'yml': 'yaml', 'txt': 'text', 'plaintext': 'text', 'cfg': 'ini',
+}
+
+# 目标语言可以接受的其他围栏语言标记（text 接受任意标记）
+_COMPATIBLE_LANGUAGES = {
+    'mako': {'python'},
+    'ini': {'toml'},
+}
+
+# 行尾的开始围栏（前面允许有空白或引导文字）及其语言标记
+_OPEN_FENCE = re.compile(r'```[ \t]*([\w+.#-]*)[ \t]*$')
+# 只有反引号的结束围栏
+_CLOSE_FENCE = re.compile(r'^\s*```+\s*$')
+
+# 顶格出现时不可能是Python代码的行：列表项、引用、编号、加粗、中文等非ASCII字符开头
+_PY_PROSE_START = re.compile(r'^(?:[-*+>][ \t]|\d+[.)][ \t]|\*\*|[^\x00-\x7f])')
+# 「单词 单词」形式的句子（第一个词不是关键字时不是合法的Python语句）
+_PY_WORD_PAIR = re.compile(r'^([A-Za-z_]\w*)[ \t]+[A-Za-z_`"\']')
+# 「Note: The ...」「Explanation:」形式的说明
+_PY_LABEL = re.compile(r'^([A-Za-z_]\w*)[:：][ \t]*(?:$|[A-Za-z]\w*[ \t]+[A-Za-z])')
+# Markdown标题，同时也是合法的注释，需要看后面的行才能判断
+_PY_HEADING = re.compile(r'^#{2,6}[ \t]+\S')
+
+_PY_KEYWORDS = frozenset(keyword.kwlist) | frozenset(getattr(keyword, 'softkwlist', []))
+
+
+def language_for_path(file_path: str) -> Optional[str]:
+    """根据文件路径推断目标语言，无法推断时返回None"""
+    name = file_path.rpartition('/')[2]
+    if name in _LANGUAGE_BY_NAME:
+        return _LANGUAGE_BY_NAME[name]
+    suffix = name[name.rfind('.'):].lower() if '.' in name.lstrip('.') else ''
+    return _LANGUAGE_BY_SUFFIX.get(suffix)
+
+
+def _normalize_language(tag: str) -> str:
+    tag = tag.lower()
+    return _LANGUAGE_ALIASES.get(tag, tag)
+
+
+def _is_python_prose(line: str) -> bool:
+    """顶格的行是否是解释文字而不是Python代码"""
+    if _PY_PROSE_START.match(line):
+        return True
+    match = _PY_WORD_PAIR.match(line) or _PY_LABEL.match(line)
+    return match is not None and match.group(1) not in _PY_KEYWORDS
+
+
+class StreamingCleaner:
+    """从模型输出中提取目标文件的代码，既可以流式输入，也可以一次处理完整的字符串
+
+    - 开始围栏前允许有空白和引导文字（「以下是代码：」），语言标记与目标语言不符的代码块被跳过
+    - 围栏缩进时按开始围栏的缩进去掉代码行的前导空格
+    - 遇到结束围栏后丢弃后面的解释文字；没有围栏的Python代码在出现顶格的解释文字时结束
+    - Markdown 目标文件中嵌套的代码块保持原样
+
+    按行处理，每行只扫描常数次，总耗时与输入长度成线性关系；未完整的最后一行暂不输出（可能是围栏的一部分）。
+    首尾空行与 str.strip() 的效果一致。
+    """
+
+    def __init__(self, language: Optional[str] = None):
+        self.language = _normalize_language(language) if language else None
+        self._buffer = ""
+        self._state = "start"  # start -> fenced / plain -> done，start 中遇到其他语言的代码块时进入 skip
+        self._indent = 0
+        self._held: List[str] = []
+        self._quote = None
+        self._nested_fence = False
+        self._pending_blank = 0
+        self._started = False
+
+    @property
+    def done(self) -> bool:
+        """是否已到达代码结尾，后续输入都会被丢弃"""
+        return self._state == "done"
+
+    def feed(self, chunk: str) -> str:
+        """输入一个文本片段，返回可以立即写出的清理后内容"""
+        if self._state == "done":
+            return ""
+        self._buffer += chunk
+        if "\n" not in self._buffer:
+            return ""
+        *lines, self._buffer = self._buffer.split("\n")
+        output = []
+        for line in lines:
+            output.append(self._process_line(line))
+            if self._state == "done":
+                self._buffer = ""
+                break
+        return "".join(output)
+
+    def finish(self) -> str:
+        """输入结束，处理缓冲区中剩余的最后一行"""
+        output = ""
+        if self._state != "done" and self._buffer:
+            line, self._buffer = self._buffer, ""
+            output = self._process_line(line)
+        if self._state == "start" and not self._started and self._held:
+            # 没有找到代码，原样保留内容，交给后续的语法校验判断
+            output += self._flush_held()
+        self._state = "done"
+        return output
+
+    def _process_line(self, line: str) -> str:
+        if self._state == "start":
+            return self._process_start(line)
+        if self._state == "skip":
+            if _CLOSE_FENCE.match(line):
+                self._state = "start"
+            return ""
+        if self._state == "fenced":
+            return self._process_fenced(line)
+        if self._state == "plain":
+            return self._process_plain(line)
+        return ""
+
+    def _process_start(self, line: str) -> str:
+        stripped = line.strip()
+        if not stripped:
+            return ""
+        fence = _OPEN_FENCE.search(line)
+        if fence is not None:
+            tag = _normalize_language(fence.group(1))
+            prefix = line[:fence.start()]
+            self._held = []
+            if tag and not self._accepts(tag):
+                # 其他语言的代码块（如安装命令）
+                self._state = "skip"
+                return ""
+            self._state = "fenced"
+            self._indent = len(prefix) if not prefix.strip() else 0
+            return ""
+        if self._is_preamble(stripped):
+            self._held.append(line)
+            return ""
+        # 没有围栏的代码：Python的引导文字丢弃，其他语言无法区分，按内容保留
+        output = ""
+        if self.language == "python":
+            self._held = []
+        else:
+            output = self._flush_held()
+        self._state = "plain"
+        return output + self._emit(line)
+
+    def _accepts(self, tag: str) -> bool:
+        """围栏的语言标记是否与目标语言相符"""
+        if self.language in (None, 'text') or tag == self.language:
+            return True
+        return tag in _COMPATIBLE_LANGUAGES.get(self.language, ())
+
+    def _is_preamble(self, stripped: str) -> bool:
+        """代码开始之前的引导文字"""
+        if self.language == "python":
+            return _is_python_prose(stripped) or _PY_HEADING.match(stripped) is not None
+        return stripped.endswith((':', '：'))
+
+    def _process_fenced(self, line: str) -> str:
+        stripped = line.strip()
+        if self.language == "markdown" and stripped.startswith("```"):
+            # Markdown 文件内部的代码块：带语言标记的开始围栏和与之配对的结束围栏都是内容
+            if self._nested_fence:
+                if _CLOSE_FENCE.match(line):
+                    self._nested_fence = False
+                return self._emit(self._dedent(line))
+            if not _CLOSE_FENCE.match(line):
+                self._nested_fence = True
+                return self._emit(self._dedent(line))
+        if self._is_closing_fence(line):
+            self._state = "done"
+            return ""
+        if self.language != "markdown" and self._quote is None and stripped.endswith("```") \
+                and not _CLOSE_FENCE.match(line):
+            # 结束围栏紧跟在最后一行代码后面
+            self._state = "done"
+            return self._emit(self._dedent(line.rstrip()[:-3]))
+        return self._emit(self._dedent(line))
+
+    def _process_plain(self, line: str) -> str:
+        stripped = line.strip()
+        if not stripped:
+            self._pending_blank += 1
+            return ""
+        if self.language != "markdown" and self._quote is None and stripped.endswith("```"):
+            if not _CLOSE_FENCE.match(line):
+                self._state = "done"
+                return self._flush_held() + self._emit(line.rstrip()[:-3])
+            if self._is_closing_fence(line):
+                self._state = "done"
+                return ""
+        if self.language == "python" and self._quote is None and line[0] not in ' \t':
+            if _PY_HEADING.match(line):
+                self._held.append(line)
+                return ""
+            if _is_python_prose(line):
+                self._state = "done"
+                return ""
+        return self._flush_held() + self._emit(line)
+
+    def _is_closing_fence(self, line: str) -> bool:
+        """结束围栏：不在三引号字符串中（文档字符串里的示例代码块），且缩进不超过开始围栏"""
+        if self._quote is not None or not _CLOSE_FENCE.match(line):
+            return False
+        return len(line) - len(line.lstrip()) <= self._indent
+
+    def _dedent(self, line: str) -> str:
+        """去掉不超过开始围栏缩进的前导空格"""
+        if not self._indent:
+            return line
+        width = len(line) - len(line.lstrip(' '))
+        return line[min(width, self._indent):]
+
+    def _flush_held(self) -> str:
+        held, self._held = self._held, []
+        return "".join(self._emit(line) for line in held)
+
+    def _emit(self, line: str) -> str:
+        if not line.strip():
+            self._pending_blank += 1
+            return ""
+        if self.language == "python":
+            self._track_strings(line)
+        prefix = "\n" * (self._pending_blank + 1) if self._started else ""
+        self._pending_blank = 0
+        self._started = True
+        return prefix + line.rstrip()
+
+    def _track_strings(self, line: str):
+        """记录行尾是否仍在三引号字符串中（文档字符串中的顶格文字不是解释文字）"""
+        position = 0
+        while True:
+            if self._quote is not None:
+                end = line.find(self._quote, position)
+                if end < 0:
+                    return
+                self._quote = None
+                position = end + 3
+                continue
+            double = line.find('"""', position)
+            single = line.find("'''", position)
+            if double < 0 and single < 0:
+                return
+            if single < 0 or 0 <= double < single:
+                self._quote, position = '"""', double + 3
+            else:
+                self._quote, position = "'''", single + 3
+
+
+def clean_generated_content(content: str, language: Optional[str] = None) -> str:
+    """提取完整模型输出中的代码"""
+    cleaner = StreamingCleaner(language)
+    return cleaner.feed(content) + cleaner.finish()
+
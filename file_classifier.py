@@ -0,0 +1,87 @@
+import re
+import json
+from pathlib import Path
+from typing import Dict, List
+
+# 默认分类规则文件
+DEFAULT_FILE_TYPES_PATH = Path(__file__).with_name("file_types.json")
+
+# 文件名拆词：user_service.py -> user, service
+_WORD_SPLIT_PATTERN = re.compile(r'[_\-.\s]+')
+
+# 规则中可用的匹配方式
+RULE_FIELDS = ("names", "stems", "dirs", "words")
+
+
+class FileClassifier:
+    """按路径分段匹配的文件类型分类器
+
+    规则按配置中的顺序决定优先级，编译为「词 -> 最高优先级规则」的查找表，
+    每个路径只需拆分一次并逐段查表。匹配方式：
+    - names: 完整文件名（如 Dockerfile、requirements.txt）
+    - stems: 去掉扩展名的文件名（如 main、conftest）
+    - dirs: 任意一级目录名（如 routers、tests）
+    - words: 文件名中以 _ - . 分隔的单词（如 user_service.py 中的 service）
+    全部按小写比较，分类结果按路径缓存。
+    """
+
+    def __init__(self, rules: List[Dict], default: str = "util"):
+        self.rules = rules
+        self.default = default
+        tables = {field: {} for field in RULE_FIELDS}
+        for priority, rule in enumerate(rules):
+            unknown = set(rule) - set(RULE_FIELDS) - {"type"}
+            if "type" not in rule or unknown:
+                raise ValueError(f"无效的分类规则: {rule}")
+            for field in RULE_FIELDS:
+                for token in rule.get(field, []):
+                    # 同一个词出现在多条规则中时保留优先级最高的
+                    tables[field].setdefault(token.lower(), priority)
+        self._names, self._stems, self._dirs, self._words = (tables[field] for field in RULE_FIELDS)
+        self._cache: Dict[str, str] = {}
+
+    @classmethod
+    def from_file(cls, path=DEFAULT_FILE_TYPES_PATH) -> "FileClassifier":
+        """从JSON配置文件加载分类规则"""
+        with open(path, 'r', encoding='utf-8') as f:
+            config = json.load(f)
+        return cls(config["rules"], config.get("default", "util"))
+
+    def classify(self, file_path: str) -> str:
+        """返回文件类型，没有规则匹配时返回默认类型"""
+        file_type = self._cache.get(file_path)
+        if file_type is None:
+            file_type = self._classify(file_path)
+            self._cache[file_path] = file_type
+        return file_type
+
+    def _classify(self, file_path: str) -> str:
+        directories, _, name = file_path.lower().replace('\\', '/').strip('/').rpartition('/')
+        stem = name if name.startswith('.') else name.partition('.')[0]
+
+        # 取所有命中规则中优先级最高（序号最小）的一条
+        best = len(self.rules)
+        priority = self._names.get(name, best)
+        if priority < best:
+            best = priority
+        priority = self._stems.get(stem, best)
+        if priority < best:
+            best = priority
+        if directories:
+            dirs = self._dirs
+            for directory in directories.split('/'):
+                priority = dirs.get(directory, best)
+                if priority < best:
+                    best = priority
+        words = self._words
+        for word in _WORD_SPLIT_PATTERN.split(stem):
+            priority = words.get(word, best)
+            if priority < best:
+                best = priority
+
+        if best < len(self.rules):
+            return self.rules[best]["type"]
+        return self.default
+
+    def cache_clear(self):
+        self._cache.clear()
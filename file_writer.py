@@ -0,0 +1,227 @@
+import os
+import time
+import uuid
+import hashlib
+import threading
+from pathlib import Path
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Iterable, List, NamedTuple, Optional, Set
+
+
+class AtomicFileWriter:
+    """先写入目标目录下的临时文件，完成后通过 os.replace 原子地替换目标文件
+
+    写入过程中同步计算内容的sha256，调用方无需在内存中保留完整内容。
+    内容与目标文件相同时丢弃临时文件，不改写目标文件（保留修改时间）。
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.tmp_path = self.path.with_name(f".{self.path.name}.{uuid.uuid4().hex[:8]}.tmp")
+        self._file = open(self.tmp_path, 'x', encoding='utf-8')
+        self._hasher = hashlib.sha256()
+        self.bytes_written = 0
+        # commit 后为False表示内容未变，目标文件没有被改写
+        self.changed = True
+
+    def write(self, text: str):
+        """追加写入文本"""
+        if not text:
+            return
+        self._file.write(text)
+        data = text.encode('utf-8')
+        self._hasher.update(data)
+        self.bytes_written += len(data)
+
+    @property
+    def content_hash(self) -> str:
+        """已写入内容的sha256摘要"""
+        return self._hasher.hexdigest()
+
+    def commit(self):
+        """关闭临时文件并替换目标文件"""
+        if self._file.closed:
+            return
+        self._file.close()
+        if self._same_content():
+            self.changed = False
+            self.tmp_path.unlink()
+            return
+        os.replace(self.tmp_path, self.path)
+
+    def _same_content(self) -> bool:
+        try:
+            if self.path.stat().st_size != self.bytes_written:
+                return False
+            return hashlib.sha256(self.path.read_bytes()).hexdigest() == self.content_hash
+        except OSError:
+            return False
+
+    def abort(self):
+        """放弃写入并删除临时文件，目标文件保持不变"""
+        if not self._file.closed:
+            self._file.close()
+        try:
+            self.tmp_path.unlink()
+        except FileNotFoundError:
+            pass
+
+    def __enter__(self) -> "AtomicFileWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.abort()
+        return False
+
+
+def _barrier():
+    """flush 使用的空任务"""
+
+
+class WriteResult(NamedTuple):
+    """写入阶段处理单个文件的结果"""
+    path: Path
+    content_hash: str
+    changed: bool           # 内容与磁盘上的文件相同时为False，文件没有被改写
+    error: Optional[str]    # 写入失败时的错误描述
+    seconds: float          # 写入耗时（含比较内容）
+    directories: int = 0    # 写入时补建目录调用 mkdir 的次数
+
+
+class TreeWriter:
+    """生成树的写入阶段：文件内容放入队列，由一个后台线程按提交顺序写入，磁盘延迟不占用生成流程
+
+    - 构建开始时按目录树一次性创建所有目录，之后不再为每个文件调用 mkdir
+    - 先写入同目录下的临时文件，再通过 os.replace 原子地替换目标文件
+    - 内容与磁盘上的文件逐字节相同时不改写，保留修改时间，下游的增量工具不会被触发
+
+    不绑定输出目录，多项目构建时各项目共用一个实例（一个写入线程）。
+    """
+
+    def __init__(self):
+        # 第一次提交时创建，close 后再次提交时重新创建
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        # 已确认存在的目录，只在写入线程中修改
+        self._directories: Set[Path] = set()
+
+    def prepare(self, root: Path, directories: Iterable[str] = ()) -> "Future[int]":
+        """开始一次构建：按目录树一次性创建目录（只对最深的目录调用 mkdir，上级目录随之创建）
+
+        目录在写入线程中创建，排在这次构建的所有文件之前；Future 的结果为调用 mkdir 的次数。
+        """
+        paths = {Path(root) / directory for directory in directories} | {Path(root)}
+        return self._submit(self._create_directories, sorted(paths, key=lambda path: len(path.parts), reverse=True))
+
+    def submit(self, path: Path, content: str,
+               on_done: Callable[[WriteResult], None] = None) -> "Future[WriteResult]":
+        """把文件放入写入队列，立即返回；写入完成后 Future 的结果为 WriteResult
+
+        on_done 在写入线程中紧接着写入执行，flush 返回时已提交文件的 on_done 都已完成。
+        """
+        return self._submit(self._write_and_notify, Path(path), content, on_done)
+
+    def _submit(self, fn, *args) -> Future:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="tree-writer")
+            return self._executor.submit(fn, *args)
+
+    def flush(self):
+        """等待已提交的任务（包括写入完成回调）全部完成
+
+        写入线程只有一个，按提交顺序执行；提交一个空任务作为屏障，它完成时之前的任务都已完成。
+        """
+        with self._lock:
+            executor = self._executor
+        if executor is not None:
+            executor.submit(_barrier).result()
+
+    def close(self):
+        """写完队列中的文件并结束写入线程"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+    def _create_directories(self, directories: List[Path]) -> int:
+        # 目录可能在两次构建之间被删除（清理已移除的文件），每次构建都重新创建一遍最深的目录
+        parents = {directory.parent for directory in directories}
+        created = 0
+        for directory in directories:
+            if directory in self._directories and directory in parents:
+                continue
+            self._directories.discard(directory)
+            try:
+                created += self._ensure_directory(directory)
+            except OSError as e:
+                print(f"创建目录失败: {e}")
+        return created
+
+    def _write_and_notify(self, path: Path, content: str,
+                          on_done: Optional[Callable[[WriteResult], None]]) -> WriteResult:
+        result = self._write(path, content)
+        if on_done is not None:
+            try:
+                on_done(result)
+            except Exception as e:
+                print(f"写入完成回调出错 ({path}): {e}")
+        return result
+
+    def _write(self, path: Path, content: str) -> WriteResult:
+        started = time.perf_counter()
+        data = content.encode('utf-8')
+        content_hash = hashlib.sha256(data).hexdigest()
+        created = 0
+        try:
+            if self._same_content(path, data):
+                return WriteResult(path, content_hash, False, None, time.perf_counter() - started)
+            created += self._ensure_directory(path.parent)
+            try:
+                self._replace(path, data)
+            except FileNotFoundError:
+                # 目录在构建过程中被删除（如清理已移除的文件），重新创建后再试一次
+                self._directories.discard(path.parent)
+                created += self._ensure_directory(path.parent)
+                self._replace(path, data)
+        except OSError as e:
+            return WriteResult(path, content_hash, False, str(e), time.perf_counter() - started, created)
+        return WriteResult(path, content_hash, True, None, time.perf_counter() - started, created)
+
+    @staticmethod
+    def _same_content(path: Path, data: bytes) -> bool:
+        """磁盘上的文件是否与新内容逐字节相同（大小不同时不读取内容）"""
+        try:
+            return path.stat().st_size == len(data) and path.read_bytes() == data
+        except OSError:
+            return False
+
+    @staticmethod
+    def _replace(path: Path, data: bytes):
+        tmp_path = path.with_name(f".{path.name}.{uuid.uuid4().hex[:8]}.tmp")
+        try:
+            with open(tmp_path, 'xb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                tmp_path.unlink()
+            except OSError:
+                pass
+            raise
+
+    def _ensure_directory(self, directory: Path) -> bool:
+        """创建目录并记录它和所有上级目录，已记录的目录不再调用 mkdir；返回是否调用了 mkdir"""
+        if directory in self._directories:
+            return False
+        directory.mkdir(parents=True, exist_ok=True)
+        while directory not in self._directories:
+            self._directories.add(directory)
+            if directory.parent == directory:
+                break
+            directory = directory.parent
+        return True
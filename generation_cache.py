@@ -0,0 +1,111 @@
+import os
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import List, Optional
+
+# 默认缓存目录和容量上限
+DEFAULT_CACHE_DIR = ".apifree_cache"
+DEFAULT_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+
+def make_cache_key(model: str, temperature: float, rendered_prompt: str,
+                   file_path: str, description: str, functions: List[str]) -> str:
+    """根据影响生成结果的全部输入计算缓存键"""
+    payload = json.dumps({
+        "model": model,
+        "temperature": temperature,
+        "prompt": rendered_prompt,
+        "file_path": file_path,
+        "description": description,
+        "functions": list(functions),
+    }, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class GenerationCache:
+    """按内容寻址的LLM生成结果磁盘缓存，超出容量上限时按LRU淘汰"""
+
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR, max_bytes: int = DEFAULT_CACHE_MAX_BYTES):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # 键 -> 文件大小，从最久未使用到最近使用排列
+        self._entries = self._load_index()
+        self._total_bytes = sum(self._entries.values())
+
+    def _entry_path(self, key: str) -> Path:
+        """缓存条目的存储路径（按键前缀分桶，避免单目录文件过多）"""
+        return self.cache_dir / key[:2] / f"{key}.txt"
+
+    def _load_index(self) -> "OrderedDict[str, int]":
+        """扫描缓存目录，按访问时间重建LRU顺序"""
+        found = []
+        for path in self.cache_dir.glob("*/*.txt"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            found.append((stat.st_mtime, path.stem, stat.st_size))
+        found.sort()
+        return OrderedDict((key, size) for _, key, size in found)
+
+    def get(self, key: str) -> Optional[str]:
+        """读取缓存内容，未命中时返回None"""
+        path = self._entry_path(key)
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            try:
+                content = path.read_text(encoding='utf-8')
+                # 更新修改时间，使LRU顺序在进程重启后依然有效
+                os.utime(path)
+            except OSError:
+                self._total_bytes -= self._entries.pop(key)
+                self.misses += 1
+                return None
+            self.hits += 1
+            return content
+
+    def put(self, key: str, content: str):
+        """写入缓存并在超出容量时淘汰最久未使用的条目"""
+        path = self._entry_path(key)
+        data = content.encode('utf-8')
+        with self._lock:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_suffix(".tmp")
+            try:
+                with open(tmp_path, 'wb') as f:
+                    f.write(data)
+                os.replace(tmp_path, path)
+            except OSError as e:
+                print(f"    写入缓存失败: {e}")
+                return
+            if key in self._entries:
+                self._total_bytes -= self._entries.pop(key)
+            self._entries[key] = len(data)
+            self._total_bytes += len(data)
+            self._evict()
+
+    def _evict(self):
+        """淘汰最久未使用的条目直到总大小不超过上限（至少保留最新一条）"""
+        while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+            key, size = self._entries.popitem(last=False)
+            self._total_bytes -= size
+            try:
+                self._entry_path(key).unlink()
+            except OSError:
+                pass
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,520 @@
+import time
+import random
+import asyncio
+import threading
+import contextvars
+from collections import deque
+from concurrent import futures
+from typing import AsyncIterator, Deque, Dict, Iterator, List, Optional
+
+import openai
+from langchain_core.runnables import Runnable
+
+from build_tracer import FileSpan, UsageCallback, current_span
+
+# 默认重试配置
+DEFAULT_MAX_RETRIES = 5
+DEFAULT_BASE_DELAY = 1.0
+DEFAULT_MAX_DELAY = 60.0
+
+# 需要重试的HTTP状态码
+TRANSIENT_STATUS_CODES = {408, 409, 500, 502, 503, 504}
+
+# 对冲请求默认配置：超过同类请求近期延迟的p95时发出对冲请求，对冲请求不超过调用数的10%
+DEFAULT_HEDGE_PERCENTILE = 0.95
+DEFAULT_HEDGE_BUDGET = 0.1
+# 每类请求至少观察到这么多次延迟后才开始对冲，样本不足时使用所有类型的延迟
+DEFAULT_HEDGE_MIN_SAMPLES = 8
+# 每类请求保留的近期延迟数
+DEFAULT_HEDGE_WINDOW = 100
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    """是否为限流错误（429）"""
+    return isinstance(error, openai.RateLimitError) or getattr(error, "status_code", None) == 429
+
+
+def is_transient_error(error: Exception) -> bool:
+    """是否为可以重试的临时错误（连接失败、超时、服务端错误）"""
+    if isinstance(error, (openai.APIConnectionError, openai.APITimeoutError, openai.InternalServerError)):
+        return True
+    return getattr(error, "status_code", None) in TRANSIENT_STATUS_CODES
+
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """读取服务端返回的 Retry-After 头"""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt: int, base_delay: float, max_delay: float) -> float:
+    """带完全抖动的指数退避时间"""
+    return random.uniform(0, min(max_delay, base_delay * (2 ** attempt)))
+
+
+def _trace_latency(span: Optional[FileSpan], started_at: float):
+    """将一次请求的耗时计入span（流式调用包含调用方处理片段的时间）"""
+    if span:
+        span.add("llm_latency", time.monotonic() - started_at)
+
+
+def _trace_retry(span: Optional[FileSpan], delay: float):
+    """将重试次数和退避等待计入span"""
+    if span:
+        span.retries += 1
+        span.add("throttle_wait", delay)
+
+
+def _sleep(seconds: float, cancelled: Optional[threading.Event]):
+    """等待指定秒数，cancelled 被设置时提前返回"""
+    if cancelled is None:
+        time.sleep(seconds)
+    else:
+        cancelled.wait(seconds)
+
+
+class TokenBucket:
+    """令牌桶：容量为每分钟预算，按恒定速率补充
+
+    reserve 立即扣除额度并返回需要等待的时间，允许透支，
+    因此并发调用方按到达顺序排队，不会互相饿死。
+    """
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount: float) -> float:
+        """预留额度，返回需要等待的秒数"""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            # 单次请求超过容量时按容量计，避免永远无法满足
+            self.tokens -= min(amount, self.capacity)
+            if self.tokens >= 0:
+                return 0.0
+            return -self.tokens / self.rate
+
+
+class AdaptiveConcurrency:
+    """AIMD并发控制：请求顺利时加性增加，遇到429或明显变慢时乘性减少"""
+
+    def __init__(self, maximum: int, minimum: int = 1, slow_factor: float = 2.0):
+        self.maximum = max(1, maximum)
+        self.minimum = max(1, min(minimum, self.maximum))
+        self.limit = float(self.maximum)
+        self.slow_factor = slow_factor
+        self.in_flight = 0
+        self.latency_ewma = None
+        self._last_decrease = 0.0
+        self._condition = None
+
+    @property
+    def current_limit(self) -> int:
+        return max(self.minimum, int(self.limit))
+
+    async def acquire(self):
+        """等待并占用一个并发槽位"""
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.in_flight < self.current_limit)
+            self.in_flight += 1
+
+    async def release(self):
+        """释放并发槽位"""
+        async with self._condition:
+            self.in_flight -= 1
+            self._condition.notify_all()
+
+    def on_success(self, started_at: float, latency: float):
+        """根据请求延迟调整并发上限"""
+        if self.latency_ewma is None:
+            self.latency_ewma = latency
+        slow = latency > self.slow_factor * self.latency_ewma
+        self.latency_ewma = 0.8 * self.latency_ewma + 0.2 * latency
+        if slow:
+            self._decrease(started_at, 0.8)
+        else:
+            self.limit = min(float(self.maximum), self.limit + 1.0 / self.limit)
+
+    def on_throttle(self, started_at: float):
+        """遇到429时并发上限减半"""
+        self._decrease(started_at, 0.5)
+
+    def _decrease(self, started_at: float, factor: float):
+        # 同一批在上次下调之前发出的请求只触发一次下调
+        if started_at < self._last_decrease:
+            return
+        self.limit = max(float(self.minimum), self.limit * factor)
+        self._last_decrease = time.monotonic()
+
+
+class HedgePolicy:
+    """对冲请求策略：调用耗时超过同类请求近期延迟的指定百分位时再发出一个相同的请求，先成功的结果胜出
+
+    对冲请求数占对冲候选调用数的比例不超过 budget，避免服务整体变慢时请求量翻倍。
+    """
+
+    def __init__(self, percentile: float = DEFAULT_HEDGE_PERCENTILE, budget: float = DEFAULT_HEDGE_BUDGET,
+                 min_samples: int = DEFAULT_HEDGE_MIN_SAMPLES, window: int = DEFAULT_HEDGE_WINDOW):
+        self.percentile = percentile
+        self.budget = budget
+        self.min_samples = min_samples
+        self.window = window
+        self.calls = 0
+        self.hedged = 0
+        self._latencies: Dict[str, Deque[float]] = {}
+        self._all: Deque[float] = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, key: str, latency: float):
+        """记录一次成功请求的延迟"""
+        with self._lock:
+            self._latencies.setdefault(key, deque(maxlen=self.window)).append(latency)
+            self._all.append(latency)
+
+    def delay(self, key: str) -> Optional[float]:
+        """该类请求发出对冲请求前的等待时间，样本不足时返回None"""
+        with self._lock:
+            samples = self._latencies.get(key)
+            if samples is None or len(samples) < self.min_samples:
+                samples = self._all
+            if len(samples) < self.min_samples:
+                return None
+            ordered = sorted(samples)
+        return ordered[min(len(ordered) - 1, int(self.percentile * len(ordered)))]
+
+    def start_call(self):
+        """记录一次可以对冲的调用"""
+        with self._lock:
+            self.calls += 1
+
+    def try_acquire(self) -> bool:
+        """在预算内占用一次对冲请求"""
+        with self._lock:
+            if self.hedged + 1 > self.budget * self.calls:
+                return False
+            self.hedged += 1
+            return True
+
+
+class LLMClient:
+    """带令牌桶限流、抖动指数退避重试和AIMD自适应并发的模型调用层"""
+
+    def __init__(self, requests_per_minute: float = None, tokens_per_minute: float = None,
+                 max_concurrency: int = 8, max_retries: int = DEFAULT_MAX_RETRIES,
+                 base_delay: float = DEFAULT_BASE_DELAY, max_delay: float = DEFAULT_MAX_DELAY,
+                 hedge: HedgePolicy = None):
+        self.request_bucket = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.token_bucket = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.concurrency = AdaptiveConcurrency(max_concurrency)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.stats = {"requests": 0, "retries": 0, "throttled": 0, "failed": 0, "hedged": 0, "hedge_wins": 0}
+        # 对冲请求：为None时不对冲
+        self.hedge = hedge
+        # 同步调用的对冲请求在线程中执行，首次对冲时创建
+        self._hedge_executor: Optional[futures.ThreadPoolExecutor] = None
+        self._hedge_executor_lock = threading.Lock()
+
+    def _reserve(self, estimated_tokens: int) -> float:
+        """从请求数和token数两个令牌桶预留额度，返回需要等待的秒数"""
+        wait = 0.0
+        if self.request_bucket:
+            wait = max(wait, self.request_bucket.reserve(1))
+        if self.token_bucket:
+            wait = max(wait, self.token_bucket.reserve(estimated_tokens))
+        return wait
+
+    def _retry_delay(self, error: Exception, attempt: int, started_at: float) -> Optional[float]:
+        """判断是否重试并返回等待时间，不应重试时返回None"""
+        if is_rate_limit_error(error):
+            self.stats["throttled"] += 1
+            self.concurrency.on_throttle(started_at)
+        elif not is_transient_error(error):
+            return None
+        if attempt >= self.max_retries:
+            return None
+        self.stats["retries"] += 1
+        delay = backoff_delay(attempt, self.base_delay, self.max_delay)
+        return max(delay, retry_after_seconds(error) or 0.0)
+
+    def _call_config(self, span: Optional[FileSpan]) -> Optional[Dict]:
+        """有正在记录的span时通过回调收集首token时间和token用量"""
+        if span is None:
+            return None
+        return {"callbacks": [UsageCallback(span)]}
+
+    def _flush_usage(self, config: Optional[Dict]):
+        """流式调用结束后补记未由接口返回的token用量"""
+        if config:
+            for callback in config["callbacks"]:
+                callback.flush()
+
+    def _report_retry(self, error: Exception, attempt: int, delay: float):
+        reason = "触发限流" if is_rate_limit_error(error) else f"临时错误({type(error).__name__})"
+        print(f"    {reason}，{delay:.1f}s 后重试 ({attempt + 1}/{self.max_retries})")
+
+    def _record_latency(self, hedge_key: Optional[str], latency: float):
+        if self.hedge is not None and hedge_key is not None:
+            self.hedge.record(hedge_key, latency)
+
+    def invoke(self, chain: Runnable, inputs: Dict, estimated_tokens: int = 0, hedge_key: str = None):
+        """同步调用，失败时按退避策略重试
+
+        启用对冲且给出 hedge_key（如文件类型）时，耗时超过该类请求近期延迟的百分位后在另一个线程中
+        发出相同的请求，先成功的结果胜出。同步请求无法中途中断，落后的请求被标记为已取消：
+        不再等待限流额度或重试，完成后丢弃结果，耗时不计入span和延迟统计。
+        """
+        if self.hedge is None or hedge_key is None:
+            return self._invoke(chain, inputs, estimated_tokens, hedge_key)
+        self.hedge.start_call()
+        delay = self.hedge.delay(hedge_key)
+        if delay is None:
+            return self._invoke(chain, inputs, estimated_tokens, hedge_key)
+        executor = self._get_hedge_executor()
+        cancelled = {}
+        primary = self._submit_hedged(executor, cancelled, chain, inputs, estimated_tokens, hedge_key)
+        done, _ = futures.wait([primary], timeout=delay)
+        if done or not self.hedge.try_acquire():
+            return primary.result()
+        self.stats["hedged"] += 1
+        backup = self._submit_hedged(executor, cancelled, chain, inputs, estimated_tokens, hedge_key)
+        pending = {primary, backup}
+        while pending:
+            done, pending = futures.wait(pending, return_when=futures.FIRST_COMPLETED)
+            for future in (primary, backup):
+                if future in done and future.exception() is None:
+                    if future is backup:
+                        self.stats["hedge_wins"] += 1
+                    # 落后的请求：尚未开始时直接取消，已在进行时标记为取消并丢弃结果
+                    for other in pending:
+                        cancelled[other].set()
+                        other.cancel()
+                    return future.result()
+        return primary.result()
+
+    def _submit_hedged(self, executor: futures.ThreadPoolExecutor, cancelled: Dict[futures.Future, threading.Event],
+                       chain: Runnable, inputs: Dict, estimated_tokens: int, hedge_key: str) -> futures.Future:
+        """在线程中发出对冲的一方请求，cancelled 中记录该请求的取消标记"""
+        event = threading.Event()
+        # 在线程中执行时保留当前span，耗时和token用量仍计入该文件
+        future = executor.submit(contextvars.copy_context().run, self._invoke, chain, inputs, estimated_tokens,
+                                 hedge_key, event)
+        cancelled[future] = event
+        return future
+
+    def _get_hedge_executor(self) -> futures.ThreadPoolExecutor:
+        with self._hedge_executor_lock:
+            if self._hedge_executor is None:
+                self._hedge_executor = futures.ThreadPoolExecutor(
+                    max_workers=max(4, 2 * self.concurrency.maximum), thread_name_prefix="hedge"
+                )
+            return self._hedge_executor
+
+    def _invoke(self, chain: Runnable, inputs: Dict, estimated_tokens: int, hedge_key: Optional[str],
+                cancelled: threading.Event = None):
+        """cancelled 被设置时（对冲请求中落后的一方）不再发出请求，已完成的请求不计入统计"""
+        span = current_span.get()
+        config = self._call_config(span)
+        attempt = 0
+        while True:
+            if cancelled is not None and cancelled.is_set():
+                raise futures.CancelledError()
+            wait = self._reserve(estimated_tokens)
+            _sleep(wait, cancelled)
+            if cancelled is not None and cancelled.is_set():
+                raise futures.CancelledError()
+            started_at = time.monotonic()
+            self.stats["requests"] += 1
+            if span:
+                span.add("throttle_wait", wait)
+                span.attempt_started()
+            try:
+                result = chain.invoke(inputs, config=config)
+            except Exception as e:
+                if cancelled is not None and cancelled.is_set():
+                    raise futures.CancelledError() from e
+                _trace_latency(span, started_at)
+                delay = self._retry_delay(e, attempt, started_at)
+                if delay is None:
+                    self.stats["failed"] += 1
+                    raise
+                self._report_retry(e, attempt, delay)
+                _trace_retry(span, delay)
+                _sleep(delay, cancelled)
+                attempt += 1
+                continue
+            if cancelled is not None and cancelled.is_set():
+                raise futures.CancelledError()
+            _trace_latency(span, started_at)
+            latency = time.monotonic() - started_at
+            self.concurrency.on_success(started_at, latency)
+            self._record_latency(hedge_key, latency)
+            return result
+
+    async def ainvoke(self, chain: Runnable, inputs: Dict, estimated_tokens: int = 0, hedge_key: str = None):
+        """异步调用，受自适应并发上限约束
+
+        启用对冲且给出 hedge_key（如文件类型）时，耗时超过该类请求近期延迟的百分位后再发出一个相同的请求，
+        先成功的结果胜出，另一个请求被取消。
+        """
+        if self.hedge is None or hedge_key is None:
+            return await self._ainvoke(chain, inputs, estimated_tokens, hedge_key)
+        self.hedge.start_call()
+        delay = self.hedge.delay(hedge_key)
+        primary = asyncio.ensure_future(self._ainvoke(chain, inputs, estimated_tokens, hedge_key))
+        if delay is None:
+            return await primary
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=delay)
+        except asyncio.CancelledError:
+            primary.cancel()
+            raise
+        if done or not self.hedge.try_acquire():
+            return await primary
+        self.stats["hedged"] += 1
+        backup = asyncio.ensure_future(self._ainvoke(chain, inputs, estimated_tokens, hedge_key))
+        return await self._first_success([primary, backup])
+
+    async def _first_success(self, tasks: List[asyncio.Task]):
+        """返回最先成功的结果并取消其余请求，全部失败时抛出原请求的异常"""
+        pending = set(tasks)
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in tasks:
+                    if task in done and task.exception() is None:
+                        if task is not tasks[0]:
+                            self.stats["hedge_wins"] += 1
+                        return task.result()
+            raise tasks[0].exception()
+        finally:
+            for task in pending:
+                task.cancel()
+            # 等待被取消的请求释放并发槽位
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    async def _ainvoke(self, chain: Runnable, inputs: Dict, estimated_tokens: int, hedge_key: Optional[str]):
+        span = current_span.get()
+        config = self._call_config(span)
+        attempt = 0
+        while True:
+            waited_at = time.monotonic()
+            await asyncio.sleep(self._reserve(estimated_tokens))
+            await self.concurrency.acquire()
+            started_at = time.monotonic()
+            self.stats["requests"] += 1
+            if span:
+                span.add("throttle_wait", started_at - waited_at)
+                span.attempt_started()
+            error = None
+            try:
+                result = await chain.ainvoke(inputs, config=config)
+            except Exception as e:
+                error = e
+            finally:
+                await self.concurrency.release()
+            _trace_latency(span, started_at)
+            if error is None:
+                latency = time.monotonic() - started_at
+                self.concurrency.on_success(started_at, latency)
+                self._record_latency(hedge_key, latency)
+                return result
+            delay = self._retry_delay(error, attempt, started_at)
+            if delay is None:
+                self.stats["failed"] += 1
+                raise error
+            self._report_retry(error, attempt, delay)
+            _trace_retry(span, delay)
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    def stream(self, chain: Runnable, inputs: Dict, estimated_tokens: int = 0) -> Iterator:
+        """同步流式调用，只在收到第一个片段之前重试"""
+        span = current_span.get()
+        config = self._call_config(span)
+        attempt = 0
+        while True:
+            wait = self._reserve(estimated_tokens)
+            time.sleep(wait)
+            started_at = time.monotonic()
+            self.stats["requests"] += 1
+            if span:
+                span.add("throttle_wait", wait)
+                span.attempt_started()
+            received = False
+            chunks = chain.stream(inputs, config=config)
+            try:
+                for chunk in chunks:
+                    received = True
+                    yield chunk
+            except Exception as e:
+                delay = None if received else self._retry_delay(e, attempt, started_at)
+                if delay is None:
+                    self.stats["failed"] += 1
+                    raise
+                self._report_retry(e, attempt, delay)
+                _trace_retry(span, delay)
+                time.sleep(delay)
+                attempt += 1
+                continue
+            finally:
+                # 调用方提前结束时关闭底层连接
+                chunks.close()
+                _trace_latency(span, started_at)
+                self._flush_usage(config)
+            self.concurrency.on_success(started_at, time.monotonic() - started_at)
+            return
+
+    async def astream(self, chain: Runnable, inputs: Dict, estimated_tokens: int = 0) -> AsyncIterator:
+        """异步流式调用，整个流期间占用一个并发槽位，只在收到第一个片段之前重试"""
+        span = current_span.get()
+        config = self._call_config(span)
+        attempt = 0
+        while True:
+            waited_at = time.monotonic()
+            await asyncio.sleep(self._reserve(estimated_tokens))
+            await self.concurrency.acquire()
+            started_at = time.monotonic()
+            self.stats["requests"] += 1
+            if span:
+                span.add("throttle_wait", started_at - waited_at)
+                span.attempt_started()
+            received = False
+            error = None
+            chunks = chain.astream(inputs, config=config)
+            try:
+                async for chunk in chunks:
+                    received = True
+                    yield chunk
+            except Exception as e:
+                error = e
+            finally:
+                await chunks.aclose()
+                await self.concurrency.release()
+                _trace_latency(span, started_at)
+                self._flush_usage(config)
+            if error is None:
+                self.concurrency.on_success(started_at, time.monotonic() - started_at)
+                return
+            delay = None if received else self._retry_delay(error, attempt, started_at)
+            if delay is None:
+                self.stats["failed"] += 1
+                raise error
+            self._report_retry(error, attempt, delay)
+            _trace_retry(span, delay)
+            await asyncio.sleep(delay)
+            attempt += 1
@@ -0,0 +1,159 @@
+from pathlib import Path
+from typing import Dict, Optional
+
+# 渲染引擎配置：渲染类别 -> "local"（本地模板）或 "llm"（调用模型）
+DEFAULT_RENDER_ENGINES = {
+    "package": "local",
+    "requirements": "local",
+    "docker": "local",
+    "alembic_ini": "local",
+    "alembic_mako": "local",
+}
+
+RENDER_ENGINES = ("local", "llm")
+
+REQUIREMENTS_TEMPLATE = """fastapi==0.104.1
+uvicorn==0.24.0
+sqlalchemy==2.0.23
+pydantic==2.5.0
+python-multipart==0.0.6
+python-jose==3.3.0
+passlib==1.7.4
+alembic==1.13.0
+pytest==7.4.3
+httpx==0.25.2
+"""
+
+DOCKERFILE_TEMPLATE = """FROM python:3.11-slim
+
+WORKDIR /app
+
+COPY requirements.txt .
+RUN pip install -r requirements.txt
+
+COPY . .
+
+CMD ["uvicorn", "app.main:app", "--host", "0.0.0.0", "--port", "8000"]
+"""
+
+PACKAGE_INIT_TEMPLATE = '"""{package} package."""\n'
+
+ALEMBIC_INI_TEMPLATE = """[alembic]
+script_location = {script_location}
+prepend_sys_path = .
+sqlalchemy.url = sqlite:///./app.db
+
+[loggers]
+keys = root,sqlalchemy,alembic
+
+[handlers]
+keys = console
+
+[formatters]
+keys = generic
+
+[logger_root]
+level = WARN
+handlers = console
+qualname =
+
+[logger_sqlalchemy]
+level = WARN
+handlers =
+qualname = sqlalchemy.engine
+
+[logger_alembic]
+level = INFO
+handlers =
+qualname = alembic
+
+[handler_console]
+class = StreamHandler
+args = (sys.stderr,)
+level = NOTSET
+formatter = generic
+
+[formatter_generic]
+format = %(levelname)-5.5s [%(name)s] %(message)s
+datefmt = %H:%M:%S
+"""
+
+ALEMBIC_MAKO_TEMPLATE = '''"""${message}
+
+Revision ID: ${up_revision}
+Revises: ${down_revision | comma,n}
+Create Date: ${create_date}
+
+"""
+from alembic import op
+import sqlalchemy as sa
+${imports if imports else ""}
+
+# revision identifiers, used by Alembic.
+revision = ${repr(up_revision)}
+down_revision = ${repr(down_revision)}
+branch_labels = ${repr(branch_labels)}
+depends_on = ${repr(depends_on)}
+
+
+def upgrade() -> None:
+    ${upgrades if upgrades else "pass"}
+
+
+def downgrade() -> None:
+    ${downgrades if downgrades else "pass"}
+'''
+
+
+def render_kind(file_path: str, file_type: str) -> str:
+    """确定文件的渲染类别：特定文件名优先，其次按文件类型"""
+    name = Path(file_path).name
+    if name == '__init__.py':
+        return "package"
+    if name == 'alembic.ini':
+        return "alembic_ini"
+    if name == 'script.py.mako':
+        return "alembic_mako"
+    return file_type
+
+
+class LocalRenderer:
+    """确定性文件的本地模板引擎，无需调用模型，输出逐字节可复现"""
+
+    def __init__(self, engines: Dict[str, str] = None):
+        self.engines = dict(DEFAULT_RENDER_ENGINES)
+        if engines:
+            for kind, engine in engines.items():
+                if engine not in RENDER_ENGINES:
+                    raise ValueError(f"未知的渲染引擎: {kind}={engine}")
+                self.engines[kind] = engine
+
+    def can_render(self, file_path: str, file_type: str) -> bool:
+        """该文件是否配置为本地渲染且有对应模板"""
+        kind = render_kind(file_path, file_type)
+        return self.engines.get(kind) == "local" and hasattr(self, f"_render_{kind}")
+
+    def render(self, file_path: str, file_type: str) -> Optional[str]:
+        """渲染本地模板，不支持的文件返回None"""
+        kind = render_kind(file_path, file_type)
+        renderer = getattr(self, f"_render_{kind}", None)
+        return renderer(file_path) if renderer else None
+
+    def _render_package(self, file_path: str) -> str:
+        package = '.'.join(Path(file_path).parent.parts) or "root"
+        return PACKAGE_INIT_TEMPLATE.format(package=package)
+
+    def _render_requirements(self, file_path: str) -> str:
+        return REQUIREMENTS_TEMPLATE
+
+    def _render_docker(self, file_path: str) -> str:
+        return DOCKERFILE_TEMPLATE
+
+    def _render_alembic_ini(self, file_path: str) -> str:
+        # alembic.ini 位于迁移目录内部时脚本目录就是其所在目录
+        parent = Path(file_path).parent
+        script_location = "%(here)s" if parent.parts else "alembic"
+        return ALEMBIC_INI_TEMPLATE.format(script_location=script_location)
+
+    def _render_alembic_mako(self, file_path: str) -> str:
+        return ALEMBIC_MAKO_TEMPLATE
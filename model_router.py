@@ -0,0 +1,65 @@
+from typing import Dict, List, NamedTuple, Optional
+
+# 模型层级，按能力从低到高排列；校验失败时逐级升级
+TIER_ORDER = ["fast", "strong"]
+
+# 各层级默认使用的模型（硅基流动）
+DEFAULT_TIER_MODELS = {
+    "fast": "Qwen/Qwen2.5-Coder-7B-Instruct",
+    "strong": "Qwen/Qwen2.5-Coder-32B-Instruct",
+}
+
+
+class TierRule(NamedTuple):
+    """单个文件类型的模型层级"""
+    tier: str               # 默认层级
+    max_functions: int      # 函数/类超过该数量时升级到上一层级
+    max_description: int    # 描述超过该字符数时升级到上一层级
+
+
+# 结构简单的文件（配置、数据模型、依赖列表等）交给小模型，业务逻辑和接口交给大模型
+TIER_RULES = {
+    "requirements": TierRule("fast", 99, 10000),
+    "docker": TierRule("fast", 99, 10000),
+    "config": TierRule("fast", 8, 600),
+    "schema": TierRule("fast", 6, 400),
+    "model": TierRule("fast", 5, 400),
+    "database": TierRule("fast", 5, 400),
+    "migration": TierRule("fast", 5, 400),
+    "util": TierRule("fast", 4, 300),
+    "test": TierRule("fast", 6, 400),
+    "service": TierRule("strong", 99, 10000),
+    "router": TierRule("strong", 99, 10000),
+    "main": TierRule("strong", 99, 10000),
+}
+
+
+class ModelRouter:
+    """按文件类型和复杂度（函数数量、描述长度）为每个文件选择模型层级"""
+
+    def __init__(self, tier_models: Dict[str, str], rules: Dict[str, TierRule] = None,
+                 tier_order: List[str] = None):
+        self.tier_order = [tier for tier in (tier_order or TIER_ORDER) if tier in tier_models]
+        if not self.tier_order:
+            raise ValueError("至少需要配置一个模型层级")
+        self.tier_models = tier_models
+        self.rules = rules or TIER_RULES
+
+    def route(self, file_path: str, file_info: Dict) -> str:
+        """文件使用的模型层级"""
+        if file_path.rpartition('/')[2] == '__init__.py':
+            return self.tier_order[0]
+        rule = self.rules.get(file_info['type'], self.rules.get('util'))
+        tier = rule.tier if rule and rule.tier in self.tier_order else self.tier_order[-1]
+        if rule and (len(file_info['functions']) > rule.max_functions
+                     or len(file_info['description']) > rule.max_description):
+            tier = self.escalate(tier) or tier
+        return tier
+
+    def escalate(self, tier: str) -> Optional[str]:
+        """上一层级，已经是最高层级时返回None"""
+        index = self.tier_order.index(tier)
+        return self.tier_order[index + 1] if index + 1 < len(self.tier_order) else None
+
+    def model(self, tier: str) -> str:
+        return self.tier_models[tier]
@@ -0,0 +1,169 @@
+import re
+from typing import Iterator, List, NamedTuple, Optional, Tuple
+
+# 行首的树形字符：Unicode（tree 命令、模型输出）和 ASCII（|-- `-- +-- \--）两种形式
+_TREE_PREFIX_CHARS = set(" │├└─┬┼┃┣┗━|`+\\-")
+
+# tree 命令末尾的统计行
+_TREE_SUMMARY_PATTERN = re.compile(r'^\d+ director(y|ies)(, \d+ files?)?$')
+
+# 行尾注释：main.py  # 入口
+_COMMENT_PATTERN = re.compile(r'\s+#.*$')
+
+TAB_WIDTH = 4
+
+
+class TrieNode:
+    """路径前缀树的节点"""
+
+    __slots__ = ("name", "parent", "children", "is_file")
+
+    def __init__(self, name: str, parent: Optional["TrieNode"], is_file: bool):
+        self.name = name
+        self.parent = parent
+        self.children = None if is_file else {}
+        self.is_file = is_file
+
+    @property
+    def path(self) -> str:
+        parts = []
+        node = self
+        while node.parent is not None:
+            parts.append(node.name)
+            node = node.parent
+        return '/'.join(reversed(parts))
+
+
+class PathTrie:
+    """目录树的紧凑前缀树，按子树查询文件和目录，保持目录树中的顺序"""
+
+    def __init__(self, root_name: str = None):
+        self.root = TrieNode("", None, False)
+        # 解析时去掉的项目根目录名（如 blog_system）
+        self.root_name = root_name
+        self._file_count = 0
+
+    def insert(self, path: str, is_file: bool = True) -> TrieNode:
+        """插入文件或目录，中间目录自动创建"""
+        parts = [part for part in path.strip('/').split('/') if part]
+        node = self.root
+        for index, part in enumerate(parts):
+            node = self.add_child(node, part, is_file and index == len(parts) - 1)
+        return node
+
+    def add_child(self, parent: TrieNode, name: str, is_file: bool) -> TrieNode:
+        """在目录节点下添加子节点，已存在时返回原节点"""
+        if parent.is_file:
+            raise ValueError(f"路径冲突: {parent.path} 既是文件又是目录")
+        child = parent.children.get(name)
+        if child is None:
+            child = TrieNode(name, parent, is_file)
+            parent.children[name] = child
+            if is_file:
+                self._file_count += 1
+        return child
+
+    def find(self, path: str) -> Optional[TrieNode]:
+        """查找路径对应的节点"""
+        node = self.root
+        for part in path.strip('/').split('/'):
+            if not part:
+                continue
+            if node.is_file:
+                return None
+            node = node.children.get(part)
+            if node is None:
+                return None
+        return node
+
+    def files(self, prefix: str = '') -> List[str]:
+        """前缀（目录）下的所有文件路径"""
+        return [path for path, is_file in self._walk(prefix) if is_file]
+
+    def directories(self, prefix: str = '') -> List[str]:
+        """前缀（目录）下的所有目录路径，父目录在前"""
+        return [path for path, is_file in self._walk(prefix) if not is_file]
+
+    def _walk(self, prefix: str) -> Iterator[Tuple[str, bool]]:
+        node = self.find(prefix)
+        if node is None:
+            return
+        if node.is_file:
+            yield node.path, True
+            return
+        base = node.path
+        stack = [(base, child) for child in reversed(list(node.children.values()))]
+        while stack:
+            parent_path, child = stack.pop()
+            path = f"{parent_path}/{child.name}" if parent_path else child.name
+            yield path, child.is_file
+            if not child.is_file:
+                stack.extend((path, grandchild) for grandchild in reversed(list(child.children.values())))
+
+    def __contains__(self, path: str) -> bool:
+        return self.find(path) is not None
+
+    def __len__(self) -> int:
+        return self._file_count
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.files())
+
+
+class TreeEntry(NamedTuple):
+    """目录树中的一行"""
+    column: int       # 名称所在的列（展开制表符后）
+    name: str
+    is_dir: bool      # 名称以 / 结尾
+    bare: bool        # 行首没有树形字符
+
+
+def _tokenize_tree(tree_content: str) -> List[TreeEntry]:
+    entries = []
+    for raw_line in tree_content.splitlines():
+        line = raw_line.replace('\u00a0', ' ').expandtabs(TAB_WIDTH).rstrip()
+        if not line.strip() or _TREE_SUMMARY_PATTERN.match(line.strip()):
+            continue
+        column = 0
+        while column < len(line) and line[column] in _TREE_PREFIX_CHARS:
+            column += 1
+        name = _COMMENT_PATTERN.sub('', line[column:]).strip().strip('`').strip()
+        if not name:
+            continue
+        bare = not line[:column].strip()
+        entries.append(TreeEntry(column, name, name.endswith('/'), bare))
+    return entries
+
+
+def parse_tree(tree_content: str, strip_root: bool = True) -> PathTrie:
+    """解析目录树文本为前缀树
+
+    层级由名称所在的列决定（不假设固定缩进宽度），支持制表符缩进、tree 命令输出和 ASCII 树。
+    顶格、没有树形字符且其余条目都在其下的第一行视为项目根目录，默认不计入路径。
+    下一行缩进更深的条目即使没有以 / 结尾也视为目录（tree 命令不输出 /）。
+    """
+    entries = _tokenize_tree(tree_content)
+    trie = PathTrie()
+    # (名称列, 目录节点)
+    stack = []
+
+    start = 0
+    if entries and strip_root:
+        first = entries[0]
+        has_children = len(entries) > 1 and all(entry.column > first.column for entry in entries[1:])
+        if first.bare and has_children:
+            trie.root_name = first.name.rstrip('/') if first.name not in ('.', './') else None
+            stack.append((first.column, trie.root))
+            start = 1
+
+    for index in range(start, len(entries)):
+        entry = entries[index]
+        while stack and stack[-1][0] >= entry.column:
+            stack.pop()
+        parent = stack[-1][1] if stack else trie.root
+        following = entries[index + 1] if index + 1 < len(entries) else None
+        is_dir = entry.is_dir or (following is not None and following.column > entry.column)
+        node = trie.add_child(parent, entry.name.rstrip('/'), not is_dir)
+        if is_dir:
+            stack.append((entry.column, node))
+    return trie
@@ -0,0 +1,100 @@
+import os
+from typing import Dict, List, Optional
+from langchain_core.messages import BaseMessage
+from langchain_core.prompts import ChatPromptTemplate
+from token_budget import estimate_tokens
+
+# 项目上下文的字符上限，超出的文件只给出数量
+DEFAULT_PROJECT_CONTEXT_MAX_CHARS = 3000
+
+# 单文件请求的用户消息：随文件变化的变量全部放在提示末尾，前面的系统消息在同一次构建中保持不变
+FILE_REQUEST_TEMPLATE = """文件路径: {file_path}
+文件描述: {description}
+需要实现的函数或类: {functions}
+已生成的依赖模块（导入项目内部模块时优先使用这里列出的模块和符号，不要在本文件中重新实现它们）:
+{context}"""
+
+# 合并请求和修复请求的用户消息
+BATCH_REQUEST_TEMPLATE = """需要生成的文件:
+
+{files}"""
+FIX_REQUEST_TEMPLATE = """文件路径: {file_path}
+编译错误:
+{error}
+
+代码:
+{code}"""
+
+
+def format_project_context(file_paths: List[str], root_name: Optional[str] = None,
+                           requirement: Optional[str] = None,
+                           max_chars: int = DEFAULT_PROJECT_CONTEXT_MAX_CHARS) -> str:
+    """项目级上下文（项目名、需求和文件清单），同一次构建中的所有请求共用"""
+    lines = []
+    if root_name:
+        lines.append(f"项目名称: {root_name}")
+    if requirement:
+        requirement = requirement.strip()
+        if len(requirement) > max_chars:
+            requirement = requirement[:max_chars] + "……"
+        lines.append(f"项目需求:\n{requirement}")
+    if file_paths:
+        lines.append(f"项目文件清单（共 {len(file_paths)} 个）:")
+        used = 0
+        for index, file_path in enumerate(file_paths):
+            if used + len(file_path) > max_chars:
+                lines.append(f"……其余 {len(file_paths) - index} 个文件省略")
+                break
+            lines.append(file_path)
+            used += len(file_path) + 1
+    return "\n".join(lines) or "项目上下文: 无"
+
+
+def build_chat_prompt(rules: str, request_template: str, partial_variables: Dict[str, str] = None) -> ChatPromptTemplate:
+    """系统消息为项目上下文加类型规则，用户消息为单个请求的变量
+
+    系统消息在同一次构建中逐字节相同，服务端可以缓存这部分前缀。
+    """
+    prompt = ChatPromptTemplate.from_messages([
+        ("system", "{project_context}\n\n" + rules.strip()),
+        ("human", request_template),
+    ])
+    return prompt.partial(**partial_variables) if partial_variables else prompt
+
+
+class PrefixCacheStats:
+    """统计一次构建中各请求与之前的请求相同的提示前缀（服务端前缀缓存可以复用的部分）"""
+
+    def __init__(self):
+        self.requests = 0
+        self.prompt_tokens = 0
+        self.shared_tokens = 0
+        # 已发送的系统消息 -> token数
+        self._prefixes: Dict[str, int] = {}
+
+    def record(self, messages: List[BaseMessage]):
+        """记录一次请求的消息"""
+        system = messages[0].content if messages and messages[0].type == "system" else ""
+        self.requests += 1
+        self.prompt_tokens += sum(estimate_tokens(message.content) for message in messages)
+        if system in self._prefixes:
+            self.shared_tokens += self._prefixes[system]
+            return
+        # 新的系统消息（其他文件类型）仍与已发送的系统消息共享项目上下文部分
+        common = max((len(os.path.commonprefix([system, seen])) for seen in self._prefixes), default=0)
+        if common:
+            self.shared_tokens += estimate_tokens(system[:common])
+        if system:
+            self._prefixes[system] = estimate_tokens(system)
+
+    @property
+    def distinct_prefixes(self) -> int:
+        return len(self._prefixes)
+
+    @property
+    def common_prefix_tokens(self) -> int:
+        """所有系统消息共同的前缀token数"""
+        if not self._prefixes:
+            return 0
+        common = os.path.commonprefix(list(self._prefixes))
+        return estimate_tokens(common) if common else 0
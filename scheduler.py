@@ -0,0 +1,312 @@
+import re
+import heapq
+import asyncio
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+# 同一实体（如 post）的代码分层：routers/posts.py -> services/post_service.py -> schemas/post.py -> models/post.py
+LAYER_ORDER = ['model', 'schema', 'service', 'router', 'main', 'test']
+
+# 推断不出具体依赖时，依赖最近的上级包中第一个存在的前置类型的全部文件
+TYPE_PREREQUISITES = {
+    'database': ['config'],
+    'model': ['database', 'config'],
+    'schema': ['model'],
+    'service': ['schema', 'model', 'database'],
+    'router': ['service', 'schema', 'model'],
+    'main': ['router', 'config', 'database'],
+    'test': ['main', 'router'],
+    'migration': ['model', 'database'],
+}
+
+# 与实体无关的共享模块（数据库会话、配置、认证等工具），对应类型的Python文件总是依赖最近的上级包中这些类型的模块
+SHARED_PREREQUISITES = {
+    'model': ['database', 'config'],
+    'service': ['database', 'config', 'util'],
+    'router': ['database', 'config', 'util'],
+    'main': ['database', 'config'],
+    'test': ['main'],
+    'migration': ['database', 'config'],
+}
+
+# 包内组织代码的目录名：app/database/db.py、app/routers/posts.py、tests/test_posts.py 都属于 app 的上级包，
+# 同名实体和共享模块按包分组，多包项目中各包互不影响
+_LAYOUT_DIRS = {'app', 'src', 'database', 'db', 'core', 'config', 'settings', 'auth', 'security',
+                'utils', 'util', 'helpers', 'common', 'models', 'schemas', 'services', 'routers', 'routes',
+                'api', 'endpoints', 'crud', 'tests', 'test'}
+# util 是分类器的默认类型，只有目录名或文件名表明是工具模块的 util 文件才作为共享模块
+_SHARED_UTIL_NAMES = {'utils', 'util', 'helpers', 'helper', 'common', 'core', 'auth', 'security',
+                      'deps', 'dependencies'}
+
+# 文件名中表示分层的前后缀：post_service.py、posts_router.py、test_posts.py
+_ENTITY_SUFFIXES = ('_service', '_services', '_router', '_routers', '_routes', '_schema', '_schemas',
+                    '_model', '_models', '_crud', '_api', '_endpoints', '_test')
+
+# 描述中的导入提示：from app.models.post import Post、import app.db
+_IMPORT_HINT_PATTERN = re.compile(r'\b(?:from|import)\s+(\.*[A-Za-z_][\w.]*)')
+# 描述中直接写出的文件路径：app/models/post.py
+_PATH_HINT_PATTERN = re.compile(r'[\w.\-]+(?:/[\w.\-]+)*\.py\b', re.ASCII)
+
+
+def _singular(word: str) -> str:
+    if word.endswith('ies') and len(word) > 4:
+        return word[:-3] + 'y'
+    if word.endswith('ses') and len(word) > 4:
+        return word[:-2]
+    if word.endswith('s') and not word.endswith('ss') and len(word) > 3:
+        return word[:-1]
+    return word
+
+
+def entity_key(file_path: str) -> Optional[str]:
+    """文件对应的实体名：routers/posts.py、services/post_service.py、tests/test_posts.py 都是 post"""
+    name = file_path.rpartition('/')[2].lower()
+    stem = name.rpartition('.')[0] if '.' in name.lstrip('.') else name
+    if stem.startswith('__'):
+        return None
+    if stem.startswith('test_'):
+        stem = stem[5:]
+    for suffix in _ENTITY_SUFFIXES:
+        if stem.endswith(suffix) and len(stem) > len(suffix):
+            stem = stem[:-len(suffix)]
+            break
+    return _singular(stem) or None
+
+
+def _directory(file_path: str) -> str:
+    return file_path.rpartition('/')[0]
+
+
+def _ancestors(directory: str) -> List[str]:
+    """目录自身和所有上级目录，由近到远，最后是项目根目录（空字符串）"""
+    scopes = []
+    while directory:
+        scopes.append(directory)
+        directory = _directory(directory)
+    scopes.append('')
+    return scopes
+
+
+def _nearest(table: Dict[Tuple[str, str], List[str]], file_type: str, scopes: List[str]) -> List[str]:
+    """按由近到远的包查找某类型的文件，返回最近一个包中的文件"""
+    for scope in scopes:
+        if (file_type, scope) in table:
+            return table[(file_type, scope)]
+    return []
+
+
+def _package_root(file_path: str) -> str:
+    """文件所属的包：去掉末尾的包内目录后的路径（services/blog/app/database/db.py -> services/blog）"""
+    parts = _directory(file_path).split('/') if '/' in file_path else []
+    while parts and parts[-1].lower() in _LAYOUT_DIRS:
+        parts.pop()
+    return '/'.join(parts)
+
+
+def _is_shared_module(file_path: str, file_type: str) -> bool:
+    """可以作为共享依赖的文件：Python模块，不是包初始化文件，util 类型需由名称表明是工具模块"""
+    if not file_path.endswith('.py') or file_path.endswith('__init__.py'):
+        return False
+    if file_type != 'util':
+        return True
+    names = file_path[:-3].lower().split('/')
+    return any(name in _SHARED_UTIL_NAMES for name in names[:-1] + names[-1].split('_'))
+
+
+class ModuleResolver:
+    """把规格中的依赖写法（路径、模块名、相对导入）解析为项目中的文件路径"""
+
+    def __init__(self, file_paths: Iterable[str]):
+        self.files = set(file_paths)
+        # 路径后缀（至少两段）和模块名后缀 -> 文件路径，有歧义的后缀映射为None
+        self._suffixes: Dict[str, Optional[str]] = {}
+        self._modules: Dict[str, Optional[str]] = {}
+        for file_path in self.files:
+            parts = file_path.split('/')
+            for start in range(1, len(parts) - 1):
+                self._add(self._suffixes, '/'.join(parts[start:]), file_path)
+            if not file_path.endswith('.py'):
+                continue
+            parts = file_path[:-3].split('/')
+            if parts[-1] == '__init__':
+                parts = parts[:-1]
+            for start in range(len(parts)):
+                if len(parts) - start < 2 and start > 0:
+                    break
+                self._add(self._modules, '.'.join(parts[start:]), file_path)
+
+    @staticmethod
+    def _add(table: Dict[str, Optional[str]], key: str, file_path: str):
+        if key in table and table[key] != file_path:
+            table[key] = None
+        else:
+            table[key] = file_path
+
+    def resolve(self, reference: str) -> Optional[str]:
+        reference = reference.strip().strip('`').lstrip('./')
+        if not reference:
+            return None
+        if reference in self.files:
+            return reference
+        if '/' in reference or reference.endswith('.py'):
+            # 只写了后半段的路径，或带有根目录前缀的路径
+            if reference in self._suffixes:
+                return self._suffixes[reference]
+            parts = reference.split('/')
+            for start in range(1, len(parts)):
+                candidate = '/'.join(parts[start:])
+                if candidate in self.files:
+                    return candidate
+            return None
+        return self._modules.get(reference)
+
+
+class DependencyGraph:
+    """文件级依赖图：每个文件只等待自己的依赖完成，而不是整层文件完成"""
+
+    def __init__(self, dependencies: Dict[str, List[str]], order: List[str]):
+        # 文件 -> 依赖的文件（都在图中）
+        self.dependencies = dependencies
+        # 拓扑顺序，同一时刻可开始的文件按类型顺序和规格中的顺序排列
+        self.order = order
+
+    @classmethod
+    def infer(cls, project_files: Dict[str, Dict], type_order: List[str]) -> "DependencyGraph":
+        """根据规格中的依赖声明、描述中的导入提示、同名实体的分层关系推断依赖，都推断不出时按类型兜底；
+        此外总是依赖共享模块"""
+        resolver = ModuleResolver(project_files)
+        entities: Dict[str, str] = {}
+        by_entity: Dict[str, List[str]] = {}
+        # (类型, 所属的包) -> 文件
+        by_type: Dict[Tuple[str, str], List[str]] = {}
+        # (类型, 所属的包) -> 共享模块
+        shared: Dict[Tuple[str, str], List[str]] = {}
+        for file_path, file_info in project_files.items():
+            by_type.setdefault((file_info['type'], _package_root(file_path)), []).append(file_path)
+            if _is_shared_module(file_path, file_info['type']):
+                shared.setdefault((file_info['type'], _package_root(file_path)), []).append(file_path)
+            if file_info['type'] in LAYER_ORDER:
+                key = entity_key(file_path)
+                if key:
+                    key = f"{_package_root(file_path)}:{key}"
+                    entities[file_path] = key
+                    by_entity.setdefault(key, []).append(file_path)
+
+        dependencies = {}
+        for file_path, file_info in project_files.items():
+            found: List[str] = []
+
+            # 规格中声明的依赖和描述中的导入提示
+            references = list(file_info.get('dependencies', []))
+            description = file_info.get('description', '')
+            references.extend(_IMPORT_HINT_PATTERN.findall(description))
+            references.extend(_PATH_HINT_PATTERN.findall(description))
+            for reference in references:
+                target = resolver.resolve(reference)
+                if target and target != file_path and target not in found:
+                    found.append(target)
+
+            # 同名实体中层次更低的文件
+            file_type = file_info['type']
+            if file_path in entities:
+                layer = LAYER_ORDER.index(file_type)
+                for sibling in by_entity[entities[file_path]]:
+                    sibling_type = project_files[sibling]['type']
+                    if LAYER_ORDER.index(sibling_type) < layer and sibling not in found:
+                        found.append(sibling)
+
+            # 兜底：最近的上级包中第一个存在的前置类型的全部文件
+            scopes = _ancestors(_package_root(file_path))
+            if not found:
+                for prerequisite in TYPE_PREREQUISITES.get(file_type, []):
+                    targets = _nearest(by_type, prerequisite, scopes)
+                    if targets:
+                        found = [target for target in targets if target != file_path]
+                        break
+
+            # 共享模块：同名实体推断出的依赖不包含数据库会话、配置和认证工具；
+            # 每种类型只取最近的上级包中的模块，多包项目中各包互不等待
+            if file_path.endswith('.py'):
+                for prerequisite in SHARED_PREREQUISITES.get(file_type, []):
+                    targets = _nearest(shared, prerequisite, scopes)
+                    found.extend(target for target in targets if target != file_path and target not in found)
+            dependencies[file_path] = found
+
+        return cls._from_edges(dependencies, project_files, type_order)
+
+    @classmethod
+    def _from_edges(cls, dependencies: Dict[str, List[str]], project_files: Dict[str, Dict],
+                    type_order: List[str]) -> "DependencyGraph":
+        """计算拓扑顺序，遇到环时放行环中类型最靠前的文件并去掉它尚未完成的依赖"""
+        position = {file_path: index for index, file_path in enumerate(project_files)}
+
+        def rank(file_path: str):
+            file_type = project_files[file_path]['type']
+            type_rank = type_order.index(file_type) if file_type in type_order else len(type_order)
+            return type_rank, position[file_path]
+
+        dependents: Dict[str, List[str]] = {file_path: [] for file_path in dependencies}
+        remaining = {}
+        for file_path, targets in dependencies.items():
+            remaining[file_path] = len(targets)
+            for target in targets:
+                dependents[target].append(file_path)
+
+        ready = [(rank(file_path), file_path) for file_path, count in remaining.items() if count == 0]
+        heapq.heapify(ready)
+        order: List[str] = []
+        done: Set[str] = set()
+        while len(order) < len(dependencies):
+            if not ready:
+                # 剩余文件都在环中
+                forced = min((file_path for file_path in dependencies if file_path not in done), key=rank)
+                dropped = [target for target in dependencies[forced] if target not in done]
+                print(f"依赖存在环，{forced} 不再等待: {', '.join(dropped)}")
+                dependencies[forced] = [target for target in dependencies[forced] if target in done]
+                for target in dropped:
+                    dependents[target].remove(forced)
+                ready = [(rank(forced), forced)]
+            _, file_path = heapq.heappop(ready)
+            order.append(file_path)
+            done.add(file_path)
+            for dependent in dependents[file_path]:
+                remaining[dependent] -= 1
+                if remaining[dependent] == 0:
+                    heapq.heappush(ready, (rank(dependent), dependent))
+        return cls(dependencies, order)
+
+    def subgraph(self, file_paths: Iterable[str]) -> "DependencyGraph":
+        """只保留指定文件之间的依赖（其余文件视为已完成）"""
+        keep = set(file_paths)
+        return DependencyGraph(
+            {file_path: [target for target in self.dependencies[file_path] if target in keep]
+             for file_path in self.order if file_path in keep},
+            [file_path for file_path in self.order if file_path in keep]
+        )
+
+    def depth(self) -> int:
+        """最长依赖链上的文件数，即完全并发时的最少轮数"""
+        levels: Dict[str, int] = {}
+        for file_path in self.order:
+            levels[file_path] = 1 + max((levels[target] for target in self.dependencies[file_path]), default=0)
+        return max(levels.values(), default=0)
+
+    def edge_count(self) -> int:
+        return sum(len(targets) for targets in self.dependencies.values())
+
+    def __len__(self) -> int:
+        return len(self.order)
+
+    async def arun(self, worker: Callable[[str], Awaitable]):
+        """并发执行：每个文件在自己的依赖全部完成后立即开始，依赖失败也不阻塞后续文件"""
+        finished = {file_path: asyncio.Event() for file_path in self.order}
+
+        async def run(file_path: str):
+            for target in self.dependencies[file_path]:
+                await finished[target].wait()
+            try:
+                await worker(file_path)
+            finally:
+                finished[file_path].set()
+
+        # 按拓扑顺序创建任务，先就绪的文件先进入工作池的等待队列
+        await asyncio.gather(*(run(file_path) for file_path in self.order))
@@ -0,0 +1,250 @@
+import os
+import json
+import pickle
+import hashlib
+from pathlib import Path
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set, Tuple
+
+from spec_parser import SpecIndex, SpecStreamParser, normalize_spec_path
+from path_trie import PathTrie, parse_tree
+from file_classifier import FileClassifier
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+# IR结构或解析逻辑变化时递增，旧的缓存随之失效
+SPEC_IR_VERSION = 2
+
+# 解析结果缓存目录（位于生成结果缓存目录下）
+SPEC_CACHE_SUBDIR = "specs"
+
+YAML_SUFFIXES = ('.yaml', '.yml')
+
+
+@dataclass
+class FileSpec:
+    """规格中的单个文件"""
+    path: str
+    type: str
+    description: str = ''
+    functions: List[str] = field(default_factory=list)
+    dependencies: List[str] = field(default_factory=list)
+
+    def to_file_info(self) -> Dict:
+        """转换为 ProjectBuilder 各阶段使用的文件信息字典"""
+        return {
+            'type': self.type,
+            'description': self.description,
+            'functions': list(self.functions),
+            'dependencies': list(self.dependencies),
+        }
+
+
+@dataclass
+class ProjectSpec:
+    """项目规格的中间表示，Markdown、JSON、YAML 三种输入都解析为该结构"""
+    files: List[FileSpec]
+    directories: List[str] = field(default_factory=list)
+    root: Optional[str] = None
+
+    def path_trie(self) -> PathTrie:
+        """按规格中的顺序重建目录前缀树（包括空目录）"""
+        trie = PathTrie(self.root)
+        for directory in self.directories:
+            trie.insert(directory, is_file=False)
+        for file_spec in self.files:
+            trie.insert(file_spec.path)
+        return trie
+
+
+def parse_markdown_spec(content: str, classifier: FileClassifier) -> ProjectSpec:
+    """解析 Markdown 项目结构：目录树决定文件列表，段落索引提供描述、函数和依赖"""
+    index = SpecIndex.parse(content)
+    if not index.tree:
+        raise ValueError("未找到项目目录结构")
+    trie = parse_tree(index.tree)
+    files = [
+        FileSpec(
+            path=file_path,
+            type=classifier.classify(file_path),
+            description=index.description(file_path),
+            functions=index.symbols(file_path),
+            dependencies=index.dependencies(file_path),
+        )
+        for file_path in trie.files()
+    ]
+    return ProjectSpec(files, trie.directories(), trie.root_name)
+
+
+class SpecStream:
+    """边接收 Markdown 项目结构边产出文件规格
+
+    目录树确定后，每个文件段落结束时立即产出对应的 FileSpec；目录树中没有段落的文件在文本结束时产出。
+    同一路径出现多个段落时以第一个段落为准。
+    """
+
+    def __init__(self, classifier: FileClassifier):
+        self.classifier = classifier
+        self.parser = SpecStreamParser()
+        # 目录树确定后建立
+        self.trie: Optional[PathTrie] = None
+        self._tree_files = set()
+        self._root = None
+        # 已产出的文件路径
+        self._emitted: Set[str] = set()
+
+    def feed(self, text: str) -> List[FileSpec]:
+        """追加一段文本，返回因此完整的文件规格"""
+        return self._collect(self.parser.feed(text))
+
+    def close(self) -> List[FileSpec]:
+        """文本结束，返回剩余的文件规格"""
+        ready = self._collect(self.parser.close())
+        if self.trie is None:
+            self._build_trie()
+        if not self.parser.tree:
+            raise ValueError("未找到项目目录结构")
+        for file_path in self.trie.files():
+            if file_path not in self._emitted:
+                ready.append(self._emit(file_path, None))
+        return ready
+
+    def _build_trie(self):
+        self.trie = parse_tree(self.parser.tree)
+        self._tree_files = set(self.trie.files())
+        self._root = self.parser.root
+
+    def _collect(self, completed: List[str]) -> List[FileSpec]:
+        # 出现第一个文件段落时目录树已经确定
+        if completed and self.trie is None:
+            self._build_trie()
+        ready = []
+        for section_path in completed:
+            file_path = self._tree_path(section_path)
+            if file_path is not None and file_path not in self._emitted:
+                ready.append(self._emit(file_path, section_path))
+        return ready
+
+    def _tree_path(self, section_path: str) -> Optional[str]:
+        """段落路径对应的目录树路径，段落标题是否带根目录前缀都能匹配"""
+        if section_path in self._tree_files:
+            return section_path
+        if self._root:
+            prefix = self._root + '/'
+            if section_path.startswith(prefix) and section_path[len(prefix):] in self._tree_files:
+                return section_path[len(prefix):]
+            if prefix + section_path in self._tree_files:
+                return prefix + section_path
+        return None
+
+    def _emit(self, file_path: str, section_path: Optional[str]) -> FileSpec:
+        file_spec = FileSpec(file_path, self.classifier.classify(file_path))
+        if section_path is not None:
+            section = self.parser.section(section_path)
+            file_spec.description = section.description
+            file_spec.functions = section.functions + section.classes
+            file_spec.dependencies = list(section.dependencies)
+        self._emitted.add(file_path)
+        return file_spec
+
+
+def parse_structured_spec(data: Dict, classifier: FileClassifier) -> ProjectSpec:
+    """解析 JSON/YAML 项目结构
+
+    files 可以是列表（每项包含 path）或「路径 -> 文件信息」的映射；
+    文件信息中的 type 可省略，省略时按路径分类；classes 追加在 functions 之后。
+    """
+    if not isinstance(data, dict) or 'files' not in data:
+        raise ValueError("项目结构缺少 files 字段")
+    entries = data['files']
+    if isinstance(entries, dict):
+        entries = [dict(info or {}, path=path) for path, info in entries.items()]
+
+    files = []
+    for entry in entries:
+        if isinstance(entry, str):
+            entry = {'path': entry}
+        file_path = normalize_spec_path(entry['path'])
+        files.append(FileSpec(
+            path=file_path,
+            type=entry.get('type') or classifier.classify(file_path),
+            description=entry.get('description') or '',
+            functions=list(entry.get('functions') or []) + list(entry.get('classes') or []),
+            dependencies=[normalize_spec_path(dependency) for dependency in entry.get('dependencies') or []],
+        ))
+    directories = [normalize_spec_path(directory).rstrip('/') for directory in data.get('directories') or []]
+    return ProjectSpec(files, directories, data.get('root'))
+
+
+def parse_spec(content: str, suffix: str, classifier: FileClassifier) -> ProjectSpec:
+    """按文件扩展名选择解析方式"""
+    suffix = suffix.lower()
+    if suffix == '.json':
+        return parse_structured_spec(json.loads(content), classifier)
+    if suffix in YAML_SUFFIXES:
+        if yaml is None:
+            raise ImportError("解析YAML项目结构需要安装 PyYAML：pip install pyyaml")
+        return parse_structured_spec(yaml.safe_load(content), classifier)
+    return parse_markdown_spec(content, classifier)
+
+
+def _cache_key(source: bytes, suffix: str, classifier: FileClassifier) -> str:
+    """解析结果的缓存键：源文件内容、格式、分类规则和IR版本"""
+    digest = hashlib.sha256()
+    digest.update(f"{SPEC_IR_VERSION}\0{suffix.lower()}\0".encode('utf-8'))
+    digest.update(json.dumps([classifier.rules, classifier.default], sort_keys=True).encode('utf-8'))
+    digest.update(b"\0")
+    digest.update(source)
+    return digest.hexdigest()
+
+
+def load_project_spec(spec_path: str, classifier: FileClassifier,
+                      cache_dir: Optional[str] = None) -> Tuple[ProjectSpec, bool]:
+    """读取项目结构并返回 (中间表示, 是否命中缓存)
+
+    解析结果以pickle保存在 cache_dir 中，键为源文件内容的哈希，源文件未变化时直接加载。
+    每个源文件路径只保留最新的一份解析结果，缓存大小不随源文件的修改次数增长。
+    cache_dir 为None时不使用缓存。
+    """
+    with open(spec_path, 'rb') as f:
+        source = f.read()
+    suffix = Path(spec_path).suffix
+
+    cache_file = None
+    if cache_dir is not None:
+        path_key = hashlib.sha256(str(Path(spec_path).resolve()).encode('utf-8')).hexdigest()[:16]
+        cache_file = Path(cache_dir) / SPEC_CACHE_SUBDIR / f"{path_key}-{_cache_key(source, suffix, classifier)}.pickle"
+        try:
+            with open(cache_file, 'rb') as f:
+                return pickle.load(f), True
+        except FileNotFoundError:
+            pass
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError) as e:
+            print(f"规格缓存损坏，重新解析: {e}")
+
+    spec = parse_spec(source.decode('utf-8'), suffix, classifier)
+
+    if cache_file is not None:
+        try:
+            cache_file.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = cache_file.with_name(f".{cache_file.name}.{os.getpid()}.tmp")
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(spec, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, cache_file)
+            _remove_stale_specs(cache_file, path_key)
+        except OSError as e:
+            print(f"写入规格缓存失败: {e}")
+    return spec, False
+
+
+def _remove_stale_specs(cache_file: Path, path_key: str):
+    """删除同一源文件路径的旧解析结果，以及不带路径前缀的旧格式缓存"""
+    for path in cache_file.parent.glob("*.pickle"):
+        if path != cache_file and (path.name.startswith(path_key + "-") or "-" not in path.stem):
+            try:
+                path.unlink()
+            except OSError:
+                pass
@@ -0,0 +1,265 @@
+import re
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+# 段落标题：## app/main.py、### `app/main.py`、## `app/main.py` - 描述
+_HEADING_PATTERN = re.compile(r'^(#{1,6})\s+(.*?)\s*#*\s*$')
+_HEADING_PATH_PATTERN = re.compile(r'`([^`]+)`|([\w./\-]+)', re.ASCII)
+
+# 旧格式：- **Function**: `create_app()`、- **Class**: `Post`、- **Depends**: `app/models/post.py`
+_TAGGED_ITEM_PATTERN = re.compile(r'^\s*[-*+]\s+\*\*(Function|Method|Class|Depends|Imports)\*\*:\s*(`.+)$')
+_BACKTICK_PATTERN = re.compile(r'`([^`]+)`')
+
+# Router.py 输出的格式：- create_app()  # 创建FastAPI应用实例
+_ITEM_PATTERN = re.compile(r'^\s*[-*+]\s+(.*)$')
+_SYMBOL_PATTERN = re.compile(r'^(async\s+def\s+|def\s+|class\s+)?([A-Za-z_][\w.]*)\s*(\(.*\))?\s*(->.*)?:?$')
+
+# 目录树中的行：含树形字符，或是单独的文件/目录名
+_TREE_LINE_PATTERN = re.compile(r'[├└│]|^\s*(\||\+|`|\\)--|^\s*[\w.\-]+/?\s*$', re.ASCII)
+
+# 树形字符（Unicode 或 ASCII 形式）
+_TREE_GLYPH_PATTERN = re.compile(r'[├└│]|(\||\+|`|\\)--')
+
+_FENCE = '```'
+
+# 包裹整个文档的外层围栏：```markdown
+_WRAPPER_PATTERN = re.compile(r'^\s*```\s*(markdown|md)\s*$', re.IGNORECASE)
+
+
+class SpecSection(NamedTuple):
+    """规格中单个文件的段落"""
+    description: str
+    functions: List[str]
+    classes: List[str]
+    dependencies: List[str]
+
+
+def _heading_path(text: str) -> Optional[str]:
+    """从段落标题中取出文件路径，不是路径的标题返回None"""
+    match = _HEADING_PATH_PATTERN.search(text)
+    if not match or match.start() != 0:
+        return None
+    path = normalize_spec_path(match.group(1) or match.group(2))
+    return path or None
+
+
+def normalize_spec_path(path: str) -> str:
+    """统一规格中的路径写法：去掉反引号、开头的./和/"""
+    path = path.strip().strip('`').strip()
+    while path.startswith('./'):
+        path = path[2:]
+    return path.lstrip('/')
+
+
+def _parse_item(line: str, functions: List[str], classes: List[str], dependencies: List[str]):
+    """解析段落中的列表项，识别出的函数、类和依赖文件分别追加到对应列表"""
+    tagged = _TAGGED_ITEM_PATTERN.match(line)
+    if tagged:
+        kind, items = tagged.groups()
+        names = [name.strip() for name in _BACKTICK_PATTERN.findall(items)]
+        if kind in ('Depends', 'Imports'):
+            dependencies.extend(normalize_spec_path(name) for name in names)
+        elif kind == 'Class':
+            classes.extend(names[:1])
+        else:
+            functions.extend(names[:1])
+        return
+
+    item = _ITEM_PATTERN.match(line)
+    if not item:
+        return
+    # 去掉行尾注释和反引号
+    text = item.group(1).split('#', 1)[0].strip().strip('`').strip()
+    symbol = _SYMBOL_PATTERN.match(text)
+    if not symbol:
+        return
+    keyword, name, params, _ = symbol.groups()
+    keyword = (keyword or '').strip()
+    if keyword == 'class' or (not keyword and params is None and name[:1].isupper()):
+        classes.append(name)
+    elif keyword or params is not None:
+        functions.append(f"{name}{params}" if params else f"{name}()")
+
+
+class SpecStreamParser:
+    """增量解析项目规格：按块接收文本，文件段落结束时报告其路径
+
+    目录树在第一个文件段落开始（或目录树所在的代码块结束）时确定，之后不再变化；
+    文件段落在下一个二级及以上标题出现或文本结束时视为完整。
+    整个文档被 ```markdown 围栏包裹时（模型经常这样输出）自动去掉外层围栏。
+    """
+
+    def __init__(self):
+        # 路径 -> (正文行, 函数, 类, 依赖)
+        self.sections: Dict[str, Tuple[List[str], List[str], List[str], List[str]]] = {}
+        self._fenced_tree: Optional[List[str]] = None
+        self._bare_tree: List[str] = []
+        self._fence_lines: Optional[List[str]] = None
+        self._seen_file = False
+        self._current = None
+        self._current_path: Optional[str] = None
+        # 尚未收到换行符的最后一行
+        self._partial = ''
+        # 是否有外层 ```markdown 围栏，None 表示还没读到第一行
+        self._wrapped: Optional[bool] = None
+        # 外层围栏内顶层的 ``` 行暂缓处理：后面还有内容时是普通代码块，否则是外层围栏的结尾
+        self._held: List[str] = []
+
+    @property
+    def tree_lines(self) -> List[str]:
+        return self._fenced_tree if self._fenced_tree is not None else self._bare_tree
+
+    @property
+    def tree(self) -> str:
+        return "\n".join(self.tree_lines).strip('\n')
+
+    @property
+    def root(self) -> Optional[str]:
+        return _tree_root(self.tree_lines)
+
+    def feed(self, text: str) -> List[str]:
+        """追加一段文本，返回因此完整的文件段落路径"""
+        lines = (self._partial + text).split('\n')
+        self._partial = lines.pop()
+        return self.feed_lines([line.rstrip('\r') for line in lines])
+
+    def close(self) -> List[str]:
+        """文本结束：处理最后一行，结束当前段落"""
+        completed = self.feed_lines([self._partial.rstrip('\r')] if self._partial else [])
+        self._partial = ''
+        # 仍未处理的 ``` 是外层围栏的结尾
+        self._held = []
+        if self._current_path is not None:
+            completed.append(self._current_path)
+        self._current = self._current_path = None
+        return completed
+
+    def feed_lines(self, lines: Iterable[str]) -> List[str]:
+        """处理完整的行，返回因此完整的文件段落路径"""
+        completed = []
+        for line in lines:
+            if self._wrapped is None:
+                if not line.strip():
+                    continue
+                self._wrapped = bool(_WRAPPER_PATTERN.match(line))
+                if self._wrapped:
+                    continue
+            elif self._wrapped and self._fence_lines is None:
+                if self._held:
+                    self._held.append(line)
+                    if not line.strip():
+                        continue
+                    held, self._held = self._held, []
+                    for held_line in held:
+                        self._feed_line(held_line, completed)
+                    continue
+                if line.strip() == _FENCE:
+                    self._held.append(line)
+                    continue
+            self._feed_line(line, completed)
+        return completed
+
+    def _feed_line(self, line: str, completed: List[str]):
+        current = self._current
+        if line.lstrip().startswith(_FENCE):
+            if self._fence_lines is None:
+                self._fence_lines = []
+            else:
+                # 第一个文件段落之前的代码块视为目录树
+                if self._fenced_tree is None and not self._seen_file:
+                    self._fenced_tree = self._fence_lines
+                self._fence_lines = None
+            if current is not None:
+                current[0].append(line)
+            return
+        if self._fence_lines is not None:
+            self._fence_lines.append(line)
+            if current is not None:
+                current[0].append(line)
+            return
+
+        heading = _HEADING_PATTERN.match(line)
+        if heading:
+            # 一级标题是文档标题，不分段
+            if len(heading.group(1)) >= 2:
+                if self._current_path is not None:
+                    completed.append(self._current_path)
+                path = _heading_path(heading.group(2))
+                self._current_path = path
+                self._current = self.sections.setdefault(path, ([], [], [], [])) if path else None
+                self._seen_file = self._seen_file or self._current is not None
+            return
+
+        if current is not None:
+            current[0].append(line)
+            _parse_item(line, current[1], current[2], current[3])
+        elif not self._seen_file and line.strip() and _TREE_LINE_PATTERN.search(line):
+            self._bare_tree.append(line)
+
+    def section(self, path: str) -> SpecSection:
+        """已解析的文件段落"""
+        body, functions, classes, dependencies = self.sections[path]
+        return SpecSection("\n".join(body).strip(), functions, classes, dependencies)
+
+    def index(self) -> "SpecIndex":
+        """当前已解析内容的段落索引"""
+        return SpecIndex({path: self.section(path) for path in self.sections}, self.tree, self.root)
+
+
+class SpecIndex:
+    """项目规格的段落索引：一次扫描整个Markdown，之后按路径直接查找描述、函数和类"""
+
+    def __init__(self, sections: Dict[str, SpecSection], tree: str = '', root: str = None):
+        self.sections = sections
+        self.tree = tree
+        self.root = root
+
+    @classmethod
+    def parse(cls, content: str) -> "SpecIndex":
+        """单次扫描：提取目录树（围栏内，或首个文件段落之前的树形行）并为每个文件段落建立索引"""
+        parser = SpecStreamParser()
+        parser.feed_lines(content.splitlines())
+        parser.close()
+        return parser.index()
+
+    def __len__(self) -> int:
+        return len(self.sections)
+
+    def __contains__(self, path: str) -> bool:
+        return self.get(path) is not None
+
+    def get(self, path: str) -> Optional[SpecSection]:
+        """查找文件段落，规格和目录树中是否带有根目录前缀都能匹配"""
+        path = normalize_spec_path(path)
+        section = self.sections.get(path)
+        if section is not None or not self.root:
+            return section
+        prefix = self.root + '/'
+        if path.startswith(prefix):
+            return self.sections.get(path[len(prefix):])
+        return self.sections.get(prefix + path)
+
+    def description(self, path: str) -> str:
+        section = self.get(path)
+        return section.description if section else ''
+
+    def symbols(self, path: str) -> List[str]:
+        """文件中需要实现的函数和类（函数在前）"""
+        section = self.get(path)
+        return section.functions + section.classes if section else []
+
+    def dependencies(self, path: str) -> List[str]:
+        """段落中声明的依赖文件"""
+        section = self.get(path)
+        return list(section.dependencies) if section else []
+
+
+def _tree_root(tree_lines: List[str]) -> Optional[str]:
+    """目录树第一行是顶格、没有树形字符的目录名时视为根目录"""
+    for line in tree_lines:
+        if not line.strip():
+            continue
+        name = line.rstrip()
+        if name != name.lstrip() or not name.endswith('/') or _TREE_GLYPH_PATTERN.search(name):
+            return None
+        return normalize_spec_path(name.rstrip('/'))
+    return None
@@ -0,0 +1,181 @@
+import ast
+from pathlib import Path
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+# 注入到单个提示中的依赖接口摘要上限（字符），超出部分只列出模块名
+DEFAULT_CONTEXT_MAX_CHARS = 2400
+
+# 签名中过长的默认值用 ... 代替
+_MAX_DEFAULT_CHARS = 40
+
+
+class ModuleSymbols(NamedTuple):
+    """单个已生成模块的对外接口"""
+    file_path: str
+    module: str
+    classes: List[str]      # 类签名，附带字段和公开方法
+    functions: List[str]    # 顶层函数签名
+    names: List[str]        # 顶层变量（如 router、Base、settings）
+
+    def summary(self) -> str:
+        """紧凑的接口摘要，每个符号一行"""
+        lines = [f"# {self.module} ({self.file_path})"]
+        lines.extend(self.classes)
+        lines.extend(self.functions)
+        if self.names:
+            lines.append(', '.join(self.names))
+        return "\n".join(lines)
+
+
+def module_name(file_path: str) -> str:
+    """文件路径对应的模块名：app/models/post.py -> app.models.post"""
+    parts = file_path[:-3].split('/') if file_path.endswith('.py') else file_path.split('/')
+    if parts[-1] == '__init__' and len(parts) > 1:
+        parts = parts[:-1]
+    return '.'.join(parts)
+
+
+def _short(node: ast.AST) -> str:
+    text = ast.unparse(node)
+    return text if len(text) <= _MAX_DEFAULT_CHARS else '...'
+
+
+def _signature(node) -> str:
+    """函数签名（不含函数体），过长的默认值折叠为 ..."""
+    args = node.args
+    params = []
+    positional = args.posonlyargs + args.args
+    defaults = [None] * (len(positional) - len(args.defaults)) + list(args.defaults)
+    for arg, default in zip(positional, defaults):
+        text = arg.arg + (f": {ast.unparse(arg.annotation)}" if arg.annotation else '')
+        if default is not None:
+            text += f" = {_short(default)}"
+        params.append(text)
+    if args.vararg:
+        params.append(f"*{args.vararg.arg}")
+    elif args.kwonlyargs:
+        params.append('*')
+    for arg, default in zip(args.kwonlyargs, args.kw_defaults):
+        text = arg.arg + (f": {ast.unparse(arg.annotation)}" if arg.annotation else '')
+        if default is not None:
+            text += f" = {_short(default)}"
+        params.append(text)
+    if args.kwarg:
+        params.append(f"**{args.kwarg.arg}")
+    prefix = 'async def' if isinstance(node, ast.AsyncFunctionDef) else 'def'
+    returns = f" -> {ast.unparse(node.returns)}" if node.returns else ''
+    return f"{prefix} {node.name}({', '.join(params)}){returns}"
+
+
+def _assigned_names(node: ast.AST) -> List[str]:
+    if isinstance(node, ast.Assign):
+        return [target.id for target in node.targets if isinstance(target, ast.Name)]
+    if isinstance(node, ast.AnnAssign) and isinstance(node.target, ast.Name):
+        return [node.target.id]
+    return []
+
+
+def _class_summary(node: ast.ClassDef) -> str:
+    bases = ', '.join(ast.unparse(base) for base in node.bases)
+    fields = []
+    methods = []
+    for item in node.body:
+        if isinstance(item, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            if not item.name.startswith('_') or item.name == '__init__':
+                methods.append(_signature(item))
+        else:
+            fields.extend(name for name in _assigned_names(item) if not name.startswith('_'))
+    text = f"class {node.name}({bases})" if bases else f"class {node.name}"
+    if fields:
+        text += f": {', '.join(fields)}"
+    if methods:
+        text += "; " + "; ".join(methods)
+    return text
+
+
+def _parse_valid_prefix(source: str, attempts: int = 5) -> Optional[ast.Module]:
+    """解析源码；有语法错误时截断到出错行之前重试（模型常在代码后附加解释文字）"""
+    lines = source.splitlines()
+    for _ in range(attempts):
+        try:
+            return ast.parse("\n".join(lines))
+        except SyntaxError as e:
+            if not e.lineno or e.lineno <= 1:
+                return None
+            lines = lines[:e.lineno - 1]
+        except ValueError:
+            return None
+    return None
+
+
+def extract_symbols(file_path: str, source: str) -> Optional[ModuleSymbols]:
+    """解析Python源码，提取类、函数签名和顶层变量；无法解析时返回None"""
+    tree = _parse_valid_prefix(source)
+    if tree is None:
+        return None
+    classes, functions, names = [], [], []
+    for node in tree.body:
+        if isinstance(node, ast.ClassDef):
+            if not node.name.startswith('_'):
+                classes.append(_class_summary(node))
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            if not node.name.startswith('_'):
+                functions.append(_signature(node))
+        else:
+            names.extend(name for name in _assigned_names(node) if not name.startswith('_') or name == '__all__')
+    return ModuleSymbols(file_path, module_name(file_path), classes, functions, names)
+
+
+class SymbolIndex:
+    """已生成文件的接口索引：按需解析内存中的内容或输出目录中的文件，文件重新写入后失效"""
+
+    def __init__(self, output_dir: Path):
+        self.output_dir = Path(output_dir)
+        # 文件路径 -> 接口（无法解析或不存在时为None）
+        self._symbols: Dict[str, Optional[ModuleSymbols]] = {}
+        # 已生成但可能还在写入队列中的文件内容，第一次查询时解析
+        self._sources: Dict[str, str] = {}
+
+    def invalidate(self, file_path: str):
+        """文件内容变化后调用"""
+        self._symbols.pop(file_path, None)
+        self._sources.pop(file_path, None)
+
+    def update(self, file_path: str, source: str):
+        """文件的新内容已知时调用，查询时直接解析该内容，不读取磁盘"""
+        self._symbols.pop(file_path, None)
+        self._sources[file_path] = source
+
+    def get(self, file_path: str) -> Optional[ModuleSymbols]:
+        if file_path not in self._symbols:
+            symbols = None
+            if file_path.endswith('.py'):
+                source = self._sources.pop(file_path, None)
+                if source is None:
+                    try:
+                        source = (self.output_dir / file_path).read_text(encoding='utf-8')
+                    except (OSError, UnicodeDecodeError):
+                        source = None
+                if source is not None:
+                    symbols = extract_symbols(file_path, source)
+            self._symbols[file_path] = symbols
+        return self._symbols[file_path]
+
+    def context(self, file_paths: Iterable[str], max_chars: int = DEFAULT_CONTEXT_MAX_CHARS) -> str:
+        """依赖文件的接口摘要，超出上限的模块只列出模块名"""
+        summaries = []
+        omitted = []
+        used = 0
+        for file_path in file_paths:
+            symbols = self.get(file_path)
+            if symbols is None:
+                continue
+            summary = symbols.summary()
+            if used + len(summary) > max_chars:
+                omitted.append(symbols.module)
+                continue
+            summaries.append(summary)
+            used += len(summary) + 1
+        if omitted:
+            summaries.append(f"# 其他可导入模块: {', '.join(omitted)}")
+        return "\n".join(summaries)
@@ -0,0 +1,30 @@
+from build_tracer import BuildTracer, FileSpan
+
+
+def test_held_span_is_emitted_after_release():
+    tracer = BuildTracer()
+    tracer.start()
+    with tracer.span("app/main.py", "main") as span:
+        tracer.hold(span)
+    # 写入尚未完成，记录推迟输出
+    assert tracer.records == []
+    tracer.release(span, "write", 0.25)
+    assert len(tracer.records) == 1
+    assert tracer.records[0]["write"] == 0.25
+
+
+def test_usage_of_every_request_is_summed():
+    span = FileSpan("app/main.py", "main")
+    # 原请求、语法校验后的修复请求
+    span.record_usage(100, 40)
+    span.record_usage(150, 45)
+    assert (span.prompt_tokens, span.completion_tokens, span.tokens_estimated) == (250, 85, False)
+
+
+def test_real_usage_replaces_only_its_own_estimate():
+    span = FileSpan("app/main.py", "main")
+    span.record_usage(100, 40)
+    span.record_usage(90, 30, estimated=True)
+    assert span.tokens_estimated
+    span.record_usage(95, 35, replaces=(90, 30))
+    assert (span.prompt_tokens, span.completion_tokens, span.tokens_estimated) == (195, 75, False)
@@ -0,0 +1,24 @@
+from Routerchain import ProjectBuilder
+
+SPEC = """blog/
+├── app/
+│   ├── __init__.py
+│   ├── config.py
+│   └── main.py
+{extra}└── requirements.txt
+"""
+
+
+def _cache_key(tmp_path, spec: str, file_path: str) -> str:
+    spec_path = tmp_path / "project_structure.md"
+    spec_path.write_text(spec, encoding='utf-8')
+    builder = ProjectBuilder(api_key="x", output_dir=str(tmp_path / "out"), cache_dir=str(tmp_path / "cache"))
+    project_files = builder.parse_project_structure(str(spec_path))
+    _, inputs, _ = builder._prepare_generation(file_path, project_files[file_path])
+    return builder._cache_key(file_path, project_files[file_path], inputs)
+
+
+def test_adding_a_file_keeps_cache_keys_of_other_files(tmp_path):
+    before = _cache_key(tmp_path, SPEC.format(extra=""), "app/config.py")
+    after = _cache_key(tmp_path, SPEC.format(extra="├── README.md\n"), "app/config.py")
+    assert before == after
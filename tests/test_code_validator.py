@@ -0,0 +1,34 @@
+from code_validator import extract_valid_code, validate_python
+
+BROKEN_MODULE = '''from fastapi import FastAPI
+
+app = FastAPI(
+
+@app.get("/")
+def index():
+    return {"ok": True}
+'''
+
+
+def test_docstring_example_is_not_extracted_as_file():
+    # 被截断在文档字符串中的文件，只有示例 f() 能编译
+    content = 'def f():\n    """Run f.\n\n    Example:\n    ```python\n    f()'
+    result = validate_python(content, "app/f.py")
+    assert result.error is not None
+    assert not result.extracted
+    assert result.content == content
+
+
+def test_usage_snippet_does_not_replace_broken_module():
+    content = BROKEN_MODULE + "\nUsage:\n```python\nfrom app.main import app\n```\n"
+    result = validate_python(content, "app/main.py")
+    assert result.error is not None
+    assert not result.extracted
+
+
+def test_module_with_trailing_explanation_is_extracted():
+    module = BROKEN_MODULE.replace("FastAPI(\n", "FastAPI()\n")
+    content = "```python\n" + module + "```\n\nThis module creates the app.\nIt defines one route."
+    assert extract_valid_code(content, "app/main.py") == module.strip()
+    result = validate_python(content, "app/main.py")
+    assert result.error is None and result.extracted
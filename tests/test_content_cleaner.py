@@ -0,0 +1,65 @@
+from pathlib import Path
+
+import pytest
+
+from content_cleaner import StreamingCleaner, clean_generated_content, language_for_path
+
+# 真实的模型输出：开头多空格的围栏、结尾的解释文字
+FIXTURES = Path(__file__).resolve().parent.parent / "fastapi_blog_system_fixed"
+FIXTURE_FILES = sorted(path.relative_to(FIXTURES).as_posix() for path in FIXTURES.rglob("*") if path.is_file())
+
+DOCSTRING_EXAMPLE = '''def f():
+    """Run f.
+
+    Example:
+    ```python
+    f()
+    ```
+    """
+    return 1'''
+
+
+def _streamed(text: str, language: str) -> str:
+    cleaner = StreamingCleaner(language)
+    return "".join(cleaner.feed(char) for char in text) + cleaner.finish()
+
+
+@pytest.mark.parametrize("text", [
+    DOCSTRING_EXAMPLE,
+    "```python\n" + DOCSTRING_EXAMPLE + "\n```\nThis function runs f.",
+    "以下是代码：\n  ```python\n  " + DOCSTRING_EXAMPLE.replace("\n", "\n  ") + "\n  ```\n说明文字",
+])
+def test_docstring_fence_does_not_end_code(text):
+    assert clean_generated_content(text, "python") == DOCSTRING_EXAMPLE
+    assert _streamed(text, "python") == DOCSTRING_EXAMPLE
+
+
+def test_closing_fence_deeper_than_opening_is_content():
+    text = "```python\nx = 1\n    ```\ny = 2\n```\nExplanation."
+    assert clean_generated_content(text, "python") == "x = 1\n    ```\ny = 2"
+
+
+def test_closing_fence_after_docstring_ends_code():
+    text = "```python\n" + DOCSTRING_EXAMPLE + "\n```\n\n```python\nprint('usage')\n```"
+    assert clean_generated_content(text, "python") == DOCSTRING_EXAMPLE
+
+
+def test_trailing_fence_on_code_line():
+    assert clean_generated_content("```python\nx = 1\ny = 2```\nDone.", "python") == "x = 1\ny = 2"
+
+
+def test_plain_code_stops_at_prose():
+    text = "import os\n\nprint(os.sep)\n\nThis script prints the separator."
+    assert clean_generated_content(text, "python") == "import os\n\nprint(os.sep)"
+
+
+@pytest.mark.parametrize("file_path", FIXTURE_FILES)
+def test_fixture_output_is_clean(file_path):
+    text = (FIXTURES / file_path).read_text(encoding="utf-8")
+    language = language_for_path(file_path)
+    whole = clean_generated_content(text, language)
+    assert _streamed(text, language) == whole
+    if language == "python":
+        compile(whole, file_path, "exec", dont_inherit=True)
+    if language != "markdown":
+        assert "```" not in whole
@@ -0,0 +1,41 @@
+import time
+
+from file_writer import TreeWriter
+
+
+def test_flush_waits_for_write_callbacks(tmp_path):
+    writer = TreeWriter()
+    writer.prepare(tmp_path, ["app"])
+    recorded = []
+
+    def on_done(result):
+        # 回调比写入慢，flush 仍需等它完成
+        time.sleep(0.05)
+        recorded.append(result.path.name)
+
+    for index in range(3):
+        writer.submit(tmp_path / "app" / f"m{index}.py", f"x = {index}\n", on_done)
+    writer.flush()
+    assert recorded == ["m0.py", "m1.py", "m2.py"]
+    writer.close()
+
+
+def test_unchanged_file_keeps_mtime(tmp_path):
+    writer = TreeWriter()
+    path = tmp_path / "app" / "main.py"
+    first = writer.submit(path, "app = 1\n").result()
+    mtime = path.stat().st_mtime_ns
+    time.sleep(0.01)
+    second = writer.submit(path, "app = 1\n").result()
+    writer.close()
+    assert first.changed and not second.changed
+    assert path.stat().st_mtime_ns == mtime
+
+
+def test_prepare_creates_only_deepest_directories(tmp_path):
+    writer = TreeWriter()
+    created = writer.prepare(tmp_path, ["app", "app/routers", "app/models", "tests"]).result()
+    writer.close()
+    # app 随 app/routers 一起创建，root 随 tests 一起创建
+    assert created == 3
+    assert (tmp_path / "app" / "models").is_dir() and (tmp_path / "tests").is_dir()
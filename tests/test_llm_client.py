@@ -0,0 +1,34 @@
+import time
+
+from langchain_core.runnables import RunnableLambda
+
+from build_tracer import FileSpan, current_span
+from llm_client import HedgePolicy, LLMClient
+
+
+def test_sync_hedge_ignores_the_losing_request():
+    hedge = HedgePolicy(percentile=0.5, budget=1.0, min_samples=1)
+    hedge.record("router", 0.05)
+    client = LLMClient(hedge=hedge)
+    calls = []
+
+    def call(_):
+        calls.append(time.monotonic())
+        # 原请求很慢，对冲请求立即返回
+        time.sleep(0.5 if len(calls) == 1 else 0.01)
+        return "ok"
+
+    span = FileSpan("app/routers/user.py", "router")
+    token = current_span.set(span)
+    try:
+        started = time.monotonic()
+        assert client.invoke(RunnableLambda(call), {}, hedge_key="router") == "ok"
+        elapsed = time.monotonic() - started
+    finally:
+        current_span.reset(token)
+    assert client.stats["hedge_wins"] == 1
+    # 等落后的请求完成，它的耗时不计入span和延迟统计
+    time.sleep(0.6)
+    assert span.timings["llm_latency"] < min(elapsed, 0.3)
+    assert len(hedge._latencies["router"]) == 2
+    assert hedge._latencies["router"][-1] < 0.3
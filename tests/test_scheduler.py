@@ -0,0 +1,78 @@
+from scheduler import DependencyGraph
+
+TYPE_ORDER = ['requirements', 'config', 'database', 'model', 'schema', 'service', 'router', 'main', 'test',
+              'migration', 'docker', 'util']
+
+PROJECT_FILES = {
+    'app/main.py': {'type': 'main'},
+    'app/routers/user.py': {'type': 'router'},
+    'app/models/user.py': {'type': 'model'},
+    'app/schemas/user.py': {'type': 'schema'},
+    'app/database/db.py': {'type': 'database'},
+    'app/auth/jwt_handler.py': {'type': 'util'},
+    'app/core/config.py': {'type': 'config'},
+    'tests/test_user.py': {'type': 'test'},
+    'README.md': {'type': 'util'},
+}
+
+
+def test_router_depends_on_entity_siblings_and_shared_modules():
+    graph = DependencyGraph.infer(PROJECT_FILES, TYPE_ORDER)
+    dependencies = graph.dependencies['app/routers/user.py']
+    assert 'app/models/user.py' in dependencies
+    assert 'app/schemas/user.py' in dependencies
+    assert 'app/database/db.py' in dependencies
+    assert 'app/auth/jwt_handler.py' in dependencies
+    assert 'app/core/config.py' in dependencies
+    # 非Python的工具文件不是依赖
+    assert 'README.md' not in dependencies
+
+
+def test_shared_modules_are_generated_before_router():
+    graph = DependencyGraph.infer(PROJECT_FILES, TYPE_ORDER)
+    order = graph.order
+    for shared in ('app/database/db.py', 'app/auth/jwt_handler.py', 'app/core/config.py'):
+        assert order.index(shared) < order.index('app/routers/user.py')
+
+
+def test_entity_test_depends_on_main():
+    graph = DependencyGraph.infer(PROJECT_FILES, TYPE_ORDER)
+    dependencies = graph.dependencies['tests/test_user.py']
+    assert 'app/routers/user.py' in dependencies
+    assert 'app/main.py' in dependencies
+
+
+def _package_files(root: str) -> dict:
+    return {
+        f'{root}/app/__init__.py': {'type': 'util'},
+        f'{root}/app/main.py': {'type': 'main'},
+        f'{root}/app/config.py': {'type': 'config'},
+        f'{root}/app/database/db.py': {'type': 'database'},
+        f'{root}/app/utils/security.py': {'type': 'util'},
+        f'{root}/app/misc.py': {'type': 'util'},
+        f'{root}/app/models/user.py': {'type': 'model'},
+        f'{root}/app/schemas/user.py': {'type': 'schema'},
+        f'{root}/app/services/user_service.py': {'type': 'service'},
+        f'{root}/app/routers/user.py': {'type': 'router'},
+        f'{root}/tests/test_user.py': {'type': 'test'},
+    }
+
+
+def test_shared_modules_are_scoped_to_their_package():
+    project_files = {}
+    for index in range(20):
+        project_files.update(_package_files(f'services/s{index}'))
+    graph = DependencyGraph.infer(project_files, TYPE_ORDER)
+    single = DependencyGraph.infer(_package_files('services/s0'), TYPE_ORDER)
+
+    dependencies = graph.dependencies['services/s3/app/routers/user.py']
+    assert all(target.startswith('services/s3/') for target in dependencies)
+    assert 'services/s3/app/database/db.py' in dependencies
+    assert 'services/s3/app/utils/security.py' in dependencies
+    # 包初始化文件和按默认类型归类的 util 文件不是共享依赖
+    assert 'services/s3/app/__init__.py' not in dependencies
+    assert 'services/s3/app/misc.py' not in dependencies
+    assert 'services/s3/app/main.py' in graph.dependencies['services/s3/tests/test_user.py']
+    # 包数增加时依赖链深度不变，边数线性增长
+    assert graph.depth() == single.depth()
+    assert graph.edge_count() == 20 * single.edge_count()
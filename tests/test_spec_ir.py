@@ -0,0 +1,24 @@
+from file_classifier import FileClassifier
+from spec_ir import SPEC_CACHE_SUBDIR, load_project_spec
+
+SPEC = """blog/
+├── app/
+│   ├── __init__.py
+│   └── main.py
+{extra}└── requirements.txt
+"""
+
+
+def test_spec_cache_keeps_latest_entry_per_spec(tmp_path):
+    classifier = FileClassifier.from_file()
+    cache_dir = tmp_path / "cache"
+    for spec_name in ("a.md", "b.md"):
+        spec_path = tmp_path / spec_name
+        for extra in ("", "├── README.md\n", "├── Dockerfile\n"):
+            spec_path.write_text(SPEC.format(extra=extra), encoding='utf-8')
+            _, cached = load_project_spec(str(spec_path), classifier, str(cache_dir))
+            assert not cached
+    # 每个源文件只保留最新的解析结果
+    assert len(list((cache_dir / SPEC_CACHE_SUBDIR).glob("*.pickle"))) == 2
+    spec, cached = load_project_spec(str(tmp_path / "b.md"), classifier, str(cache_dir))
+    assert cached and "Dockerfile" in [file_spec.path for file_spec in spec.files]
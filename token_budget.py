@@ -0,0 +1,48 @@
+from pathlib import Path
+from typing import Dict, NamedTuple
+
+
+class TokenBudget(NamedTuple):
+    """单个文件类型的输出token预算"""
+    base: int           # 基础预算
+    per_function: int   # 每个需要实现的函数/类追加的预算
+    cap: int            # 该类型的输出上限
+
+
+# 各文件类型的输出预算：小文件不再占用和完整路由文件相同的额度
+TOKEN_BUDGETS = {
+    "router": TokenBudget(1200, 350, 3000),
+    "service": TokenBudget(1000, 300, 3000),
+    "test": TokenBudget(800, 300, 3000),
+    "main": TokenBudget(900, 150, 2500),
+    "model": TokenBudget(600, 250, 2000),
+    "schema": TokenBudget(600, 200, 2000),
+    "migration": TokenBudget(600, 200, 2000),
+    "database": TokenBudget(600, 200, 1800),
+    "util": TokenBudget(500, 200, 2000),
+    "config": TokenBudget(500, 150, 1500),
+    "docker": TokenBudget(300, 0, 600),
+    "requirements": TokenBudget(200, 0, 500),
+}
+
+# 包初始化文件通常只有几行导出
+PACKAGE_INIT_MAX_TOKENS = 256
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算文本的token数（中文约每字0.75个token，英文约每4字符1个token）"""
+    return max(1, len(text.encode('utf-8')) // 4)
+
+
+def estimate_max_tokens(file_path: str, file_info: Dict, max_tokens: int) -> int:
+    """根据文件类型、描述长度和函数数量估算输出token上限"""
+    if Path(file_path).name == '__init__.py':
+        return min(PACKAGE_INIT_MAX_TOKENS, max_tokens)
+
+    budget = TOKEN_BUDGETS.get(file_info['type'], TOKEN_BUDGETS['util'])
+    estimate = (
+        budget.base
+        + budget.per_function * len(file_info['functions'])
+        + estimate_tokens(file_info['description'])
+    )
+    return min(estimate, budget.cap, max_tokens)